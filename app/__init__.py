@@ -1,32 +1,101 @@
+import os
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 
-db = SQLAlchemy()
-app = Flask(__name__, instance_relative_config=False)
-
-app.config['SECRET_KEY'] = 'this-shouldnt-be-here-in-real-app'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite'
+from .database import RoutingSession, SQLiteProfile
 
-db.init_app(app)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
-login_manager.init_app(app)
 
-from .models import User
 
-# Register blueprints
-from .auth import auth as auth_blueprint
-app.register_blueprint(auth_blueprint)
+def create_app(config: str | type | None = None) -> Flask:
+    """
+    Create and set up application.
+
+    Nothing is connected to database, except for creating or upgrading
+    schema if CREATE_SCHEMA is set, so application can be created in parent process
+    and shared by forked workers.
+
+    Arguments:
+        config -- name of configuration from app.config.CONFIGS or
+            configuration class, if it's None, name is taken from
+            HABIT_TRACKER_CONFIG environment variable
+    """
+    from .config import CONFIGS
+
+    if config is None:
+        config = os.environ.get("HABIT_TRACKER_CONFIG", "default")
+    if isinstance(config, str):
+        config = CONFIGS[config]
+
+    app = Flask(__name__, instance_relative_config=False)
+    app.config.from_object(config)
+    if not app.config["SECRET_KEY"]:
+        raise RuntimeError("SECRET_KEY has to be set")
+
+    SQLiteProfile.configure(app)
+    db.init_app(app)
+    SQLiteProfile.init_engines(app, db)
+    login_manager.init_app(app)
+
+    from . import models
+
+    from .plot_handler import plot_cache, render_executor
+    plot_cache.configure(
+        app.config['PLOT_CACHE_SIZE'], app.config['PLOT_CACHE_DIR'], app.config['PLOT_CACHE_TTL']
+    )
+    render_executor.configure(app.config['PLOT_WORKERS'], app.config['PLOT_RENDER_TIMEOUT'])
+
+    from .analytics import analytics_cache
+    analytics_cache.configure(app.config['ANALYTICS_CACHE_SIZE'], app.config['ANALYTICS_CACHE_TTL'])
+
+    from .day_status import day_status_cache
+    day_status_cache.configure(app.config['DAY_STATUS_CACHE_SIZE'], app.config['DAY_STATUS_CACHE_TTL'])
+
+    from .user_cache import user_cache
+    user_cache.configure(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+    # Register blueprints
+    from .auth import auth as auth_blueprint
+    app.register_blueprint(auth_blueprint)
+
+    from .main import main as main_blueprint
+    app.register_blueprint(main_blueprint)
+
+    from .settings import settings as settings_blueprint
+    app.register_blueprint(settings_blueprint)
+
+    from .error_handler import page_not_found
+    app.register_error_handler(404, page_not_found)
+
+    from .commands import rebuild_stats, build_vectors, upgrade_db, export_data, import_data
+    app.cli.add_command(rebuild_stats)
+    app.cli.add_command(build_vectors)
+    app.cli.add_command(upgrade_db)
+    app.cli.add_command(export_data)
+    app.cli.add_command(import_data)
+
+    if app.config["CREATE_SCHEMA"]:
+        from .migrations import Migrations
+        with app.app_context():
+            Migrations.upgrade()
 
-from .main import main as main_blueprint
-app.register_blueprint(main_blueprint)
+    return app
 
-from .settings import settings as settings_blueprint
-app.register_blueprint(settings_blueprint)
 
-from .error_handler import page_not_found
+def after_fork(app: Flask) -> None:
+    """
+    Drop database connections inherited from parent process, so worker
+    opens its own ones. It has to be called in every worker forked
+    after application was created.
 
-with app.app_context():
-    db.create_all()
\ No newline at end of file
+    Arguments:
+        app -- application created in parent process
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
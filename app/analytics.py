@@ -0,0 +1,378 @@
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from typing import Literal, NamedTuple
+
+import numpy as np
+
+from app import db
+from app.models import Habit, HabitEntry, State, StateEntry
+
+"""
+Minimal count of days with both values present needed to calculate
+correlation of two series.
+"""
+MIN_OVERLAP = 3
+
+
+class ItemMatrix(NamedTuple):
+    """
+    Entries of user's habits and states aligned by date. Every row is one day
+    starting at start_date, every column is one habit or state. Days without
+    entry contain NaN.
+    """
+    start_date: datetime.date
+    habits: list[Habit]
+    states: list[State]
+    habit_values: np.ndarray
+    state_values: np.ndarray
+
+
+class AnalyticsResult(NamedTuple):
+    """
+    Relations between user's habits and states. Every array has one row
+    for every habit and one column for every state. Pairs without enough
+    data contain NaN.
+
+    Attributes:
+        habits -- names of habits, in order of rows
+        states -- names of states, in order of columns
+        n_days -- count of analyzed days
+        correlations -- correlation of habit and state on the same day
+        lagged_correlations -- correlation of habit on one day and state
+            on the next day
+        average_done -- average state on days with habit done
+        average_not_done -- average state on days with habit not done
+    """
+    habits: list[str]
+    states: list[str]
+    n_days: int
+    correlations: np.ndarray
+    lagged_correlations: np.ndarray
+    average_done: np.ndarray
+    average_not_done: np.ndarray
+
+    def get_pairs(self) -> list[tuple]:
+        """
+        Return list of tuples (habit, state, correlation, lagged correlation,
+        average when done, average when not done), one for every pair
+        of habit and state. Missing values are None.
+        """
+        def to_value(x):
+            return None if np.isnan(x) else float(x)
+
+        return [
+            (habit, state) + tuple(
+                to_value(array[i, j]) for array in (
+                    self.correlations, self.lagged_correlations,
+                    self.average_done, self.average_not_done,
+                )
+            )
+            for i, habit in enumerate(self.habits)
+            for j, state in enumerate(self.states)
+        ]
+
+
+class AnalyticsHandler:
+    """
+    Calculates relations between habits and states of user. All entries are
+    loaded with two queries into dense date x item matrices, all statistics
+    are calculated with matrix operations over every pair at once.
+    """
+    @classmethod
+    def analyze(
+            cls,
+            habits: list[Habit],
+            states: list[State]
+        ) -> AnalyticsResult:
+        """
+        Calculate relations between every habit and every state.
+
+        Arguments:
+            habits -- collection of Habit objects
+            states -- collection of State objects
+        """
+        matrix = cls.get_matrix(habits, states)
+        average_done, average_not_done = cls.get_conditional_averages(
+            matrix.habit_values, matrix.state_values
+        )
+        return AnalyticsResult(
+            habits=[habit.name for habit in habits],
+            states=[state.name for state in states],
+            n_days=len(matrix.habit_values),
+            correlations=cls.correlate(matrix.habit_values, matrix.state_values),
+            lagged_correlations=cls.correlate(
+                matrix.habit_values[:-1], matrix.state_values[1:]
+            ),
+            average_done=average_done,
+            average_not_done=average_not_done,
+        )
+
+    @classmethod
+    def get_matrix(
+            cls,
+            habits: list[Habit],
+            states: list[State]
+        ) -> ItemMatrix:
+        """
+        Load entries of given habits and states and align them by date.
+        Habit's values are 1 for done and 0 for not done, state's values
+        are 1-5. Rows span from the first to the last entry.
+
+        Arguments:
+            habits -- collection of Habit objects
+            states -- collection of State objects
+        """
+        habit_entries = cls.get_entries("Habit", [habit.id for habit in habits])
+        state_entries = cls.get_entries("State", [state.id for state in states])
+
+        dates = [date for _, date, _ in habit_entries + state_entries]
+        if not dates:
+            start_date, n_days = datetime.date.today(), 0
+        else:
+            start_date = min(dates)
+            n_days = (max(dates) - start_date).days + 1
+
+        return ItemMatrix(
+            start_date=start_date,
+            habits=habits,
+            states=states,
+            habit_values=cls.fill_matrix(habit_entries, habits, start_date, n_days),
+            state_values=cls.fill_matrix(state_entries, states, start_date, n_days),
+        )
+
+    @classmethod
+    def get_entries(
+            cls,
+            data_type: Literal["Habit", "State"],
+            ids: list[int]
+        ) -> list[tuple[int, datetime.date, float]]:
+        """
+        Return (owner's id, date, value) of all entries with value
+        of given habits or states.
+        """
+        if not ids:
+            return []
+        if data_type == "Habit":
+            model, owner_id = HabitEntry, HabitEntry.habit_id
+            value = db.cast(model.value, db.Integer)
+        else:
+            model, owner_id = StateEntry, StateEntry.state_id
+            value = model.value
+
+        return [
+            tuple(row) for row in db.session.execute(
+                db.select(owner_id, model.date, value)
+                .filter(owner_id.in_(ids))
+                .filter(model.value.is_not(None))
+            )
+        ]
+
+    @staticmethod
+    def fill_matrix(
+            entries: list[tuple[int, datetime.date, float]],
+            objs: list[Habit | State],
+            start_date: datetime.date,
+            n_days: int
+        ) -> np.ndarray:
+        """
+        Return array of shape (n_days, count of objects) with values
+        of entries placed by date and owner. Missing and negative values
+        are NaN.
+        """
+        matrix = np.full((n_days, len(objs)), np.nan)
+        if not entries:
+            return matrix
+
+        columns = {obj.id: i for i, obj in enumerate(objs)}
+        owner_ids, dates, values = zip(*entries)
+        rows = (
+            np.array(dates, dtype="datetime64[D]") - np.datetime64(start_date, "D")
+        ).astype(np.int64)
+        cols = np.fromiter((columns[obj_id] for obj_id in owner_ids), dtype=np.int64, count=len(owner_ids))
+        values = np.array(values, dtype=np.float64)
+        values[values < 0] = np.nan
+
+        matrix[rows, cols] = values
+        return matrix
+
+    @staticmethod
+    def correlate(
+            a: np.ndarray,
+            b: np.ndarray
+        ) -> np.ndarray:
+        """
+        Return Pearson correlation of every column of a with every column
+        of b, calculated only over rows where both values are present.
+
+        Sums over pairwise-present rows are calculated with matrix products
+        of values and masks, so no pair is handled separately.
+
+        Arguments:
+            a -- array of shape (days, n), NaN for missing values
+            b -- array of shape (days, m), NaN for missing values
+        """
+        mask_a = (~np.isnan(a)).astype(np.float64)
+        mask_b = (~np.isnan(b)).astype(np.float64)
+        a = np.nan_to_num(a)
+        b = np.nan_to_num(b)
+
+        n = mask_a.T @ mask_b
+        sum_a = a.T @ mask_b
+        sum_b = mask_a.T @ b
+        sum_aa = (a * a).T @ mask_b
+        sum_bb = mask_a.T @ (b * b)
+        sum_ab = a.T @ b
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = sum_ab - sum_a * sum_b / n
+            var_a = sum_aa - sum_a ** 2 / n
+            var_b = sum_bb - sum_b ** 2 / n
+            corr = cov / np.sqrt(var_a * var_b)
+
+        corr[(n < MIN_OVERLAP) | ~np.isfinite(corr)] = np.nan
+        return np.clip(corr, -1, 1)
+
+    @staticmethod
+    def get_conditional_averages(
+            habit_values: np.ndarray,
+            state_values: np.ndarray
+        ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return average of every state on days with every habit done
+        and on days with it not done.
+
+        Arguments:
+            habit_values -- array of shape (days, habits), NaN for missing
+            state_values -- array of shape (days, states), NaN for missing
+        """
+        done = (habit_values == 1).astype(np.float64)
+        not_done = (habit_values == 0).astype(np.float64)
+        present = (~np.isnan(state_values)).astype(np.float64)
+        values = np.nan_to_num(state_values)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average_done = (done.T @ values) / (done.T @ present)
+            average_not_done = (not_done.T @ values) / (not_done.T @ present)
+        return average_done, average_not_done
+
+
+class AnalyticsCache:
+    """
+    Cache of analytics results, one per user, kept in LRU order.
+
+    Result is valid only for the same set of habits and states it was
+    calculated for, and it's dropped every time entries of any of them
+    change. Result calculated while entries were changed isn't saved.
+    Results expire after ttl seconds, so changes made by other processes
+    are seen after that time.
+    """
+    def __init__(
+            self,
+            max_entries: int = 256,
+            ttl: float = 60
+        ) -> None:
+        """
+        Initialize attributes of object.
+
+        Arguments:
+            max_entries -- maximal count of cached results
+            ttl -- seconds after which result is calculated again,
+                0 turns cache off
+        """
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._generation = 0
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def configure(
+            self,
+            max_entries: int,
+            ttl: float
+        ) -> None:
+        """
+        Set maximal count of cached results and their time to live and clear cache.
+        """
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            self._results.clear()
+
+    @staticmethod
+    def get_items(
+            habits: list[Habit],
+            states: list[State]
+        ) -> frozenset:
+        """
+        Return set identifying habits and states of result.
+        """
+        return frozenset(
+            [("Habit", habit.id) for habit in habits]
+            + [("State", state.id) for state in states]
+        )
+
+    def get(
+            self,
+            user_id: int,
+            habits: list[Habit],
+            states: list[State]
+        ) -> AnalyticsResult:
+        """
+        Return analytics of given user's habits and states, calculate them
+        if they aren't cached.
+
+        Arguments:
+            user_id -- id of user
+            habits -- collection of user's Habit objects
+            states -- collection of user's State objects
+        """
+        items = self.get_items(habits, states)
+        with self._lock:
+            cached = self._results.get(user_id)
+            if cached is not None and cached[1] == items and cached[0] > time.monotonic():
+                self._results.move_to_end(user_id)
+                return cached[2]
+            generation = self._generation
+
+        result = AnalyticsHandler.analyze(habits, states)
+        with self._lock:
+            if generation != self._generation or self.ttl <= 0:
+                return result
+            self._results[user_id] = (time.monotonic() + self.ttl, items, result)
+            self._results.move_to_end(user_id)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return result
+
+    def invalidate(
+            self,
+            data_type: str,
+            obj_id: int
+        ) -> None:
+        """
+        Drop all cached results containing given object.
+
+        Arguments:
+            data_type -- string indicating type of data, "Habit" or "State"
+            obj_id -- id of Habit or State object
+        """
+        with self._lock:
+            self._generation += 1
+            outdated = [
+                user_id for user_id, (_, items, _) in self._results.items()
+                if (data_type, obj_id) in items
+            ]
+            for user_id in outdated:
+                del self._results[user_id]
+
+    def clear(self) -> None:
+        """
+        Drop all cached results.
+        """
+        with self._lock:
+            self._results.clear()
+
+
+analytics_cache = AnalyticsCache()
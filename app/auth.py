@@ -1,6 +1,6 @@
 from functools import wraps
 from flask import Blueprint, render_template, redirect, request, url_for, flash
-from app import app, db
+from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from .models import User
 from flask_login import login_user, logout_user, login_required
@@ -0,0 +1,101 @@
+import click
+from flask.cli import with_appcontext
+
+from . import db
+from .models import User
+from .stats_handler import StatsTableHandler
+from .range_index import RangeIndex
+from .migrations import Migrations
+from .vector_storage import VectorStorage
+from .export import DataExporter
+from .importer import DataImporter
+
+
+@click.command("rebuild-stats")
+@with_appcontext
+def rebuild_stats() -> None:
+    """
+    Calculate statistics and range indexes of all habits and states
+    from their entries and first entry dates of users.
+    """
+    count = StatsTableHandler.rebuild()
+    click.echo(f"Rebuilt statistics of {count} habits and states.")
+    count = RangeIndex.rebuild()
+    click.echo(f"Rebuilt range indexes of {count} habits and states.")
+    User.refresh_first_entry_dates()
+    db.session.commit()
+    click.echo("Refreshed first entry dates of users.")
+
+
+@click.command("build-vectors")
+@with_appcontext
+def build_vectors() -> None:
+    """
+    Create compact yearly vectors of all habits and states from their entries.
+    """
+    count = VectorStorage.build()
+    click.echo(f"Built {count} yearly vectors.")
+
+
+@click.command("upgrade-db")
+@with_appcontext
+def upgrade_db() -> None:
+    """
+    Create tables and indexes missing in existing database.
+    """
+    created = Migrations.upgrade()
+    if created:
+        click.echo("Created: " + ", ".join(created))
+    else:
+        click.echo("Database is up to date.")
+
+
+@click.command("export-data")
+@click.argument("email")
+@click.option("--format", "data_format", type=click.Choice(list(DataExporter.FORMATS)), default="csv",
+              help="Format of exported data.")
+@click.option("--gzip", "compress", is_flag=True, help="Compress output with gzip.")
+@click.option("--output", "-o", type=click.File("wb"), default="-",
+              help="File to write to, standard output by default.")
+@with_appcontext
+def export_data(email: str, data_format: str, compress: bool, output) -> None:
+    """
+    Write all data of user with given email as CSV or JSON Lines.
+    """
+    uid = db.session.scalar(db.select(User.id).filter_by(email=email))
+    if uid is None:
+        raise click.ClickException(f"User {email} doesn't exist.")
+    for chunk in DataExporter.export(uid, data_format, compress):
+        output.write(chunk)
+
+
+@click.command("import-data")
+@click.argument("email")
+@click.argument("file", type=click.File("rb"))
+@click.option("--format", "data_format", type=click.Choice(list(DataImporter.FORMATS)), default=None,
+              help="Format of imported data, guessed from file's name by default.")
+@click.option("--gzip", "compress", is_flag=True, help="File is compressed with gzip.")
+@click.option("--batch-size", type=int, default=None, help="Count of rows saved in one transaction.")
+@with_appcontext
+def import_data(email: str, file, data_format: str | None, compress: bool, batch_size: int | None) -> None:
+    """
+    Import habits, states and entries of user with given email from CSV
+    or JSON Lines file in the shape of export.
+    """
+    uid = db.session.scalar(db.select(User.id).filter_by(email=email))
+    if uid is None:
+        raise click.ClickException(f"User {email} doesn't exist.")
+    try:
+        if data_format is None:
+            data_format, guessed_compress = DataImporter.get_format(file.name)
+            compress = compress or guessed_compress
+        arguments = {"batch_size": batch_size} if batch_size else {}
+        result = DataImporter.import_data(uid, file, data_format, compress, **arguments)
+    except ValueError as error:
+        db.session.rollback()
+        raise click.ClickException(str(error))
+    click.echo(
+        f"Created {result.habits_created} habits and {result.states_created} states, "
+        f"imported {result.habit_entries} habit entries, {result.state_entries} state entries "
+        f"and {result.journal_entries} journal entries."
+    )
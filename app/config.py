@@ -0,0 +1,91 @@
+import os
+
+
+class Config:
+    """
+    Default configuration, used for local development.
+
+    Secret key and database can be set with SECRET_KEY and DATABASE_URL
+    environment variables.
+    """
+    SECRET_KEY = os.environ.get("SECRET_KEY", "this-shouldnt-be-here-in-real-app")
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///db.sqlite")
+    # create missing tables, columns and indexes when application is created,
+    # deployments with many workers should turn it off and run `flask upgrade-db` once instead
+    CREATE_SCHEMA = True
+
+    # SQLite connection settings, see SQLiteProfile for description
+    SQLITE_JOURNAL_MODE = "WAL"
+    SQLITE_SYNCHRONOUS = "NORMAL"
+    SQLITE_MMAP_SIZE = 256 * 2**20
+    SQLITE_CACHE_SIZE = -64000
+    SQLITE_BUSY_TIMEOUT = 5000
+    SQLITE_POOL_SIZE = 10
+    SQLITE_POOL_OVERFLOW = 10
+    # reads of GET requests use separate read-only engine
+    SQLITE_READ_ENGINE = False
+
+    # count of heatmaps kept in memory, optional directory for on-disk cache and seconds
+    # after which they are rendered again, so changes made by other workers are seen
+    PLOT_CACHE_SIZE = 512
+    PLOT_CACHE_DIR = None
+    PLOT_CACHE_TTL = 60
+    # "july" renders heatmaps with matplotlib, "raster" draws them directly with numpy
+    PLOT_RENDERER = "july"
+    # count of processes rendering heatmaps in parallel, 0 renders them in request's thread
+    PLOT_WORKERS = 0
+    # seconds to wait for workers, after that heatmaps are rendered in request's thread
+    PLOT_RENDER_TIMEOUT = 10
+    # "table" reads dashboard statistics from stats tables, "query" calculates them with SQL
+    STATS_BACKEND = "table"
+    # keep entries also as yearly byte vectors and read plots and streaks from them,
+    # after enabling run `flask build-vectors`
+    COMPACT_STORAGE = False
+    # lengths of rolling windows shown on dashboard and window used by trend sparklines
+    TREND_WINDOWS = [7, 30, 90]
+    TREND_SPARKLINE_WINDOW = 30
+    # count of users whose analytics of habits and states are kept in memory
+    # and seconds after which they are calculated again
+    ANALYTICS_CACHE_SIZE = 256
+    ANALYTICS_CACHE_TTL = 60
+    # count of users whose days with entered data are kept in memory
+    # and seconds after which they are read again
+    DAY_STATUS_CACHE_SIZE = 1024
+    DAY_STATUS_CACHE_TTL = 60
+    # count of logged in users kept in memory with their habits and states and seconds
+    # after which they are loaded again, so changes made by other workers are seen
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 60
+    # largest accepted request in bytes, it limits size of imported files
+    MAX_CONTENT_LENGTH = 16 * 2**20
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+class TestingConfig(Config):
+    """
+    Configuration with private in-memory database, used by tests
+    and benchmarks.
+    """
+    TESTING = True
+    SECRET_KEY = "testing"
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+
+
+class ProductionConfig(Config):
+    """
+    Configuration for deployments. Secret key has to be set in environment
+    and schema is created by `flask upgrade-db`, not by every worker.
+    """
+    SECRET_KEY = os.environ.get("SECRET_KEY")
+    CREATE_SCHEMA = False
+
+
+CONFIGS = {
+    "default": Config,
+    "development": DevelopmentConfig,
+    "testing": TestingConfig,
+    "production": ProductionConfig,
+}
@@ -0,0 +1,217 @@
+from typing import Any, Callable
+
+import sqlalchemy as sa
+from flask import Flask, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+
+"""
+Bind key of engine used for reads of GET requests.
+"""
+READ_BIND_KEY = "read"
+
+
+class RoutingSession(Session):
+    """
+    Session sending reads of GET and HEAD requests to read-only engine,
+    if it's configured. Everything else goes to the main engine.
+
+    Once session writes anything, all its following statements use the main
+    engine, so they see their own uncommitted changes.
+
+    Callbacks registered with call_after_commit run after the transaction
+    is committed and are dropped if it's rolled back.
+    """
+    def __init__(self, db: SQLAlchemy, **kwargs: Any) -> None:
+        super().__init__(db, **kwargs)
+        self._uses_main_engine = False
+        self._after_commit = {}
+
+    def get_bind(
+            self,
+            mapper: Any = None,
+            clause: Any = None,
+            bind: Any = None,
+            **kwargs: Any
+        ) -> sa.Engine | sa.Connection:
+        """
+        Return engine for statement. See Session.get_bind.
+        """
+        if getattr(clause, "is_dml", False) or self._flushing:
+            self._uses_main_engine = True
+        if bind is None and not self._uses_main_engine and self.is_read_request():
+            engine = self._db.engines.get(READ_BIND_KEY)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    @staticmethod
+    def is_read_request() -> bool:
+        """
+        Return True if session is used while handling request,
+        that shouldn't change data.
+        """
+        return has_request_context() and request.method in ("GET", "HEAD")
+
+    def call_after_commit(
+            self,
+            callback: Callable[..., Any],
+            *args: Any
+        ) -> None:
+        """
+        Call function with given arguments once current transaction is
+        committed, e.g. to drop cached data only when other requests can
+        already read new one. The same call registered many times is
+        made once.
+
+        Arguments:
+            callback -- function to call
+            args -- positional arguments of function
+        """
+        # calls are dropped at the end of transaction, so it has to exist
+        if not self.in_transaction():
+            self.begin()
+        self._after_commit[(callback, args)] = None
+
+    @staticmethod
+    def run_after_commit(session: "RoutingSession") -> None:
+        """
+        Make calls registered in committed session.
+        """
+        calls, session._after_commit = session._after_commit, {}
+        for callback, args in calls:
+            callback(*args)
+
+    @staticmethod
+    def drop_after_commit(
+            session: "RoutingSession",
+            transaction: sa.orm.SessionTransaction
+        ) -> None:
+        """
+        Drop calls registered in session, which transaction ended without
+        commit.
+        """
+        if transaction.parent is None:
+            session._after_commit.clear()
+
+
+sa.event.listen(RoutingSession, "after_commit", RoutingSession.run_after_commit)
+sa.event.listen(RoutingSession, "after_transaction_end", RoutingSession.drop_after_commit)
+
+
+class SQLiteProfile:
+    """
+    Tunes SQLite engines of application, using settings from configuration:
+
+        SQLITE_JOURNAL_MODE -- journal mode, WAL lets readers work
+            while other connection writes
+        SQLITE_SYNCHRONOUS -- synchronous mode, NORMAL is safe with WAL
+        SQLITE_MMAP_SIZE -- bytes of database file mapped into memory
+        SQLITE_CACHE_SIZE -- page cache size, negative values are in KiB
+        SQLITE_BUSY_TIMEOUT -- milliseconds to wait for lock before raising
+            "database is locked"
+        SQLITE_POOL_SIZE -- count of connections kept open in pool
+        SQLITE_POOL_OVERFLOW -- count of additional connections opened
+            under load
+        SQLITE_READ_ENGINE -- if True, reads of GET requests use separate
+            engine, which connections are read-only
+    """
+    @classmethod
+    def is_file_database(cls, uri: str) -> bool:
+        """
+        Return True if uri points to SQLite database stored in file.
+        """
+        url = sa.make_url(uri)
+        return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+    @classmethod
+    def configure(
+            cls,
+            app: Flask
+        ) -> None:
+        """
+        Set engine options and binds of application. It has to be called
+        before db.init_app.
+
+        Arguments:
+            app -- Flask application
+        """
+        uri = app.config["SQLALCHEMY_DATABASE_URI"]
+        if not cls.is_file_database(uri):
+            return
+
+        pool_options = {
+            "pool_size": app.config.get("SQLITE_POOL_SIZE", 10),
+            "max_overflow": app.config.get("SQLITE_POOL_OVERFLOW", 10),
+        }
+        options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+        for name, value in pool_options.items():
+            options.setdefault(name, value)
+
+        # options of main engine aren't used by binds
+        if app.config.get("SQLITE_READ_ENGINE"):
+            app.config.setdefault("SQLALCHEMY_BINDS", {})[READ_BIND_KEY] = {
+                "url": uri, **pool_options
+            }
+
+    @classmethod
+    def init_engines(
+            cls,
+            app: Flask,
+            db: SQLAlchemy
+        ) -> None:
+        """
+        Set pragmas on every new connection of application's SQLite engines.
+        It has to be called after db.init_app.
+
+        Arguments:
+            app -- Flask application
+            db -- SQLAlchemy extension
+        """
+        with app.app_context():
+            engines = dict(db.engines)
+
+        for key, engine in engines.items():
+            if engine.dialect.name != "sqlite":
+                continue
+            pragmas = cls.get_pragmas(app.config, read_only=key == READ_BIND_KEY)
+            sa.event.listen(engine, "connect", cls.make_listener(pragmas))
+
+    @classmethod
+    def get_pragmas(
+            cls,
+            config: dict,
+            read_only: bool = False
+        ) -> dict[str, Any]:
+        """
+        Return pragmas set on new connections.
+
+        Arguments:
+            config -- configuration of application
+            read_only -- True for connections of read-only engine
+        """
+        pragmas = {
+            "busy_timeout": config.get("SQLITE_BUSY_TIMEOUT", 5000),
+            "cache_size": config.get("SQLITE_CACHE_SIZE", -64000),
+            "mmap_size": config.get("SQLITE_MMAP_SIZE", 0),
+        }
+        if read_only:
+            pragmas["query_only"] = "ON"
+        else:
+            # journal mode is saved in database file, so only writers set it
+            pragmas["journal_mode"] = config.get("SQLITE_JOURNAL_MODE", "WAL")
+            pragmas["synchronous"] = config.get("SQLITE_SYNCHRONOUS", "NORMAL")
+        return {name: value for name, value in pragmas.items() if value is not None}
+
+    @staticmethod
+    def make_listener(pragmas: dict[str, Any]):
+        """
+        Return function setting given pragmas on new DBAPI connection.
+        """
+        def set_pragmas(dbapi_connection, connection_record) -> None:
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            cursor.close()
+
+        return set_pragmas
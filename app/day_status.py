@@ -0,0 +1,310 @@
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, NamedTuple
+
+from sqlalchemy import Select, case, func, literal, or_, union, union_all
+
+from app import db
+from app.models import Habit, HabitEntry, JournalEntry, State, StateEntry
+from app.stats_handler import QueryStatsHandler
+
+
+class DayFill(NamedTuple):
+    """
+    Summary of data entered by user for one day.
+
+    Attributes:
+        habits_done -- count of habits done on this day
+        habits_count -- count of habit entries of this day
+        states_sum -- sum of values of state entries
+        states_count -- count of state entries with value
+        has_journal -- True if journal note isn't empty
+    """
+    habits_done: int
+    habits_count: int
+    states_sum: int
+    states_count: int
+    has_journal: bool
+
+    @property
+    def done_ratio(self) -> float | None:
+        """
+        Return part of habits done on this day or None if day has no habit entries.
+        """
+        return self.habits_done / self.habits_count if self.habits_count else None
+
+    @property
+    def state_average(self) -> float | None:
+        """
+        Return average value of states or None if no state has value.
+        """
+        return self.states_sum / self.states_count if self.states_count else None
+
+
+class DayStatus:
+    """
+    Checks if user entered any data, journal note, habit or state entry,
+    for a day or for days of a range. Every check is one query.
+    """
+    @classmethod
+    def get_date_queries(
+            cls,
+            uid: int,
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> list[Select]:
+        """
+        Return queries selecting dates of user's journal, habit and state
+        entries from start_date to end_date, both inclusive.
+
+        Arguments:
+            uid -- user's id
+            start_date -- first day of range
+            end_date -- last day of range
+        """
+        return [
+            db.select(JournalEntry.date)
+            .filter(JournalEntry.user_id == uid, JournalEntry.date.between(start_date, end_date)),
+            db.select(HabitEntry.date)
+            .join(Habit, Habit.id == HabitEntry.habit_id)
+            .filter(Habit.user_id == uid, HabitEntry.date.between(start_date, end_date)),
+            db.select(StateEntry.date)
+            .join(State, State.id == StateEntry.state_id)
+            .filter(State.user_id == uid, StateEntry.date.between(start_date, end_date)),
+        ]
+
+    @classmethod
+    def has_data(
+            cls,
+            uid: int,
+            date: datetime.date
+        ) -> bool:
+        """
+        Return True if user entered any data for given day.
+
+        Arguments:
+            uid -- user's id
+            date -- date object
+        """
+        queries = cls.get_date_queries(uid, date, date)
+        return bool(db.session.scalar(
+            db.select(or_(*[query.exists() for query in queries]))
+        ))
+
+    @classmethod
+    def get_days_with_data(
+            cls,
+            uid: int,
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> frozenset[datetime.date]:
+        """
+        Return set of days from start_date to end_date, both inclusive,
+        for which user entered any data.
+
+        Arguments:
+            uid -- user's id
+            start_date -- first day of range
+            end_date -- last day of range
+        """
+        queries = cls.get_date_queries(uid, start_date, end_date)
+        return frozenset(db.session.scalars(union(*queries)))
+
+    @classmethod
+    def get_fill(
+            cls,
+            uid: int,
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> dict[datetime.date, DayFill]:
+        """
+        Return dictionary mapping days from start_date to end_date, both
+        inclusive, to summary of data entered for them. Days without data
+        aren't included. Whole range is read with one query grouped by date.
+
+        Arguments:
+            uid -- user's id
+            start_date -- first day of range
+            end_date -- last day of range
+        """
+        habit_done = QueryStatsHandler.get_done_expression("Habit", HabitEntry)
+        state_done = QueryStatsHandler.get_done_expression("State", StateEntry)
+        state_score = QueryStatsHandler.get_score_expression("State", StateEntry)
+        zero = literal(0)
+
+        rows = union_all(
+            db.select(
+                HabitEntry.date.label("date"), habit_done.label("habits_done"),
+                literal(1).label("habits_count"), zero.label("states_sum"),
+                zero.label("states_count"), zero.label("has_journal")
+            )
+            .join(Habit, Habit.id == HabitEntry.habit_id)
+            .filter(Habit.user_id == uid, HabitEntry.date.between(start_date, end_date)),
+            db.select(StateEntry.date, zero, zero, state_score, state_done, zero)
+            .join(State, State.id == StateEntry.state_id)
+            .filter(State.user_id == uid, StateEntry.date.between(start_date, end_date)),
+            db.select(
+                JournalEntry.date, zero, zero, zero, zero,
+                case((func.length(JournalEntry.note) > 0, 1), else_=0)
+            )
+            .filter(JournalEntry.user_id == uid, JournalEntry.date.between(start_date, end_date)),
+        ).subquery()
+
+        days = db.session.execute(
+            db.select(
+                rows.c.date,
+                func.sum(rows.c.habits_done),
+                func.sum(rows.c.habits_count),
+                func.sum(rows.c.states_sum),
+                func.sum(rows.c.states_count),
+                func.max(rows.c.has_journal)
+            )
+            .group_by(rows.c.date)
+        )
+        return {
+            date: DayFill(habits_done, habits_count, states_sum, states_count, bool(has_journal))
+            for date, habits_done, habits_count, states_sum, states_count, has_journal in days
+        }
+
+
+class DayStatusCache:
+    """
+    Cache of day statuses, kept separately for every user. Users are kept
+    in LRU order and all statuses of user are dropped, when any of user's
+    data is saved or removed. Status calculated while user's data were
+    changed isn't saved. Statuses expire after ttl seconds, so changes made
+    by other processes are seen after that time.
+    """
+    def __init__(
+            self,
+            max_users: int = 1024,
+            max_entries_per_user: int = 64,
+            ttl: float = 60
+        ) -> None:
+        """
+        Initialize attributes of object.
+
+        Arguments:
+            max_users -- maximal count of users with cached statuses
+            max_entries_per_user -- maximal count of statuses cached for one user
+            ttl -- seconds after which status is calculated again,
+                0 turns cache off
+        """
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self._generation = 0
+        self.max_users = max_users
+        self.max_entries_per_user = max_entries_per_user
+        self.ttl = ttl
+
+    def configure(
+            self,
+            max_users: int,
+            ttl: float
+        ) -> None:
+        """
+        Set maximal count of users with cached statuses and time to live
+        of statuses and clear cache.
+        """
+        with self._lock:
+            self.max_users = max_users
+            self.ttl = ttl
+            self._users.clear()
+
+    def has_data(
+            self,
+            uid: int,
+            date: datetime.date
+        ) -> bool:
+        """
+        Return True if user entered any data for given day. See DayStatus.has_data.
+        """
+        return self._get(uid, date, lambda: DayStatus.has_data(uid, date))
+
+    def get_days_with_data(
+            self,
+            uid: int,
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> frozenset[datetime.date]:
+        """
+        Return set of days with user's data. See DayStatus.get_days_with_data.
+        """
+        return self._get(
+            uid,
+            (start_date, end_date),
+            lambda: DayStatus.get_days_with_data(uid, start_date, end_date)
+        )
+
+    def get_fill(
+            self,
+            uid: int,
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> dict[datetime.date, DayFill]:
+        """
+        Return summaries of days with user's data. See DayStatus.get_fill.
+        """
+        return self._get(
+            uid,
+            ("fill", start_date, end_date),
+            lambda: DayStatus.get_fill(uid, start_date, end_date)
+        )
+
+    def _get(
+            self,
+            uid: int,
+            key: Any,
+            calculate: Callable[[], Any]
+        ) -> Any:
+        """
+        Return cached status of user or calculate and save it.
+        """
+        with self._lock:
+            statuses = self._users.get(uid)
+            cached = statuses.get(key) if statuses is not None else None
+            if cached is not None and cached[0] > time.monotonic():
+                self._users.move_to_end(uid)
+                statuses.move_to_end(key)
+                return cached[1]
+            generation = self._generation
+
+        value = calculate()
+        with self._lock:
+            if generation != self._generation or self.ttl <= 0:
+                return value
+            statuses = self._users.setdefault(uid, OrderedDict())
+            statuses[key] = (time.monotonic() + self.ttl, value)
+            statuses.move_to_end(key)
+            self._users.move_to_end(uid)
+            while len(statuses) > self.max_entries_per_user:
+                statuses.popitem(last=False)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return value
+
+    def invalidate(
+            self,
+            uid: int
+        ) -> None:
+        """
+        Drop all cached statuses of user.
+
+        Arguments:
+            uid -- user's id
+        """
+        with self._lock:
+            self._generation += 1
+            self._users.pop(uid, None)
+
+    def clear(self) -> None:
+        """
+        Drop all cached statuses.
+        """
+        with self._lock:
+            self._users.clear()
+
+
+day_status_cache = DayStatusCache()
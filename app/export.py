@@ -0,0 +1,199 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+from typing import Any, Iterable, Iterator
+
+from app import db
+from app.models import Habit, HabitEntry, JournalEntry, State, StateEntry
+
+"""
+Count of rows fetched from database at once.
+"""
+EXPORT_BATCH_SIZE = 1000
+
+"""
+Columns of CSV export. Every record has a type and only columns, that
+make sense for this type, others are empty.
+"""
+CSV_COLUMNS = ["type", "id", "name", "start_date", "is_active", "date", "value", "note"]
+
+
+class DataExporter:
+    """
+    Streams all data of one user as CSV or JSON Lines, optionally gzipped.
+
+    Records are read in batches with yield_per and written as soon as they
+    are read, so memory used doesn't depend on amount of user's data.
+    Records are: habits, states, habit entries, state entries and journal
+    entries, in this order.
+    """
+    FORMATS = {
+        "csv": "text/csv",
+        "ndjson": "application/x-ndjson",
+    }
+
+    @classmethod
+    def get_queries(
+            cls,
+            uid: int
+        ) -> list[tuple[str, Any]]:
+        """
+        Return pairs of record type and query selecting records of this type
+        as rows with columns named like in CSV_COLUMNS.
+
+        Arguments:
+            uid -- user's id
+        """
+        return [
+            ("habit", db.select(Habit.id, Habit.name, Habit.start_date, Habit.is_active)
+                .filter(Habit.user_id == uid)
+                .order_by(Habit.id)),
+            ("state", db.select(State.id, State.name, State.start_date, State.is_active)
+                .filter(State.user_id == uid)
+                .order_by(State.id)),
+            ("habit_entry", db.select(Habit.id, Habit.name, HabitEntry.date, HabitEntry.value)
+                .join(HabitEntry, HabitEntry.habit_id == Habit.id)
+                .filter(Habit.user_id == uid)
+                .order_by(Habit.id, HabitEntry.date)),
+            ("state_entry", db.select(State.id, State.name, StateEntry.date, StateEntry.value)
+                .join(StateEntry, StateEntry.state_id == State.id)
+                .filter(State.user_id == uid)
+                .order_by(State.id, StateEntry.date)),
+            ("journal", db.select(JournalEntry.date, JournalEntry.note)
+                .filter(JournalEntry.user_id == uid)
+                .order_by(JournalEntry.date)),
+        ]
+
+    @classmethod
+    def iter_records(
+            cls,
+            uid: int
+        ) -> Iterator[dict[str, Any]]:
+        """
+        Yield all records of user as dictionaries, reading them from
+        database in batches.
+
+        Arguments:
+            uid -- user's id
+        """
+        for record_type, query in cls.get_queries(uid):
+            rows = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            keys = ["type", *rows.keys()]
+            for row in rows:
+                yield dict(zip(keys, (record_type, *row)))
+
+    @staticmethod
+    def to_text(value: Any) -> Any:
+        """
+        Return value, that can be written to JSON.
+        """
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        return value
+
+    @classmethod
+    def iter_ndjson(
+            cls,
+            records: Iterable[dict[str, Any]]
+        ) -> Iterator[str]:
+        """
+        Yield records as lines of JSON.
+        """
+        for record in records:
+            yield json.dumps(
+                {key: cls.to_text(value) for key, value in record.items()},
+                ensure_ascii=False
+            ) + "\n"
+
+    @classmethod
+    def iter_csv(
+            cls,
+            records: Iterable[dict[str, Any]],
+            chunk_size: int = 64 * 1024
+        ) -> Iterator[str]:
+        """
+        Yield header and records as CSV, in parts of about chunk_size
+        characters. Dates are written in ISO format.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        for record in records:
+            writer.writerow([record.get(column, "") for column in CSV_COLUMNS])
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    @staticmethod
+    def iter_chunks(
+            lines: Iterable[str],
+            chunk_size: int = 64 * 1024
+        ) -> Iterator[bytes]:
+        """
+        Yield lines encoded as UTF-8 and joined into chunks of about chunk_size
+        bytes, so response isn't sent line by line.
+        """
+        chunk = []
+        size = 0
+        for line in lines:
+            data = line.encode("utf-8")
+            chunk.append(data)
+            size += len(data)
+            if size >= chunk_size:
+                yield b"".join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield b"".join(chunk)
+
+    @staticmethod
+    def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Yield chunks compressed on the fly as one gzip stream.
+        """
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    @classmethod
+    def export(
+            cls,
+            uid: int,
+            data_format: str,
+            compress: bool = False
+        ) -> Iterator[bytes]:
+        """
+        Return generator of bytes of user's data export. Raise ValueError
+        for unknown format.
+
+        Arguments:
+            uid -- user's id
+            data_format -- "csv" or "ndjson"
+            compress -- if True, output is gzipped
+        """
+        if data_format not in cls.FORMATS:
+            raise ValueError("Incorrect export format!")
+
+        records = cls.iter_records(uid)
+        lines = cls.iter_csv(records) if data_format == "csv" else cls.iter_ndjson(records)
+        chunks = cls.iter_chunks(lines)
+        return cls.iter_gzip(chunks) if compress else chunks
+
+    @classmethod
+    def get_filename(
+            cls,
+            data_format: str,
+            compress: bool = False
+        ) -> str:
+        """
+        Return name of exported file.
+        """
+        filename = f"habit-tracker-{datetime.date.today():%Y%m%d}.{data_format}"
+        return filename + ".gz" if compress else filename
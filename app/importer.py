@@ -0,0 +1,427 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+from itertools import islice
+from typing import Any, BinaryIO, Iterable, Iterator, Literal, NamedTuple
+
+from sqlalchemy.dialects.sqlite import insert
+
+from app import db
+from app.models import Habit, JournalEntry, State, User
+from app.plot_handler import plot_cache
+from app.analytics import analytics_cache
+from app.stats_handler import EntryChange, StatsTableHandler
+from app.range_index import RangeIndex
+from app.vector_storage import VectorStorage
+from app.day_status import day_status_cache
+from app.user_cache import user_cache
+
+"""
+Count of rows written with one executemany and committed in one transaction.
+"""
+IMPORT_BATCH_SIZE = 5000
+
+"""
+Values accepted as habit's value in CSV, compared in lower case.
+"""
+TRUE_VALUES = {"true", "1", "yes", "on"}
+FALSE_VALUES = {"false", "0", "no", "off"}
+
+
+class ImportResult(NamedTuple):
+    """
+    Counts of objects created or saved by import.
+    """
+    habits_created: int
+    states_created: int
+    habit_entries: int
+    state_entries: int
+    journal_entries: int
+
+
+class DataImporter:
+    """
+    Imports user's history from CSV or JSON Lines file in the shape written
+    by DataExporter, optionally gzipped.
+
+    The whole file is validated before anything is written, so file with
+    an error doesn't change data. Habits and states are matched with user's
+    ones by name, missing ones are created. Entries are written with
+    INSERT ... ON CONFLICT DO UPDATE executed for batches of rows, every batch
+    in its own transaction, and replace existing entries of the same day,
+    so import interrupted in the middle can be run again. Statistics, range
+    indexes and vectors of changed objects are calculated again at the end,
+    instead of being updated for every entry.
+    """
+    FORMATS = ("csv", "ndjson")
+
+    @classmethod
+    def get_format(
+            cls,
+            filename: str
+        ) -> tuple[str, bool]:
+        """
+        Return format of file and whether it's gzipped, guessed from
+        its name. Raise ValueError for unknown extension.
+
+        Arguments:
+            filename -- name of file, like "export.csv" or "export.ndjson.gz"
+        """
+        name = filename.lower()
+        compress = name.endswith(".gz")
+        if compress:
+            name = name[:-3]
+        extension = name.rsplit(".", 1)[-1]
+        if extension == "jsonl":
+            extension = "ndjson"
+        if extension not in cls.FORMATS:
+            raise ValueError("Incorrect import format!")
+        return extension, compress
+
+    @classmethod
+    def read_records(
+            cls,
+            stream: BinaryIO,
+            data_format: str,
+            compress: bool = False
+        ) -> Iterator[tuple[int, dict[str, Any]]]:
+        """
+        Yield pairs of line number and record read from file. Raise ValueError
+        for unknown format or incorrect line of JSON.
+
+        Arguments:
+            stream -- binary file with data
+            data_format -- "csv" or "ndjson"
+            compress -- if True, file is gzipped
+        """
+        if data_format not in cls.FORMATS:
+            raise ValueError("Incorrect import format!")
+
+        if compress:
+            stream = gzip.GzipFile(fileobj=stream, mode="rb")
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+        if data_format == "csv":
+            reader = csv.DictReader(text)
+            for record in reader:
+                yield reader.line_num, record
+            return
+
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                raise ValueError(f"Line {line_number}: incorrect JSON.") from None
+            if not isinstance(record, dict):
+                raise ValueError(f"Line {line_number}: record has to be an object.")
+            yield line_number, record
+
+    @staticmethod
+    def parse_date(value: Any) -> datetime.date | None:
+        """
+        Return date written in ISO format or None if value is empty.
+        """
+        if value is None or value == "":
+            return None
+        return datetime.date.fromisoformat(value)
+
+    @staticmethod
+    def parse_bool(value: Any) -> bool | None:
+        """
+        Return boolean written as JSON boolean or text, or None if value is empty.
+        """
+        if value is None or value == "":
+            return None
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() in TRUE_VALUES:
+            return True
+        if str(value).lower() in FALSE_VALUES:
+            return False
+        raise ValueError(f"{value!r} isn't a boolean")
+
+    @staticmethod
+    def parse_state_value(value: Any) -> int | None:
+        """
+        Return value of state: number from 1 to 5, -1 or None for entry
+        without value.
+        """
+        if value is None or value == "":
+            return None
+        if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+            raise ValueError(f"{value!r} isn't a value of state")
+        number = int(value)
+        if number != -1 and not 1 <= number <= 5:
+            raise ValueError(f"{value!r} isn't a value of state")
+        return number
+
+    @classmethod
+    def parse(
+            cls,
+            records: Iterable[tuple[int, dict[str, Any]]]
+        ) -> tuple[dict, dict, dict]:
+        """
+        Validate records and collect them. Return three dictionaries:
+        definitions of habits and states keyed by (data type, name), values
+        of entries keyed by (data type, name, date) and journal entries keyed
+        by date. Later record replaces earlier one with the same key.
+        Raise ValueError with line number for incorrect record.
+
+        Arguments:
+            records -- pairs of line number and record
+        """
+        definitions = {}
+        entries = {}
+        journal = {}
+        for line_number, record in records:
+            try:
+                record_type = record.get("type")
+                if record_type in ("habit", "state"):
+                    name = cls.parse_name(record)
+                    definitions[(record_type.capitalize(), name)] = (
+                        cls.parse_date(record.get("start_date")),
+                        cls.parse_bool(record.get("is_active")),
+                    )
+                elif record_type == "habit_entry":
+                    value = cls.parse_bool(record.get("value"))
+                    if value is None:
+                        raise ValueError("value is missing")
+                    entries[("Habit", cls.parse_name(record), cls.parse_required_date(record))] = value
+                elif record_type == "state_entry":
+                    value = cls.parse_state_value(record.get("value"))
+                    entries[("State", cls.parse_name(record), cls.parse_required_date(record))] = value
+                elif record_type == "journal":
+                    journal[cls.parse_required_date(record)] = str(record.get("note") or "")
+                else:
+                    raise ValueError(f"unknown type {record_type!r}")
+            except (ValueError, TypeError) as error:
+                raise ValueError(f"Line {line_number}: {error}.") from None
+        return definitions, entries, journal
+
+    @staticmethod
+    def parse_name(record: dict[str, Any]) -> str:
+        """
+        Return name of habit or state from record, it can't be empty.
+        """
+        name = record.get("name")
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError("name is missing")
+        return name
+
+    @classmethod
+    def parse_required_date(cls, record: dict[str, Any]) -> datetime.date:
+        """
+        Return date from record, it can't be empty.
+        """
+        date = cls.parse_date(record.get("date"))
+        if date is None:
+            raise ValueError("date is missing")
+        return date
+
+    @classmethod
+    def prepare_objects(
+            cls,
+            uid: int,
+            definitions: dict[tuple[str, str], tuple],
+            entries: dict[tuple[str, str, datetime.date], Any]
+        ) -> tuple[dict[tuple[str, str], int], int, int]:
+        """
+        Match habits and states of file with user's ones by name and create
+        missing ones. Start date of every object is moved back, so all
+        its entries are after it. Return ids of objects keyed
+        by (data type, name) and counts of created habits and states.
+
+        Arguments:
+            uid -- user's id
+            definitions -- definitions of habits and states from file
+            entries -- values of entries from file
+        """
+        first_dates = {}
+        for data_type, name, date in entries:
+            key = (data_type, name)
+            if key not in first_dates or date < first_dates[key]:
+                first_dates[key] = date
+
+        objects = {}
+        for data_type, model in (("Habit", Habit), ("State", State)):
+            for obj in db.session.scalars(
+                    db.select(model).filter_by(user_id=uid).order_by(model.id)):
+                objects.setdefault((data_type, obj.name), obj)
+
+        created = {"Habit": 0, "State": 0}
+        # objects are created in order of file
+        for key in [*definitions, *(key for key in first_dates if key not in definitions)]:
+            data_type, name = key
+            start_date, is_active = definitions.get(key, (None, None))
+            dates = [date for date in (start_date, first_dates.get(key)) if date is not None]
+
+            obj = objects.get(key)
+            if obj is None:
+                model = Habit if data_type == "Habit" else State
+                obj = model(
+                    user_id=uid,
+                    name=name,
+                    start_date=min(dates, default=datetime.date.today()),
+                    is_active=True if is_active is None else is_active
+                )
+                db.session.add(obj)
+                objects[key] = obj
+                created[data_type] += 1
+            elif key in first_dates and (obj.start_date is None or first_dates[key] < obj.start_date):
+                obj.start_date = first_dates[key]
+
+        db.session.flush()
+        ids = {key: obj.id for key, obj in objects.items()}
+        return ids, created["Habit"], created["State"]
+
+    @staticmethod
+    def iter_batches(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+        """
+        Yield rows in lists of given size.
+        """
+        rows = iter(rows)
+        while batch := list(islice(rows, size)):
+            yield batch
+
+    @classmethod
+    def write_entries(
+            cls,
+            data_type: Literal["Habit", "State"],
+            rows: Iterable[dict[str, Any]],
+            batch_size: int
+        ) -> None:
+        """
+        Save entries with one executemany per batch, committing every batch.
+
+        Arguments:
+            data_type -- string indicating type of entries
+            rows -- dictionaries with owner's id, date and value
+            batch_size -- count of rows in batch
+        """
+        _, entry_model, owner_id = StatsTableHandler.get_models(data_type)
+        # statement on table, not on model, is run as one executemany without ORM bulk processing
+        statement = insert(entry_model.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=[owner_id.name, "date"],
+            set_={"value": statement.excluded.value}
+        )
+        for batch in cls.iter_batches(rows, batch_size):
+            db.session.execute(statement, batch)
+            db.session.commit()
+
+    @classmethod
+    def write_journal(
+            cls,
+            uid: int,
+            journal: dict[datetime.date, str],
+            batch_size: int
+        ) -> None:
+        """
+        Save journal entries with one executemany per batch, committing
+        every batch.
+
+        Arguments:
+            uid -- user's id
+            journal -- notes keyed by date
+            batch_size -- count of rows in batch
+        """
+        statement = insert(JournalEntry.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "date"],
+            set_={"note": statement.excluded.note}
+        )
+        rows = ({"user_id": uid, "date": date, "note": note} for date, note in journal.items())
+        for batch in cls.iter_batches(rows, batch_size):
+            db.session.execute(statement, batch)
+            db.session.commit()
+
+    @classmethod
+    def refresh_derived_data(
+            cls,
+            data_type: Literal["Habit", "State"],
+            entries: dict[tuple[int, datetime.date], Any]
+        ) -> None:
+        """
+        Calculate again everything, that depends on entries of objects,
+        which entries were imported, and drop their cached plots and analytics.
+
+        Arguments:
+            data_type -- string indicating type of entries
+            entries -- values of imported entries keyed by (owner's id, date)
+        """
+        ids = sorted({obj_id for obj_id, _ in entries})
+        if not ids:
+            return
+        session = db.session()
+        for obj_id in ids:
+            session.call_after_commit(plot_cache.invalidate, data_type, obj_id)
+            session.call_after_commit(analytics_cache.invalidate, data_type, obj_id)
+        StatsTableHandler.refresh(data_type, ids)
+        RangeIndex.refresh(data_type, ids)
+        if VectorStorage.is_enabled():
+            VectorStorage.apply_changes(data_type, [
+                EntryChange(obj_id, date, None, value, True)
+                for (obj_id, date), value in entries.items()
+            ])
+
+    @classmethod
+    def import_data(
+            cls,
+            uid: int,
+            stream: BinaryIO,
+            data_format: str,
+            compress: bool = False,
+            batch_size: int = IMPORT_BATCH_SIZE
+        ) -> ImportResult:
+        """
+        Import habits, states and entries from file to account of user.
+        Raise ValueError if file is incorrect, nothing is saved then.
+
+        Arguments:
+            uid -- user's id
+            stream -- binary file with data
+            data_format -- "csv" or "ndjson"
+            compress -- if True, file is gzipped
+            batch_size -- count of rows saved in one transaction
+        """
+        try:
+            definitions, entries, journal = cls.parse(cls.read_records(stream, data_format, compress))
+        except (UnicodeDecodeError, OSError, EOFError, csv.Error) as error:
+            raise ValueError(f"File can't be read: {error}") from None
+
+        ids, habits_created, states_created = cls.prepare_objects(uid, definitions, entries)
+        db.session.commit()
+        user_cache.invalidate(uid)
+
+        counts = {}
+        for data_type in ("Habit", "State"):
+            _, _, owner_id = StatsTableHandler.get_models(data_type)
+            values = {
+                (ids[(entry_type, name)], date): value
+                for (entry_type, name, date), value in entries.items()
+                if entry_type == data_type
+            }
+            cls.write_entries(data_type, (
+                {owner_id.key: obj_id, "date": date, "value": value}
+                for (obj_id, date), value in values.items()
+            ), batch_size)
+            cls.refresh_derived_data(data_type, values)
+            counts[data_type] = len(values)
+
+        cls.write_journal(uid, journal, batch_size)
+        # days before the first journal entry can be opened only if first
+        # entry date is moved back to the first imported entry of any kind
+        imported_dates = [date for _, _, date in entries] + list(journal)
+        if imported_dates:
+            User.entry_saved(uid, min(imported_dates))
+        db.session.commit()
+        day_status_cache.invalidate(uid)
+        user_cache.invalidate(uid)
+
+        return ImportResult(
+            habits_created, states_created, counts["Habit"], counts["State"], len(journal)
+        )
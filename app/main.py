@@ -1,3 +1,4 @@
+import hashlib
 import datetime
 import calendar
 
@@ -8,9 +9,13 @@ from flask import request
 from flask_login import login_required
 from flask_login import current_user
 
-from . import db, app
+from sqlalchemy.orm import contains_eager
+
+from . import db
 from .models import User, JournalEntry, HabitEntry, Habit, State, StateEntry
-from .plot_handler import PlotManager
+from .plot_handler import PlotManager, StatsUtils
+from .analytics import analytics_cache
+from .day_status import day_status_cache
 from .utils import CalendarUtils, DataOperationUtils, DatetimeUtils
 
 
@@ -28,12 +33,12 @@ def index():
     today = datetime.date.today()
     today_raw = today.strftime(r"%Y%m%d")
     
-    does_today_entry_exists = is_entry_empty(uid, today)
+    does_today_entry_exists = day_status_cache.has_data(uid, today)
     
     habits = current_user.habits
     states = current_user.states
 
-    pm = PlotManager(today, does_today_entry_exists )
+    pm = PlotManager(today, int(does_today_entry_exists))
     pm.make_plots(habits, "Habit")
     pm.make_plots(states, "State")
 
@@ -42,7 +47,7 @@ def index():
         today_date = today_raw,
         habits = habits,
         states = states,
-        is_entry_empty = does_today_entry_exists
+        is_entry_empty = not does_today_entry_exists
     )
 
 @main.route('/send_form', methods = ['POST'])
@@ -55,21 +60,13 @@ def index_post():
         uid = current_user.id
         today = datetime.date.today()
 
-        # handle journal
-        journal_entry = request.form.get("journal_entry")
-        DataOperationUtils.save_journal_entry(uid, today, journal_entry)
-
-        # handle habits
         user_habits = db.session.scalars(
             db.select(Habit).filter_by(user_id=uid)
         ).all()
-        DataOperationUtils.save_habit_entries(user_habits, request.form, today)
-        
-        # handle states
         user_states = db.session.scalars(
             db.select(State).filter_by(user_id=uid)
         ).all()
-        DataOperationUtils.save_state_entries(user_states, request.form, today)
+        DataOperationUtils.save_day(uid, today, user_habits, user_states, request.form)
 
         db.session.commit()
 
@@ -144,12 +141,14 @@ def day_date(date) -> str | Response:
     habits_entries = db.session.scalars(
         db.select(HabitEntry).filter_by(date=parsed_date)
         .join(Habit).filter_by(user_id=uid)
+        .options(contains_eager(HabitEntry.habit))
     ).all()
 
     # get all state entries from this day
     state_entries = db.session.scalars(
         db.select(StateEntry).filter_by(date=parsed_date)
         .join(State).filter_by(user_id=uid)
+        .options(contains_eager(StateEntry.state))
     ).all()
 
     # get journal entry from this day
@@ -175,13 +174,60 @@ def day_date(date) -> str | Response:
         is_first_day = is_first_day
     )
 
-def is_entry_empty(uid, date):
-    cnt = JournalEntry.query.filter_by(user_id=uid).filter_by(date=date).count()
-    cnt += HabitEntry.query.filter_by(date=date).join(Habit).filter(Habit.user_id=="uid").count()
-    cnt += StateEntry.query.filter_by(date=date).join(State).filter(State.user_id=="uid").count()
-    is_entry_empty = not cnt
+@main.route('/plot/<kind>/<int:obj_id>.<fmt>', methods = ['GET'])
+@login_required
+def plot_image(kind, obj_id, fmt) -> Response:
+    """
+    Return heatmap of current user's habit or state as an image.
+
+    Response has strong ETag and Last-Modified headers, so browser
+    revalidates its cached copy and gets 304 response if plot didn't change.
+
+    Parameters:
+        kind -- "habit" or "state"
+        obj_id -- id of Habit or State
+        fmt -- format of image, "png" or "svg"
+    """
+    models = {"habit": Habit, "state": State}
+    if kind not in models or fmt not in ("png", "svg"):
+        abort(404)
+
+    obj = db.session.scalar(
+        db.select(models[kind])
+        .filter_by(user_id=current_user.id, id=obj_id)
+    )
+    if obj is None:
+        abort(404)
+
+    pm = PlotManager(datetime.date.today(), 0)
+    cached = pm.get_image(obj, kind.capitalize(), fmt)
+
+    response = Response(
+        cached.image,
+        mimetype="image/png" if fmt == "png" else "image/svg+xml"
+    )
+    response.set_etag(hashlib.sha1(cached.image).hexdigest())
+    response.last_modified = cached.rendered_at
+    # image can be stored, but browser has to check if it's still valid
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+
+    return response.make_conditional(request)
 
-    return is_entry_empty
+@main.route('/analytics', methods = ['GET'])
+@login_required
+def analytics() -> str:
+    """
+    Return page showing how current user's habits relate to states.
+    """
+    result = analytics_cache.get(
+        current_user.id, current_user.habits, current_user.states
+    )
+    return render_template(
+        'analytics.html',
+        n_days = result.n_days,
+        pairs = result.get_pairs()
+    )
 
 @main.route('/new/<date>', methods = ['GET'])
 @login_required
@@ -219,25 +265,16 @@ def new_entry_post():
     if request.form:
         uid = current_user.id
         raw_date = request.referrer.split("/")[-1]
-        date = datetime.datetime.strptime(raw_date, r"%Y%m%d")
-
-        # save_entry
-        journal_entry = request.form.get("journal_entry")
-        DataOperationUtils.save_journal_entry(uid, date, journal_entry)
+        date = datetime.datetime.strptime(raw_date, r"%Y%m%d").date()
 
-        # save_habits
+        # only habits and states that started not later than specified day
         user_habits = db.session.scalars(
             db.select(Habit).filter_by(user_id=uid).filter(Habit.start_date <= date)
-            # only habits that started not later than specified day
         ).all()
-        DataOperationUtils.save_habit_entries(user_habits, request.form, date)
-
-        # handle states
         user_states = db.session.scalars(
             db.select(State).filter_by(user_id=uid).filter(State.start_date <= date)
-            # only states that started not later than specified day
         ).all()
-        DataOperationUtils.save_state_entries(user_states, request.form, date)
+        DataOperationUtils.save_day(uid, date, user_habits, user_states, request.form)
 
         db.session.commit()
     
@@ -265,24 +302,23 @@ def edit(date):
         return redirect(page_to_redirect)
     
     # handle attempt to edit null entry
-    if is_entry_empty(uid, date):
+    if not day_status_cache.has_data(uid, date):
         return redirect(url_for("main.new_entry", date=date.strftime(r"%Y%m%d")))
     
-    habits = current_user.habits
-    states = current_user.states
-
     # add missing entries if habit or state was created 
     # after some entries to this day was already entered
-    DataOperationUtils.add_missing_entries(habits, states, date)
+    DataOperationUtils.add_missing_entries(uid, date)
 
     habits_entries = db.session.scalars(
         db.select(HabitEntry).filter_by(date=date)
         .join(Habit).filter_by(user_id=uid)
+        .options(contains_eager(HabitEntry.habit))
     ).all()
 
     state_entries = db.session.scalars(
         db.select(StateEntry).filter_by(date=date)
         .join(State).filter_by(user_id=uid)
+        .options(contains_eager(StateEntry.state))
     ).all()
 
     journal_entry = db.session.scalar(
@@ -308,22 +344,21 @@ def edit_post() -> Response:
 
     try:
         date = request.referrer.split("/")[-1]
-        formated_date = datetime.datetime.strptime(date, r"%Y%m%d").strftime(r"%Y-%m-%d")
+        parsed_date = datetime.datetime.strptime(date, r"%Y%m%d").date()
     except:
         abort(404)
 
     user_habits = db.session.scalars(
-        db.select(Habit).filter_by(user_id = uid).filter(Habit.start_date <= formated_date)
+        db.select(Habit).filter_by(user_id = uid).filter(Habit.start_date <= parsed_date)
     ).all()
-    DataOperationUtils.update_habits(user_habits, formated_date, request.form)
-
     user_states =  db.session.scalars(
-        db.select(State).filter_by(user_id = uid).filter(State.start_date <= formated_date)
+        db.select(State).filter_by(user_id = uid).filter(State.start_date <= parsed_date)
     ).all()
-    DataOperationUtils.update_states(user_states, formated_date, request.form)
-    
-    DataOperationUtils.update_note(uid, request.form, formated_date)
-    
+    # states left empty on edit page have no value
+    DataOperationUtils.save_day(
+        uid, parsed_date, user_habits, user_states, request.form, empty_state_value=None
+    )
+
     db.session.commit()
     return redirect(f"day/{date}")
 
@@ -351,9 +386,18 @@ def calendar_view(mdate) -> str:
     month = mdate[4:]
     uid = current_user.id
 
+    # dates of every day are built later, so out of range year has to be
+    # rejected here, not only month unknown to calendar module
     try:
-        cal = calendar.monthcalendar(int(year), int(month))
-    except:
+        year_number, month_number = int(year), int(month)
+    except ValueError:
+        abort(404)
+    if not (datetime.MINYEAR <= year_number <= datetime.MAXYEAR and 1 <= month_number <= 12):
+        abort(404)
+
+    try:
+        cal = CalendarUtils.get_month_layout(year_number, month_number)
+    except ValueError:
         abort(404)
 
     last_month, next_month = CalendarUtils.get_next_and_previous_months(month, year)
@@ -369,3 +413,58 @@ def calendar_view(mdate) -> str:
         last_month=url_for("main.calendar_view", mdate=last_month),
         next_month=url_for("main.calendar_view", mdate=next_month)
     )
+
+@main.route('/review', methods = ['GET'])
+@login_required
+def review_year_not_given() -> Response:
+    """
+    View redirect user to review of current year.
+    """
+    return redirect(url_for("main.review", year=datetime.date.today().year))
+
+@main.route('/review/<int:year>', methods = ['GET'])
+@login_required
+def review(year: int) -> str:
+    """
+    View renders summary of given year, month by month: percentage of days
+    with every habit done and average value of every state, followed
+    by the longest streak and count of days without entry of every habit.
+
+    Parameters:
+        year -- year of review, for example 2023
+    """
+    if not datetime.MINYEAR < year < datetime.MAXYEAR:
+        abort(404)
+
+    today = datetime.date.today()
+    ranges = DatetimeUtils.get_month_ranges(year, today)
+    # the last column covers the whole year
+    ranges.append((datetime.date(year, 1, 1), min(datetime.date(year, 12, 31), today)))
+
+    habits = current_user.habits
+    states = current_user.states
+    percentages = StatsUtils.get_range_percentages(habits, ranges)
+    averages = StatsUtils.get_range_averages(states, ranges)
+    summaries = StatsUtils.get_streak_summaries(habits, *ranges[-1])
+    habit_rows = [(habit.name, percentages[habit.id]) for habit in habits]
+    state_rows = [(state.name, averages[state.id]) for state in states]
+    streak_rows = []
+    for habit in habits:
+        summary = summaries[habit.id]
+        longest = max(summary.streaks, key=lambda streak: streak.length, default=None)
+        streak_rows.append((
+            habit.name,
+            longest,
+            sum((gap.end_date - gap.start_date).days + 1 for gap in summary.gaps)
+        ))
+
+    return render_template(
+        "review.html",
+        year=year,
+        months=[calendar.month_abbr[start_date.month] for start_date, _ in ranges[:-1]],
+        habits=habit_rows,
+        states=state_rows,
+        streaks=streak_rows,
+        last_year=url_for("main.review", year=year - 1),
+        next_year=url_for("main.review", year=year + 1)
+    )
@@ -0,0 +1,92 @@
+import sqlalchemy as sa
+
+from app import db
+from app.models import User
+
+
+class Migrations:
+    """
+    Brings schema of existing database up to date with models. It's safe
+    to run it many times, only missing parts of schema are created.
+
+    db.create_all creates missing tables with their indexes, but it doesn't
+    change tables that already exist, so columns and indexes added
+    to existing tables are created here.
+    """
+    @classmethod
+    def upgrade(cls) -> list[str]:
+        """
+        Create missing tables, columns and indexes. Return list of names
+        of created database objects.
+        """
+        inspector = sa.inspect(db.engine)
+        existing_tables = set(inspector.get_table_names())
+
+        created = [
+            table.name for table in db.metadata.sorted_tables
+            if table.name not in existing_tables
+        ]
+        db.create_all()
+
+        for table in db.metadata.sorted_tables:
+            if table.name in created:
+                continue
+            created += cls.create_missing_columns(inspector, table)
+            created += cls.create_missing_indexes(inspector, table)
+
+        if "user.first_entry_date" in created:
+            User.refresh_first_entry_dates()
+            db.session.commit()
+        return created
+
+    @classmethod
+    def create_missing_columns(
+            cls,
+            inspector: sa.Inspector,
+            table: sa.Table
+        ) -> list[str]:
+        """
+        Add columns of table, that don't exist in database. Return list
+        of their names prefixed with table's name. New columns have to be
+        nullable, because existing rows get NULL.
+
+        Arguments:
+            inspector -- inspector of database
+            table -- table of model
+        """
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        preparer = db.engine.dialect.identifier_preparer
+        created = []
+        with db.engine.begin() as connection:
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(sa.text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+                ))
+                created.append(f"{table.name}.{column.name}")
+        return created
+
+    @classmethod
+    def create_missing_indexes(
+            cls,
+            inspector: sa.Inspector,
+            table: sa.Table
+        ) -> list[str]:
+        """
+        Create indexes of table, that don't exist in database. Return list
+        of their names.
+
+        Arguments:
+            inspector -- inspector of database
+            table -- table of model
+        """
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        created = []
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+        return created
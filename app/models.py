@@ -1,6 +1,8 @@
 import datetime
 
+from flask import g, has_app_context
 from flask_login import UserMixin
+from sqlalchemy import or_, union_all
 from sqlalchemy.sql import func
 
 from app import db, login_manager
@@ -8,11 +10,9 @@ from app import db, login_manager
 
 @login_manager.user_loader
 def load_user(user_id):
-    # since the user_id is just the primary key of our user table, use it in the query for the user
-    user = db.session.scalar(
-        db.select(User).filter_by(id=int(user_id))
-    )
-    return user
+    # user with habits and states is usually taken from cache, without querying database
+    from app.user_cache import user_cache
+    return user_cache.get(int(user_id))
 
 
 class User(UserMixin, db.Model):
@@ -20,6 +20,8 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(100), unique=True)
     password = db.Column(db.String(100))
     name = db.Column(db.String(1000))
+    # date of the first entry of any kind, kept up to date when entries are saved
+    first_entry_date = db.Column(db.Date, nullable=True)
 
     journal_entries = db.relationship('JournalEntry', backref='user', cascade='all, delete, delete-orphan')
     habits = db.relationship('Habit', backref='user', cascade='all, delete, delete-orphan')
@@ -32,29 +34,90 @@ class User(UserMixin, db.Model):
         Returns date of first ever user's entry
 
         If user doesn't have any entries then return today date.
+        Result is remembered until the end of request.
         """
-        min_date = db.session.scalar(
-            func.min(
-                db.select(JournalEntry.date).filter_by(user_id=self.id)
-            )
+        min_dates = g.setdefault("min_dates", {}) if has_app_context() else {}
+        if self.id not in min_dates:
+            min_dates[self.id] = self.first_entry_date or datetime.date.today()
+        return min_dates[self.id]
+
+    @classmethod
+    def entry_saved(
+            cls,
+            uid: int,
+            date: datetime.date
+        ) -> bool:
+        """
+        Move first entry date of user back to given date, if it's earlier.
+        Return True if date was changed.
+
+        Arguments:
+            uid -- user's id
+            date -- date of saved entry
+        """
+        result = db.session.execute(
+            db.update(User)
+            .filter(User.id == uid)
+            .filter(or_(User.first_entry_date.is_(None), User.first_entry_date > date))
+            .values(first_entry_date=date)
         )
+        if has_app_context():
+            g.setdefault("min_dates", {}).pop(uid, None)
+        return result.rowcount > 0
+
+    @classmethod
+    def refresh_first_entry_dates(
+            cls,
+            ids: list[int] | None = None
+        ) -> None:
+        """
+        Calculate again first entry dates of users from their journal,
+        habit and state entries. It has to be called after entries are removed.
 
-        if min_date is None:
-            min_date = datetime.date.today()
+        Arguments:
+            ids -- ids of users, if it's None, all users are updated
+        """
+        first_dates = union_all(
+            db.select(func.min(JournalEntry.date).label("date"))
+            .filter(JournalEntry.user_id == User.id)
+            .correlate(User),
+            db.select(func.min(HabitEntry.date))
+            .join(Habit)
+            .filter(Habit.user_id == User.id)
+            .correlate(User),
+            db.select(func.min(StateEntry.date))
+            .join(State)
+            .filter(State.user_id == User.id)
+            .correlate(User),
+        ).subquery()
+        statement = db.update(User).values(
+            first_entry_date=db.select(func.min(first_dates.c.date)).scalar_subquery()
+        )
+        if ids is not None:
+            statement = statement.filter(User.id.in_(ids))
+        db.session.execute(statement)
+        if has_app_context():
+            g.pop("min_dates", None)
 
-        return min_date
 
 class Habit(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), index=True)
     name = db.Column(db.Text)
     start_date = db.Column(db.Date)
     is_active = db.Column(db.Boolean)
 
-    habit_entries = db.relationship('HabitEntry', backref='habit', cascade='all, delete, delete-orphan')
+    # entries are ordered by date, so code reading collection sees them in order of days
+    habit_entries = db.relationship('HabitEntry', backref='habit', order_by='HabitEntry.date', cascade='all, delete, delete-orphan')
+    stats = db.relationship('HabitStats', backref='habit', uselist=False, cascade='all, delete, delete-orphan')
+    year_vectors = db.relationship('HabitYearVector', backref='habit', cascade='all, delete, delete-orphan')
+    range_index = db.relationship('HabitRangeIndex', backref='habit', uselist=False, cascade='all, delete, delete-orphan')
 
 
 class HabitEntry(db.Model):
+    # entries of one day are looked up by date before joining habits
+    __table_args__ = (db.Index("ix_habit_entry_date_habit_id", "date", "habit_id"),)
+
     habit_id = db.Column(db.Integer, db.ForeignKey("habit.id"), primary_key=True)
     date = db.Column(db.Date, primary_key=True)
     value = db.Column(db.Boolean, nullable=False)
@@ -68,15 +131,95 @@ class JournalEntry(db.Model):
 
 class State(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), index=True)
     name = db.Column(db.Text)
     start_date = db.Column(db.Date)
     is_active = db.Column(db.Boolean)
 
-    state_entries = db.relationship('StateEntry', backref='state', cascade='all, delete, delete-orphan')
+    # entries are ordered by date, so code reading collection sees them in order of days
+    state_entries = db.relationship('StateEntry', backref='state', order_by='StateEntry.date', cascade='all, delete, delete-orphan')
+    stats = db.relationship('StateStats', backref='state', uselist=False, cascade='all, delete, delete-orphan')
+    year_vectors = db.relationship('StateYearVector', backref='state', cascade='all, delete, delete-orphan')
+    range_index = db.relationship('StateRangeIndex', backref='state', uselist=False, cascade='all, delete, delete-orphan')
 
 
 class StateEntry(db.Model):
+    # entries of one day are looked up by date before joining states
+    __table_args__ = (db.Index("ix_state_entry_date_state_id", "date", "state_id"),)
+
     state_id = db.Column(db.Integer, db.ForeignKey("state.id"), primary_key=True)
     date = db.Column(db.Date, primary_key=True)
     value = db.Column(db.Integer, nullable=True)
+
+
+class HabitStats(db.Model):
+    """
+    Statistics of habit's entries, updated every time its entries are saved.
+    """
+    habit_id = db.Column(db.Integer, db.ForeignKey("habit.id"), primary_key=True)
+    done_count = db.Column(db.Integer, nullable=False, default=0)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    value_sum = db.Column(db.Integer, nullable=False, default=0)
+    current_streak = db.Column(db.Integer, nullable=False, default=0)
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_entry_date = db.Column(db.Date, nullable=True)
+
+
+class StateStats(db.Model):
+    """
+    Statistics of state's entries, updated every time its entries are saved.
+    Entries without value (None or -1) are counted only in total_count.
+    """
+    state_id = db.Column(db.Integer, db.ForeignKey("state.id"), primary_key=True)
+    done_count = db.Column(db.Integer, nullable=False, default=0)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    value_sum = db.Column(db.Integer, nullable=False, default=0)
+    current_streak = db.Column(db.Integer, nullable=False, default=0)
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_entry_date = db.Column(db.Date, nullable=True)
+
+
+class HabitYearVector(db.Model):
+    """
+    Values of habit's entries from one year, one byte for every day of year.
+    Byte is equal to value + 1, so 0 means that there is no entry.
+    """
+    habit_id = db.Column(db.Integer, db.ForeignKey("habit.id"), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    values = db.Column(db.LargeBinary(366), nullable=False)
+
+
+class StateYearVector(db.Model):
+    """
+    Values of state's entries from one year, one byte for every day of year.
+    Byte is equal to value + 1, so 0 means that there is no entry
+    or entry without value.
+    """
+    state_id = db.Column(db.Integer, db.ForeignKey("state.id"), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    values = db.Column(db.LargeBinary(366), nullable=False)
+
+
+class HabitRangeIndex(db.Model):
+    """
+    Prefix sums of habit's entries, used to get statistics of any range
+    of dates. Row i of prefix_sums contains count of done entries, count
+    of entries and sum of values of all days before start_date + i days,
+    stored as int32 array of shape (days + 1, 3).
+    """
+    habit_id = db.Column(db.Integer, db.ForeignKey("habit.id"), primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    prefix_sums = db.Column(db.LargeBinary, nullable=False)
+
+
+class StateRangeIndex(db.Model):
+    """
+    Prefix sums of state's entries, used to get statistics of any range
+    of dates. Row i of prefix_sums contains count of entries with value,
+    count of entries and sum of values of all days before start_date + i days,
+    stored as int32 array of shape (days + 1, 3).
+    """
+    state_id = db.Column(db.Integer, db.ForeignKey("state.id"), primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    prefix_sums = db.Column(db.LargeBinary, nullable=False)
+
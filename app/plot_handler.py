@@ -1,16 +1,42 @@
-import matplotlib.pyplot as plt
-import matplotlib as mpl
-from matplotlib.colors import ListedColormap
-
-import july
-from july.utils import date_range
-
 import io
+import os
+import glob
 import base64
 import datetime
-from typing import Literal
+import threading
+import multiprocessing
+from collections import OrderedDict
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Literal, NamedTuple
+
+from flask import current_app, url_for
+
+try:
+    import matplotlib.pyplot as plt
+    import matplotlib as mpl
+    from matplotlib.colors import ListedColormap
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    import july
+    from july.rcmod import update_rcparams
+except ImportError:
+    # matplotlib and july are needed only by Plotter, deployments using
+    # RasterPlotter don't have to install them
+    july = None
 
-from app.models import Habit, State
+import numpy as np
+
+from app import db
+from app.models import Habit, HabitEntry, State, StateEntry
+from app.raster import RasterPlotter, DEFAULT_PALETTES
+from app.stats_handler import StatsTableHandler, QueryStatsHandler
+from app.range_index import RangeIndex, RangeStats
+from app.streaks import HabitHistory, StreakEngine, StreakSummary
+from app.trends import TrendHandler
+from app.vector_storage import VectorStorage
 
 """
 CMAP for state responding to values:
@@ -24,17 +50,238 @@ CMAP for habit responding ti values:
     green -- 1 -> Habit done
 """
 DEFAULT_CMAPS = {
-    "state": ListedColormap(
-            ["grey", 
-             "grey", 
-             "darkred", 
-             "red", 
-             "orange", 
-             "yellowgreen", 
-             "darkgreen"]
-        ),
-    "habit": ListedColormap(["grey", "red", "green"])
-}
+    "state": ListedColormap(DEFAULT_PALETTES["state"]),
+    "habit": ListedColormap(DEFAULT_PALETTES["habit"])
+} if july else {}
+
+class CachedPlot(NamedTuple):
+    """
+    Image stored in PlotCache together with time it was rendered at.
+    """
+    image: bytes
+    rendered_at: datetime.datetime
+
+
+class PlotCache:
+    """
+    Two-tier cache of rendered heatmaps.
+
+    Images are kept in memory in LRU order, bounded by max_entries. If
+    directory is set, they are also written to disk, so they survive
+    a restart of the worker.
+
+    Key of a cached image is a tuple (object type, object id, window end date,
+    entry version, image format). Entry version is bumped each time entries
+    of the object are changed, so outdated images are never returned.
+    Images rendered for an older version aren't stored.
+
+    Versions and memory tier belong to one process, so images expire after
+    ttl seconds and changes made by other workers are seen after that time.
+    """
+    def __init__(
+            self,
+            max_entries: int = 256,
+            directory: str | None = None,
+            ttl: float = 60
+        ) -> None:
+        """
+        Initialize attributes of object.
+
+        Arguments:
+            max_entries -- maximal count of images kept in memory
+            directory -- path to directory for on-disk tier, disk tier
+                is turned off if it's None
+            ttl -- seconds after which cached image is rendered again,
+                0 turns cache off
+        """
+        self._lock = threading.Lock()
+        self._images = OrderedDict()
+        self._versions = {}
+        self.configure(max_entries, directory, ttl)
+
+    def configure(
+            self,
+            max_entries: int,
+            directory: str | None = None,
+            ttl: float = 60
+        ) -> None:
+        """
+        Set size of memory tier, location of disk tier and time to live
+        of images. Clear memory tier.
+
+        Arguments:
+            max_entries -- maximal count of images kept in memory
+            directory -- path to directory for on-disk tier or None
+            ttl -- seconds after which cached image is rendered again
+        """
+        with self._lock:
+            self.max_entries = max_entries
+            self.directory = directory
+            self.ttl = ttl
+            self._images.clear()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def make_key(
+            self,
+            data_type: str,
+            obj_id: int,
+            end_date: datetime.date,
+            fmt: Literal["png", "svg"] = "png"
+        ) -> tuple:
+        """
+        Return cache key for current version of object's entries.
+
+        Arguments:
+            data_type -- string indicating type of data, "Habit" or "State"
+            obj_id -- id of Habit or State object
+            end_date -- last date of plotted window
+            fmt -- format of image
+        """
+        version = self._versions.get((data_type, obj_id), 0)
+        return (data_type, obj_id, end_date, version, fmt)
+
+    def get(
+            self,
+            key: tuple
+        ) -> CachedPlot | None:
+        """
+        Return cached image or None if there isn't any.
+
+        Arguments:
+            key -- key created by make_key method
+        """
+        with self._lock:
+            cached = self._images.get(key)
+            if cached is not None and self.is_fresh(cached.rendered_at):
+                self._images.move_to_end(key)
+                return cached
+
+        path = self._get_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+
+        rendered_at = datetime.datetime.fromtimestamp(
+            os.path.getmtime(path), datetime.timezone.utc
+        )
+        if not self.is_fresh(rendered_at):
+            return None
+        with open(path, "rb") as f:
+            image = f.read()
+        cached = CachedPlot(image, rendered_at)
+        self._remember(key, cached)
+        return cached
+
+    def put(
+            self,
+            key: tuple,
+            image: bytes
+        ) -> CachedPlot:
+        """
+        Save image in cache. Return saved entry. Image isn't saved
+        if entries were changed after its key was made.
+
+        Arguments:
+            key -- key created by make_key method
+            image -- encoded image
+        """
+        cached = CachedPlot(image, self.now())
+        if self.ttl <= 0 or key != self.make_key(*key[:3], key[4]):
+            return cached
+        self._remember(key, cached)
+
+        path = self._get_path(key)
+        if path is not None:
+            # write to temporary file first, so other workers never read
+            # partially written image
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(image)
+            os.replace(tmp_path, path)
+
+        return cached
+
+    def invalidate(
+            self,
+            data_type: str,
+            obj_id: int
+        ) -> None:
+        """
+        Drop all cached images of given object.
+
+        Arguments:
+            data_type -- string indicating type of data, "Habit" or "State"
+            obj_id -- id of Habit or State object
+        """
+        with self._lock:
+            self._versions[(data_type, obj_id)] = self._versions.get((data_type, obj_id), 0) + 1
+            outdated = [key for key in self._images if key[:2] == (data_type, obj_id)]
+            for key in outdated:
+                del self._images[key]
+
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, f"{data_type}-{obj_id}-*")):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def clear(self) -> None:
+        """
+        Drop all cached images from memory tier.
+        """
+        with self._lock:
+            self._images.clear()
+
+    @staticmethod
+    def now() -> datetime.datetime:
+        """
+        Return current time, used as render time of images.
+        """
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def is_fresh(self, rendered_at: datetime.datetime) -> bool:
+        """
+        Return True if image rendered at given time is younger than ttl.
+        """
+        return rendered_at + datetime.timedelta(seconds=self.ttl) > self.now()
+
+    def _remember(
+            self,
+            key: tuple,
+            cached: CachedPlot
+        ) -> None:
+        """
+        Put image in memory tier and evict least recently used images
+        if it's full.
+        """
+        with self._lock:
+            self._images[key] = cached
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+
+    def _get_path(
+            self,
+            key: tuple
+        ) -> str | None:
+        """
+        Return path of image in disk tier or None if disk tier is turned off.
+
+        Version isn't part of the file name, because images of object
+        are removed from disk on invalidation.
+        """
+        if not self.directory:
+            return None
+        data_type, obj_id, end_date, _, fmt = key
+        return os.path.join(
+            self.directory,
+            f"{data_type}-{obj_id}-{end_date.strftime(r'%Y%m%d')}.{fmt}"
+        )
+
+plot_cache = PlotCache()
+
+_matplotlib_lock = threading.Lock()
 
 class DashboardStatsHandler():
     """
@@ -55,7 +302,24 @@ class DashboardStatsHandler():
         """
         self.end_date = date
         self.start_date = date - datetime.timedelta(days=365)
-        
+        self.stats_handler = self.get_stats_handler()
+
+    @classmethod
+    def get_stats_handler(cls) -> type:
+        """
+        Return class providing statistics, chosen by STATS_BACKEND setting
+        of application. "table" reads them from HabitStats and StateStats
+        tables, "query" calculates them with aggregate queries.
+        Raise ValueError if there is no such backend.
+        """
+        backend = current_app.config.get("STATS_BACKEND", "table")
+        if backend == "table":
+            return StatsTableHandler
+        elif backend == "query":
+            return QueryStatsHandler
+        else:
+            raise ValueError(f"Unknown statistics backend: {backend}")
+
     def prepare_habit_data(self,
             habits: list[Habit],
             does_today_entry_exists: int
@@ -63,16 +327,22 @@ class DashboardStatsHandler():
         """
         Calculate statistics for Habit object.
 
+        Statistics are taken from chosen statistics backend, so no entries
+        are loaded.
+
         Arguments:
             habits -- collection containing Habit objects
             does_today_entry_exists -- number indicating if today's entry were
                 already entered by user
         """
-
+        stats = self.stats_handler.get_stats(habits, "Habit")
         for habit in habits:
             habit.n_days = StatsUtils.get_tracking_days_count(habit, self.end_date, does_today_entry_exists)
-            habit.percentage = StatsUtils.get_habit_fulfillment_percentage(habit, habit.n_days)
-            habit.streak = StatsUtils.get_current_streak(habit)
+            habit.percentage = StatsUtils.get_percentage(stats[habit.id].done_count, habit.n_days)
+            habit.streak = stats[habit.id].current_streak
+            habit.longest_streak = stats[habit.id].longest_streak
+            habit.missed_days = max(habit.n_days - stats[habit.id].total_count, 0)
+        self.prepare_trends(habits, "Habit", does_today_entry_exists)
 
     def prepare_state_data(
             self,
@@ -82,14 +352,48 @@ class DashboardStatsHandler():
         """
         Calculate statistics for State object.
 
+        Statistics are taken from chosen statistics backend, so no entries
+        are loaded.
+
         Arguments:
             states -- collection containing State objects
             does_today_entry_exists -- number indicating if today's entry were
                 already entered by user
         """
+        stats = self.stats_handler.get_stats(states, "State")
         for state in states:
             state.n_days = StatsUtils.get_tracking_days_count(state, self.end_date, does_today_entry_exists)
-            state.avg_value = StatsUtils.get_avg_state_value(state)
+            state.avg_value = StatsUtils.get_average(stats[state.id].value_sum, stats[state.id].done_count)
+        self.prepare_trends(states, "State", does_today_entry_exists)
+
+    def prepare_trends(
+            self,
+            objs: list[Habit | State],
+            data_type: Literal["Habit", "State"],
+            does_today_entry_exists: int
+        ) -> None:
+        """
+        Calculate rolling statistics over windows set in TREND_WINDOWS and
+        sparkline of them. Attach them to objects as trends and sparkline.
+        Windows end on the same day as tracking days count.
+
+        Arguments:
+            objs -- collection of Habit or State objects
+            data_type -- string indicating type of data
+            does_today_entry_exists -- number indicating if today's entry were
+                already entered by user
+        """
+        last_day = self.end_date - datetime.timedelta(days=1 - does_today_entry_exists)
+        trends = TrendHandler.get_trends(
+            objs,
+            data_type,
+            last_day,
+            current_app.config.get("TREND_WINDOWS", [7, 30, 90]),
+            current_app.config.get("TREND_SPARKLINE_WINDOW", 30)
+        )
+        for obj in objs:
+            obj.trends = trends[obj.id].values
+            obj.sparkline = trends[obj.id].sparkline
 
 class StatsUtils():
     """
@@ -98,18 +402,15 @@ class StatsUtils():
     @classmethod
     def get_avg_state_value(cls, state: State) -> float:
         """
-        Calculate average state value among all entries. If there are no entries
-        then return 0.
+        Calculate average state value among all entries with value. If there
+        are no entries then return 0.
         Returned value is rounded to 2 decimal point.
         
         Argument:
             state -- State object
         """
-        if state.state_entries:
-            avg_value = sum((entry.value for entry in state.state_entries))/len(state.state_entries)
-        else:
-            avg_value = 0
-        return round(avg_value, 2)
+        stats = QueryStatsHandler.get_stats([state], "State")[state.id]
+        return cls.get_average(stats.value_sum, stats.done_count)
     
     @classmethod
     def get_tracking_days_count(
@@ -132,6 +433,41 @@ class StatsUtils():
         
         return (today - object.start_date).days + does_today_entry_exists
 
+    @classmethod
+    def get_percentage(
+            cls,
+            done_count: int,
+            days_of_tracking: int
+        ) -> int:
+        """
+        Calculate and return percentage of days with Habit done.
+        Returned value is rounded to int.
+
+        Arguments:
+            done_count -- count of days with habit done
+            days_of_tracking -- count of days that passed since the start of
+            tracking specified Habit to today
+        """
+        ratio = done_count/(days_of_tracking) if days_of_tracking else 0
+        return round(ratio * 100)
+
+    @classmethod
+    def get_average(
+            cls,
+            value_sum: int,
+            value_count: int
+        ) -> float:
+        """
+        Calculate average value. If there are no values then return 0.
+        Returned value is rounded to 2 decimal point.
+
+        Arguments:
+            value_sum -- sum of all values
+            value_count -- count of all values
+        """
+        avg_value = value_sum/value_count if value_count else 0
+        return round(avg_value, 2)
+
     @classmethod
     def get_habit_fulfillment_percentage(
             cls, 
@@ -147,30 +483,127 @@ class StatsUtils():
             days_of_tracking -- count of days that passed since the start of 
             tracking specified Habit to today
         """
-        days_with_habit_done = sum(entry.value for entry in habit.habit_entries)
-        ratio = days_with_habit_done/(days_of_tracking) if days_of_tracking else 0
-        percentage = round(ratio * 100)
+        stats = QueryStatsHandler.get_stats([habit], "Habit")[habit.id]
+        return cls.get_percentage(stats.done_count, days_of_tracking)
 
-        return percentage
-    
     @classmethod
-    def get_current_streak(
+    def get_range_stats(
             cls,
-            habit: Habit
-        ):
+            objs: list[Habit | State],
+            data_type: Literal["Habit", "State"],
+            ranges: list[tuple[datetime.date, datetime.date]]
+        ) -> dict[int, list[RangeStats]]:
         """
-        Calculate and return a consecutive count of days, that specified Habit
-        was done at, starting at the newest entry.
+        Return dictionary mapping object's id to counts and sums of values
+        of its entries in every range of dates, both ends inclusive.
+        Part of range before the start of tracking is skipped.
+        Statistics are taken from range indexes of all objects, read
+        with one query, so no entries are loaded.
 
         Arguments:
-            habit -- Habit object
+            objs -- collection of Habit or State objects
+            data_type -- string indicating type of data
+            ranges -- pairs of first and last day of range
+        """
+        indexes = RangeIndex.get_indexes(data_type, [obj.id for obj in objs])
+        return {
+            obj.id: [
+                RangeIndex.query(*indexes[obj.id], max(start_date, obj.start_date), end_date)
+                for start_date, end_date in ranges
+            ]
+            for obj in objs
+        }
+
+    @classmethod
+    def get_range_percentages(
+            cls,
+            habits: list[Habit],
+            ranges: list[tuple[datetime.date, datetime.date]]
+        ) -> dict[int, list[int | None]]:
         """
-        streak = 0
-        for entry in habit.habit_entries[::-1]:
-            if entry.value == False:
-                break
-            streak += 1
-        return streak
+        Calculate percentage of days with Habit done in every range
+        of dates for every habit. Returned values are rounded to int,
+        None is returned for ranges before start of tracking.
+
+        Arguments:
+            habits -- collection of Habit objects
+            ranges -- pairs of first and last day of range
+        """
+        return {
+            habit_id: [
+                cls.get_percentage(stats.done_count, stats.n_days) if stats.n_days else None
+                for stats in habit_stats
+            ]
+            for habit_id, habit_stats in cls.get_range_stats(habits, "Habit", ranges).items()
+        }
+
+    @classmethod
+    def get_range_averages(
+            cls,
+            states: list[State],
+            ranges: list[tuple[datetime.date, datetime.date]]
+        ) -> dict[int, list[float | None]]:
+        """
+        Calculate average state value among entries with value in every
+        range of dates for every state. Returned values are rounded
+        to 2 decimal point, None is returned for ranges without values.
+
+        Arguments:
+            states -- collection of State objects
+            ranges -- pairs of first and last day of range
+        """
+        return {
+            state_id: [
+                cls.get_average(stats.value_sum, stats.done_count) if stats.done_count else None
+                for stats in state_stats
+            ]
+            for state_id, state_stats in cls.get_range_stats(states, "State", ranges).items()
+        }
+
+    @classmethod
+    def get_streak_summaries(
+            cls,
+            habits: list[Habit],
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> dict[int, StreakSummary]:
+        """
+        Return dictionary mapping habit's id to its current and longest streak,
+        list of all streaks and list of gaps from start_date to end_date.
+        Days before the start of tracking are skipped. Entries of all habits
+        are read with one query, from yearly vectors if compact storage is enabled.
+
+        Arguments:
+            habits -- collection of Habit objects
+            start_date -- first day of history
+            end_date -- last day of history
+        """
+        if VectorStorage.is_enabled():
+            windows = VectorStorage.get_windows("Habit", [habit.id for habit in habits], start_date, end_date)
+            summaries = {}
+            for habit in habits:
+                habit_start = max(start_date, habit.start_date)
+                summaries[habit.id] = StreakEngine.summarize(HabitHistory.from_values(
+                    habit_start, windows[habit.id][(habit_start - start_date).days:]
+                ))
+            return summaries
+
+        entries = db.session.execute(
+            db.select(HabitEntry.habit_id, HabitEntry.date, HabitEntry.value)
+            .filter(HabitEntry.habit_id.in_([habit.id for habit in habits]))
+            .filter(HabitEntry.date.between(start_date, end_date))
+            .order_by(HabitEntry.habit_id)
+        ).all()
+        grouped = {
+            habit_id: [(date, value) for _, date, value in habit_entries]
+            for habit_id, habit_entries in groupby(entries, key=lambda entry: entry[0])
+        }
+        return {
+            habit.id: StreakEngine.summarize(HabitHistory.from_entries(
+                max(start_date, habit.start_date), end_date, grouped.get(habit.id, [])
+            ))
+            for habit in habits
+        }
 
 class PlotManager:
     """
@@ -193,6 +626,19 @@ class PlotManager:
         self.data_handler = DashboardStatsHandler(self.today)
         self.dates = self.get_dates()
         self.today_entry_exists = today_entry_exists
+        self.renderer = self.get_renderer()
+
+    @classmethod
+    def get_renderer(cls) -> str:
+        """
+        Return name of renderer used to render heatmaps, chosen by
+        PLOT_RENDERER setting of application. Raise ValueError if there
+        is no such renderer.
+        """
+        renderer = current_app.config.get("PLOT_RENDERER", "july")
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown renderer: {renderer}")
+        return renderer
     
     def specify_data_preparation_method(
             self, 
@@ -218,8 +664,12 @@ class PlotManager:
             data_type: Literal["Habit", "State"]
         ) -> None:
         """
-        Create plots for all objects in passed collection. Attach them
-        to responding objects.
+        Calculate statistics for all objects in passed collection. Attach
+        them to responding objects, together with url of their plots.
+
+        Plots are rendered in advance only if render_executor has worker
+        processes, so they are rendered in parallel. Otherwise they're
+        rendered when browser requests them.
 
         Arguments:
             date -- collection with Habit or State objects
@@ -227,10 +677,66 @@ class PlotManager:
         """
         self.specify_data_preparation_method(data_type)
         self.prepare_data(data, self.today_entry_exists)
+        if render_executor.is_parallel:
+            self.get_images(data, data_type)
         for obj in data:
-            data = self.get_data_for_plot(obj, data_type)
-            plotter = Plotter(self.dates, data, data_type)
-            obj.plot = plotter.plot()
+            obj.plot = url_for(
+                "main.plot_image",
+                kind=data_type.lower(),
+                obj_id=obj.id,
+                fmt="png"
+            )
+
+    def get_image(
+            self,
+            obj: Habit | State,
+            data_type: Literal["Habit", "State"],
+            fmt: Literal["png", "svg"] = "png"
+        ) -> CachedPlot:
+        """
+        Return heatmap of given object as image in given format. Image is
+        taken from plot_cache if possible, otherwise it's plotted and put
+        in cache.
+
+        Arguments:
+            obj -- Habit or State object
+            data_type -- string indicating type of given data
+            fmt -- format of image, "png" or "svg"
+        """
+        return self.get_images([obj], data_type, fmt)[0]
+
+    def get_images(
+            self,
+            objs: list[Habit | State],
+            data_type: Literal["Habit", "State"],
+            fmt: Literal["png", "svg"] = "png"
+        ) -> list[CachedPlot]:
+        """
+        Return heatmaps of given objects as images in given format. Images
+        missing in plot_cache are rendered by render_executor and put in cache.
+
+        Arguments:
+            objs -- collection with Habit or State objects
+            data_type -- string indicating type of given data
+            fmt -- format of images, "png" or "svg"
+        """
+        if fmt not in ("png", "svg"):
+            raise ValueError(f"Unknown image format: {fmt}")
+
+        keys = [plot_cache.make_key(data_type, obj.id, self.today, fmt) for obj in objs]
+        images = [plot_cache.get(key) for key in keys]
+        missing = [i for i, cached in enumerate(images) if cached is None]
+
+        data = self.get_data_for_plots([objs[i] for i in missing], data_type)
+        jobs = [
+            (self.renderer, self.dates, values, data_type, fmt)
+            for values in data
+        ]
+        rendered = render_executor.render_many(jobs)
+        for i, image in zip(missing, rendered):
+            images[i] = plot_cache.put(keys[i], image)
+
+        return images
 
     def get_dates(self) -> list[datetime.date]:
         """
@@ -239,39 +745,75 @@ class PlotManager:
         """
         end_date = self.today
         start_date = self.today - datetime.timedelta(days=365)
-        dates = date_range(
-            start_date, end_date
-        )
+        dates = [
+            start_date + datetime.timedelta(days=i)
+            for i in range((end_date - start_date).days + 1)
+        ]
         return dates
     
     def get_data_for_plot(
             self, 
             obj : Habit | State, 
             data_type: Literal["Habit", "State"]
-        ) -> list[int]:
+        ) -> np.ndarray:
         """
-        Get neccesary values for plot and put them in a list.
-
-        List is prefilled with -1 values, that indicate that 
-        entry on that day doesn't exist.
+        Get neccesary values for plot and put them in an array.
+        See get_data_for_plots.
 
         Arguments:
             obj -- Habit or State object
             data_type -- string indicating type of given data
 
         """
+        return self.get_data_for_plots([obj], data_type)[0]
+
+    def get_data_for_plots(
+            self,
+            objs: list[Habit | State],
+            data_type: Literal["Habit", "State"]
+        ) -> list[np.ndarray]:
+        """
+        Get values for plots of all given objects, one array per object,
+        read with one query.
+
+        Only entries from plotted window are loaded. Each value is placed
+        by its date's offset from the first date of window. Array is prefilled
+        with -1 values, that indicate that entry on that day doesn't exist.
+        If compact storage is enabled, window is read from yearly vectors.
+
+        Arguments:
+            objs -- collection with Habit or State objects
+            data_type -- string indicating type of given data
+        """
         if data_type == "Habit":
-            entries = obj.habit_entries
+            model, owner_id = HabitEntry, HabitEntry.habit_id
         elif data_type == "State":
-            entries = obj.state_entries
+            model, owner_id = StateEntry, StateEntry.state_id
         else:
             raise(ValueError)
-        
-        data = [-1]*366
-        for entry in entries:
-            i = self.dates.index(entry.date)
-            data[i] = entry.value
-        return data
+
+        if not objs:
+            return []
+        ids = [obj.id for obj in objs]
+        start_date = self.dates[0]
+        if VectorStorage.is_enabled():
+            windows = VectorStorage.get_windows(data_type, ids, start_date, self.dates[-1])
+            return [windows[obj_id] for obj_id in ids]
+
+        entries = db.session.execute(
+            db.select(owner_id, model.date, model.value)
+            .filter(owner_id.in_(ids))
+            .filter(model.date.between(start_date, self.dates[-1]))
+            .order_by(owner_id)
+        ).all()
+
+        data = {obj_id: np.full(len(self.dates), -1, dtype=np.int8) for obj_id in ids}
+        for obj_id, obj_entries in groupby(entries, key=lambda entry: entry[0]):
+            obj_entries = list(obj_entries)
+            offsets = [(date - start_date).days for _, date, _ in obj_entries]
+            values = [-1 if value is None else value for _, _, value in obj_entries]
+            data[obj_id][offsets] = values
+        return [data[obj_id] for obj_id in ids]
 
 class Plotter:
     """
@@ -306,19 +848,79 @@ class Plotter:
         """
         Create calendar-like heatmap. Return it as a base64 encoded string.
         """
-        july.heatmap(self.dates, self.data, **self.params)
-        self._fig = plt.gcf()
-        encoded_image = self.plot_to_base64()
+        encoded_image = self.encode_base64(self.plot_to_png())
 
         return encoded_image
-    
-    def plot_to_base64(self) -> str:
+
+    def plot_to_png(self) -> bytes:
         """
-        Convert mpl figure to string encoded in base64. Return encoded plot.
+        Create calendar-like heatmap. Return it as PNG image.
+        """
+        return self.save_plot("png")
+
+    def plot_to_svg(self) -> bytes:
         """
-        s = io.BytesIO()
-        self._fig.savefig(s, format='png', transparent=True, bbox_inches="tight")
-        s = base64.b64encode(s.getvalue()).decode("utf-8").replace("\n", "")
+        Create calendar-like heatmap. Return it as SVG image.
+        """
+        return self.save_plot("svg")
+
+    def save_plot(
+            self,
+            fmt: Literal["png", "svg"]
+        ) -> bytes:
+        """
+        Create calendar-like heatmap and save it in given format.
+
+        Arguments:
+            fmt -- format of image
+        """
+        # july changes global rcParams, so only one thread can plot at a time
+        with _matplotlib_lock:
+            fig = self.create_figure()
+            try:
+                july.heatmap(self.dates, self.data, ax=fig.add_subplot(), **self.params)
+
+                s = io.BytesIO()
+                fig.savefig(s, format=fmt, transparent=True, bbox_inches="tight")
+            finally:
+                self.close_figure(fig)
+
+        return s.getvalue()
+
+    @staticmethod
+    def create_figure() -> Figure:
+        """
+        Return new figure for one heatmap.
+
+        Figure isn't created with pyplot, so pyplot doesn't keep reference
+        to it and it can be garbage collected after render. It's created
+        the same way july creates its figures, with july's rcParams.
+        """
+        update_rcparams()
+        fig = Figure(figsize=(12, 5), dpi=100)
+        FigureCanvasAgg(fig)
+        return fig
+
+    @staticmethod
+    def close_figure(fig: Figure) -> None:
+        """
+        Release all artists of figure, after it was saved.
+
+        Arguments:
+            fig -- figure created by create_figure method
+        """
+        fig.clear()
+        fig.canvas = None
+
+    @staticmethod
+    def encode_base64(image: bytes) -> str:
+        """
+        Convert PNG image to string encoded in base64. Return encoded plot.
+
+        Arguments:
+            image -- PNG image
+        """
+        s = base64.b64encode(image).decode("utf-8").replace("\n", "")
 
         return f'data:image/png;base64,{s}'
 
@@ -348,4 +950,159 @@ class Plotter:
         else:
             raise ValueError("Incorrect data type!")
         
-        return params
\ No newline at end of file
+        return params
+
+"""
+Classes that can be used to render heatmaps. They're chosen with
+PLOT_RENDERER setting.
+"""
+RENDERERS = {
+    "july": Plotter,
+    "raster": RasterPlotter
+}
+
+
+def warm_up_worker() -> None:
+    """
+    Prepare process of render_executor's pool. Heavy imports are done once,
+    when worker starts, not during first render.
+    """
+    if july:
+        mpl.use('agg')
+        plt.figure()
+        plt.close("all")
+
+
+def render_plot(
+        renderer: str,
+        dates: list[datetime.date],
+        data: list[int],
+        data_type: Literal["Habit", "State"],
+        fmt: Literal["png", "svg"]
+    ) -> bytes:
+    """
+    Render heatmap from plain data and return encoded image. Function is
+    executed by worker processes of render_executor, so it gets only
+    picklable arguments.
+
+    Arguments:
+        renderer -- name of renderer, key of RENDERERS
+        dates -- list containing all dates to include in calendar
+        data -- list containing all data values to plot
+        data_type -- string indicating type of given data
+        fmt -- format of image, "png" or "svg"
+    """
+    plotter = RENDERERS[renderer](dates, data, data_type)
+    if fmt == "svg":
+        return plotter.plot_to_svg()
+    return plotter.plot_to_png()
+
+
+class RenderExecutor:
+    """
+    Renders heatmaps in parallel in a bounded pool of worker processes.
+
+    Workers are started once and have matplotlib and july already imported.
+    Renders, that didn't finish before timeout or failed in worker, are
+    rendered in current process. If max_workers is 0, everything is
+    rendered in current process.
+    """
+    def __init__(
+            self,
+            max_workers: int = 0,
+            timeout: float = 10
+        ) -> None:
+        """
+        Initialize attributes of object.
+
+        Arguments:
+            max_workers -- count of worker processes
+            timeout -- maximal time in seconds to wait for workers' results
+        """
+        self._lock = threading.Lock()
+        self._pool = None
+        self.configure(max_workers, timeout)
+
+    def configure(
+            self,
+            max_workers: int,
+            timeout: float = 10
+        ) -> None:
+        """
+        Set size of pool and timeout. Running pool is shut down.
+
+        Arguments:
+            max_workers -- count of worker processes
+            timeout -- maximal time in seconds to wait for workers' results
+        """
+        self.shutdown()
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    @property
+    def is_parallel(self) -> bool:
+        """
+        True if heatmaps are rendered by worker processes.
+        """
+        return self.max_workers > 0
+
+    def render_many(
+            self,
+            jobs: list[tuple]
+        ) -> list[bytes]:
+        """
+        Render all jobs and return encoded images in the same order.
+
+        Arguments:
+            jobs -- collection of tuples with arguments of render_plot function
+        """
+        if not self.is_parallel or len(jobs) == 0:
+            return [render_plot(*job) for job in jobs]
+
+        try:
+            pool = self._get_pool()
+            futures = [pool.submit(render_plot, *job) for job in jobs]
+        except (BrokenProcessPool, RuntimeError):
+            self.shutdown()
+            return [render_plot(*job) for job in jobs]
+
+        wait(futures, timeout=self.timeout)
+
+        images = []
+        for job, future in zip(jobs, futures):
+            if future.done() and future.exception() is None:
+                images.append(future.result())
+                continue
+
+            if future.done() and isinstance(future.exception(), BrokenProcessPool):
+                # worker died, pool has to be started again
+                self.shutdown()
+            future.cancel()
+            images.append(render_plot(*job))
+        return images
+
+    def shutdown(self) -> None:
+        """
+        Stop worker processes. Pool will be started again on next render.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """
+        Return pool of worker processes, start it if it isn't running.
+        """
+        with self._lock:
+            if self._pool is None:
+                # forked worker would inherit _matplotlib_lock held by other thread
+                # and never get it, so workers are started from a clean process
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                    initializer=warm_up_worker
+                )
+            return self._pool
+
+render_executor = RenderExecutor()
@@ -0,0 +1,354 @@
+import datetime
+from itertools import groupby
+from typing import Literal, NamedTuple, Any
+
+import numpy as np
+
+from app import db
+from app.models import HabitEntry, HabitRangeIndex, StateEntry, StateRangeIndex
+from app.stats_handler import EntryChange, StatsTableHandler
+
+
+class RangeStats(NamedTuple):
+    """
+    Statistics of entries from range of dates.
+
+    Attributes:
+        done_count -- count of entries with habit done or state with value
+        total_count -- count of entries
+        value_sum -- sum of values of entries
+        n_days -- count of days in range
+    """
+    done_count: int
+    total_count: int
+    value_sum: int
+    n_days: int
+
+
+class RangeIndex:
+    """
+    Keeps prefix sums of done counts, entry counts and value sums of every
+    habit and state, one row per day since the first entry. Statistics
+    of any range of dates are a difference of two rows, so they don't need
+    to scan entries.
+
+    Index is updated every time entries are saved, in the same transaction.
+    Change of one entry adds its difference to all following rows. Objects
+    without index, e.g. ones created before indexes existed, get it on their
+    next save and until then it's calculated from entries when it's read.
+    """
+    @classmethod
+    def get_models(
+            cls,
+            data_type: Literal["Habit", "State"]
+        ) -> tuple[Any, Any, Any, Any]:
+        """
+        Return index model, its owner's id column, entry model and its
+        owner's id column for given data type.
+        """
+        if data_type == "Habit":
+            return HabitRangeIndex, HabitRangeIndex.habit_id, HabitEntry, HabitEntry.habit_id
+        elif data_type == "State":
+            return StateRangeIndex, StateRangeIndex.state_id, StateEntry, StateEntry.state_id
+        raise ValueError("Incorrect data type!")
+
+    @classmethod
+    def get_contribution(
+            cls,
+            data_type: Literal["Habit", "State"],
+            value: Any
+        ) -> np.ndarray:
+        """
+        Return row of (done count, entry count, value sum) of one entry.
+        """
+        return np.array([
+            int(StatsTableHandler.is_done(data_type, value)),
+            1,
+            StatsTableHandler.get_score(value) or 0,
+        ], dtype=np.int32)
+
+    @classmethod
+    def build(
+            cls,
+            data_type: Literal["Habit", "State"],
+            entries: list[tuple[datetime.date, Any]]
+        ) -> tuple[datetime.date, np.ndarray]:
+        """
+        Return first day of index and prefix sums of given entries.
+        Index of object without entries starts today and is empty.
+
+        Arguments:
+            data_type -- string indicating type of data
+            entries -- pairs of entry's date and value
+        """
+        if not entries:
+            return datetime.date.today(), np.zeros((1, 3), dtype=np.int32)
+
+        dates, values = zip(*entries)
+        start_date = min(dates)
+        # ordinals are read much faster than conversion of dates to datetime64
+        offsets = np.fromiter(
+            map(datetime.date.toordinal, dates), dtype=np.int64, count=len(dates)
+        ) - start_date.toordinal()
+
+        # None values are converted to NaN, comparisons with NaN are False
+        scores = np.array(values, dtype=np.float64)
+        daily = np.zeros((offsets.max() + 1, 3), dtype=np.int32)
+        daily[offsets, 0] = StatsTableHandler.get_done_mask(data_type, values)
+        daily[offsets, 1] = 1
+        daily[offsets, 2] = np.where(scores >= 0, scores, 0)
+
+        prefix_sums = np.zeros((len(daily) + 1, 3), dtype=np.int32)
+        np.cumsum(daily, axis=0, out=prefix_sums[1:])
+        return start_date, prefix_sums
+
+    @staticmethod
+    def load(prefix_sums: bytes) -> np.ndarray:
+        """
+        Return prefix sums saved in index as array.
+        """
+        return np.frombuffer(prefix_sums, dtype=np.int32).reshape(-1, 3)
+
+    @staticmethod
+    def fit(
+            start_date: datetime.date,
+            prefix_sums: np.ndarray,
+            date: datetime.date
+        ) -> tuple[datetime.date, np.ndarray]:
+        """
+        Extend prefix sums, so they contain given date. Days added before
+        start have zero sums, days added after end repeat the last row.
+
+        Arguments:
+            start_date -- first day of index
+            prefix_sums -- array of prefix sums
+            date -- date, that has to be in index
+        """
+        offset = (date - start_date).days
+        if offset < 0:
+            prefix_sums = np.concatenate(
+                (np.zeros((-offset, 3), dtype=np.int32), prefix_sums)
+            )
+            start_date = date
+        elif offset >= len(prefix_sums) - 1:
+            extension = np.repeat(prefix_sums[-1:], offset - len(prefix_sums) + 2, axis=0)
+            prefix_sums = np.concatenate((prefix_sums, extension))
+        return start_date, prefix_sums
+
+    @classmethod
+    def apply_changes(
+            cls,
+            data_type: Literal["Habit", "State"],
+            changes: list[EntryChange]
+        ) -> None:
+        """
+        Update indexes of objects, which entries were changed. Difference
+        of every changed entry is added to all rows after its day. Indexes
+        of objects without one are calculated from entries, which already
+        contain changes.
+
+        Arguments:
+            data_type -- string indicating type of data
+            changes -- collection of changes of entries
+        """
+        index_model, owner_id, _, _ = cls.get_models(data_type)
+        changes = sorted(changes, key=lambda change: change.obj_id)
+        indexes = {
+            getattr(index, owner_id.key): index
+            for index in db.session.scalars(
+                db.select(index_model)
+                .filter(owner_id.in_({change.obj_id for change in changes}))
+            )
+        }
+
+        missing = []
+        for obj_id, obj_changes in groupby(changes, key=lambda change: change.obj_id):
+            index = indexes.get(obj_id)
+            if index is None:
+                missing.append(obj_id)
+                continue
+
+            start_date, prefix_sums = index.start_date, cls.load(index.prefix_sums).copy()
+            for change in obj_changes:
+                delta = cls.get_contribution(data_type, change.new_value)
+                if not change.created:
+                    delta -= cls.get_contribution(data_type, change.old_value)
+
+                start_date, prefix_sums = cls.fit(start_date, prefix_sums, change.date)
+                prefix_sums[(change.date - start_date).days + 1:] += delta
+
+            index.start_date = start_date
+            index.prefix_sums = prefix_sums.tobytes()
+
+        if missing:
+            cls.add_indexes(data_type, cls.calculate(data_type, missing))
+
+    @classmethod
+    def get_indexes(
+            cls,
+            data_type: Literal["Habit", "State"],
+            ids: list[int]
+        ) -> dict[int, tuple[datetime.date, np.ndarray]]:
+        """
+        Return dictionary mapping id of object to first day and prefix sums
+        of its index. Existing indexes are read with one query, missing
+        ones are calculated from entries without saving them.
+
+        Arguments:
+            data_type -- string indicating type of data
+            ids -- ids of Habit or State objects
+        """
+        index_model, owner_id, _, _ = cls.get_models(data_type)
+        indexes = {
+            obj_id: (start_date, cls.load(prefix_sums))
+            for obj_id, start_date, prefix_sums in db.session.execute(
+                db.select(owner_id, index_model.start_date, index_model.prefix_sums)
+                .filter(owner_id.in_(ids))
+            )
+        }
+        missing = [obj_id for obj_id in ids if obj_id not in indexes]
+        if missing:
+            indexes.update(cls.calculate(data_type, missing))
+        return indexes
+
+    @classmethod
+    def get_range(
+            cls,
+            data_type: Literal["Habit", "State"],
+            obj_id: int,
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> RangeStats:
+        """
+        Return statistics of object's entries from start_date to end_date,
+        both inclusive.
+
+        Arguments:
+            data_type -- string indicating type of data
+            obj_id -- id of Habit or State
+            start_date -- first day of range
+            end_date -- last day of range
+        """
+        index_start, prefix_sums = cls.get_indexes(data_type, [obj_id])[obj_id]
+        return cls.query(index_start, prefix_sums, start_date, end_date)
+
+    @staticmethod
+    def query(
+            index_start: datetime.date,
+            prefix_sums: np.ndarray,
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> RangeStats:
+        """
+        Return statistics of range from prefix sums. Parts of range outside
+        of index have no entries.
+
+        Arguments:
+            index_start -- first day of index
+            prefix_sums -- array of prefix sums
+            start_date -- first day of range
+            end_date -- last day of range
+        """
+        n_days = max((end_date - start_date).days + 1, 0)
+        last = len(prefix_sums) - 1
+        low = min(max((start_date - index_start).days, 0), last)
+        high = min(max((end_date - index_start).days + 1, low), last)
+
+        done_count, total_count, value_sum = (prefix_sums[high] - prefix_sums[low]).tolist()
+        return RangeStats(done_count, total_count, value_sum, n_days)
+
+    @classmethod
+    def calculate(
+            cls,
+            data_type: Literal["Habit", "State"],
+            ids: list[int]
+        ) -> dict[int, tuple[datetime.date, np.ndarray]]:
+        """
+        Return dictionary mapping id of object to first day and prefix sums
+        calculated from all its entries, which are read with one query.
+        Indexes aren't added to session.
+
+        Arguments:
+            data_type -- string indicating type of data
+            ids -- ids of Habit or State objects
+        """
+        _, _, entry_model, entry_owner_id = cls.get_models(data_type)
+        entries = db.session.execute(
+            db.select(entry_owner_id, entry_model.date, entry_model.value)
+            .filter(entry_owner_id.in_(ids))
+            .order_by(entry_owner_id)
+        ).all()
+        grouped = {
+            obj_id: [(date, value) for _, date, value in obj_entries]
+            for obj_id, obj_entries in groupby(entries, key=lambda entry: entry[0])
+        }
+        return {obj_id: cls.build(data_type, grouped.get(obj_id, [])) for obj_id in ids}
+
+    @classmethod
+    def add_indexes(
+            cls,
+            data_type: Literal["Habit", "State"],
+            indexes: dict[int, tuple[datetime.date, np.ndarray]]
+        ) -> None:
+        """
+        Add indexes returned by calculate to session.
+
+        Arguments:
+            data_type -- string indicating type of data
+            indexes -- dictionary mapping id of object to first day and prefix sums
+        """
+        index_model, owner_id, _, _ = cls.get_models(data_type)
+        db.session.add_all(
+            index_model(
+                **{owner_id.key: obj_id},
+                start_date=start_date,
+                prefix_sums=prefix_sums.tobytes()
+            )
+            for obj_id, (start_date, prefix_sums) in indexes.items()
+        )
+
+    @classmethod
+    def refresh(
+            cls,
+            data_type: Literal["Habit", "State"],
+            ids: list[int]
+        ) -> None:
+        """
+        Replace indexes of given objects with ones calculated from all
+        their entries, which are read with one query.
+
+        Arguments:
+            data_type -- string indicating type of data
+            ids -- ids of Habit or State objects
+        """
+        index_model, owner_id, _, _ = cls.get_models(data_type)
+        db.session.execute(db.delete(index_model).filter(owner_id.in_(ids)))
+        cls.add_indexes(data_type, cls.calculate(data_type, ids))
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """
+        Calculate again indexes of all habits and states and save them.
+        Return count of rebuilt indexes.
+        """
+        count = 0
+        for data_type in ("Habit", "State"):
+            index_model, owner_id, entry_model, entry_owner_id = cls.get_models(data_type)
+            db.session.execute(db.delete(index_model))
+
+            entries = db.session.execute(
+                db.select(entry_owner_id, entry_model.date, entry_model.value)
+                .order_by(entry_owner_id)
+            ).all()
+            for obj_id, obj_entries in groupby(entries, key=lambda entry: entry[0]):
+                start_date, prefix_sums = cls.build(
+                    data_type, [(date, value) for _, date, value in obj_entries]
+                )
+                db.session.add(index_model(
+                    **{owner_id.key: obj_id},
+                    start_date=start_date,
+                    prefix_sums=prefix_sums.tobytes()
+                ))
+                count += 1
+        db.session.commit()
+        return count
@@ -0,0 +1,214 @@
+import zlib
+import base64
+import struct
+import datetime
+from typing import Literal
+
+import numpy as np
+
+"""
+Colors of heatmaps. They are the same colors as matplotlib's named colors
+used originally by the application.
+
+Palette for state responding to values:
+    grey -- -1, 0 -> No data
+    darkred - darkgreen -- 1-5 -> State values
+
+Palette for habit responding to values:
+    grey -- -1 -> No data
+    red -- 0 -> Habit broke
+    green -- 1 -> Habit done
+"""
+DEFAULT_PALETTES = {
+    "state": [
+        "#808080",  # grey
+        "#808080",  # grey
+        "#8b0000",  # darkred
+        "#ff0000",  # red
+        "#ffa500",  # orange
+        "#9acd32",  # yellowgreen
+        "#006400",  # darkgreen
+    ],
+    "habit": [
+        "#808080",  # grey
+        "#ff0000",  # red
+        "#008000",  # green
+    ],
+}
+
+"""
+Value ranges mapped on palettes. They are the same as cmin and cmax params
+passed to july.heatmap by Plotter.
+"""
+VALUE_RANGES = {
+    "habit": (-1, 1),
+    "state": (-1, 5),
+}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class RasterPlotter:
+    """
+    Class plotting calendar-like diagram from given data without matplotlib.
+
+    Calendar is built as an array of palette indexes (one row for every
+    weekday, one column for every week), scaled up to image size and encoded
+    directly as a palette-mode PNG. It has the same interface as Plotter.
+    """
+    def __init__(
+            self,
+            dates: list[datetime.date],
+            data: list[int],
+            data_type: Literal["Habit", "State"],
+            cell_size: int = 14,
+            gap: int = 2
+        ) -> None:
+        """
+        Initializes class attributes.
+
+        Arguments:
+            dates -- list containing all dates to include in calendar
+            data -- list containing all data values to plot
+            data_type -- string indicating type of given data
+            cell_size -- side of one day's square in pixels
+            gap -- distance between squares in pixels
+        """
+        if len(dates) != len(data):
+            raise ValueError(
+                "Length mismatch - dates and data list should have equal length"
+            )
+        if data_type not in ("Habit", "State"):
+            raise ValueError("Incorrect data type!")
+
+        self.dates = dates
+        self.data = data
+        self.palette = DEFAULT_PALETTES[data_type.lower()]
+        self.cmin, self.cmax = VALUE_RANGES[data_type.lower()]
+        self.cell_size = cell_size
+        self.gap = gap
+
+    def plot(self) -> str:
+        """
+        Create calendar-like heatmap. Return it as a base64 encoded string.
+        """
+        s = base64.b64encode(self.plot_to_png()).decode("utf-8")
+
+        return f'data:image/png;base64,{s}'
+
+    def plot_to_png(self) -> bytes:
+        """
+        Create calendar-like heatmap. Return it as PNG image.
+        """
+        return self.encode_png(self.get_image_array())
+
+    def plot_to_svg(self) -> bytes:
+        """
+        Create calendar-like heatmap. Return it as SVG image.
+        """
+        grid = self.get_grid()
+        step = self.cell_size + self.gap
+        height = grid.shape[0] * step - self.gap
+        width = grid.shape[1] * step - self.gap
+
+        rects = [
+            f'<rect x="{col * step}" y="{row * step}" '
+            f'width="{self.cell_size}" height="{self.cell_size}" '
+            f'fill="{self.palette[grid[row, col]]}"/>'
+            for row, col in zip(*np.nonzero(grid < len(self.palette)))
+        ]
+        svg = (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+            f'height="{height}" viewBox="0 0 {width} {height}">'
+            + "".join(rects)
+            + "</svg>"
+        )
+        return svg.encode("utf-8")
+
+    def get_grid(self) -> np.ndarray:
+        """
+        Return array of shape (7, count of weeks) containing palette index
+        of every day. Cells without date contain index of transparent color,
+        which is equal to length of palette.
+
+        Weeks start on monday, same as in july's heatmaps.
+        """
+        n_colors = len(self.palette)
+        first_monday = self.dates[0].toordinal() - self.dates[0].weekday()
+        offsets = np.fromiter(
+            (date.toordinal() for date in self.dates),
+            dtype=np.int64,
+            count=len(self.dates)
+        ) - first_monday
+
+        # None values are converted to NaN and treated as lack of data
+        values = np.array(self.data, dtype=np.float64)
+        values = np.nan_to_num(values, nan=self.cmin)
+
+        # same mapping as matplotlib's ListedColormap with limits cmin, cmax
+        normalized = (values - self.cmin) / (self.cmax - self.cmin)
+        indexes = np.clip(np.floor(normalized * n_colors), 0, n_colors - 1)
+
+        grid = np.full((7, offsets[-1] // 7 + 1), n_colors, dtype=np.uint8)
+        grid[offsets % 7, offsets // 7] = indexes
+
+        return grid
+
+    def get_image_array(self) -> np.ndarray:
+        """
+        Return grid scaled up to image size. Each cell becomes a square
+        of cell_size pixels separated by transparent gaps.
+        """
+        grid = self.get_grid()
+        transparent = len(self.palette)
+        step = self.cell_size + self.gap
+
+        image = np.repeat(np.repeat(grid, step, axis=0), step, axis=1)
+        image[(np.arange(image.shape[0]) % step) >= self.cell_size, :] = transparent
+        image[:, (np.arange(image.shape[1]) % step) >= self.cell_size] = transparent
+
+        # drop gap after the last row and column
+        return image[:-self.gap or None, :-self.gap or None]
+
+    def encode_png(
+            self,
+            image: np.ndarray
+        ) -> bytes:
+        """
+        Encode array of palette indexes as palette-mode PNG. Index equal
+        to length of palette is fully transparent.
+
+        Arguments:
+            image -- 2D array of uint8 palette indexes
+        """
+        height, width = image.shape
+        colors = [bytes.fromhex(color[1:]) for color in self.palette]
+
+        header = struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)
+        palette = b"".join(colors) + b"\x00\x00\x00"
+        transparency = b"\xff" * len(colors) + b"\x00"
+
+        # every row of image starts with filter type byte, 0 means no filter
+        rows = np.zeros((height, width + 1), dtype=np.uint8)
+        rows[:, 1:] = image
+        data = zlib.compress(rows.tobytes(), 6)
+
+        return b"".join((
+            PNG_SIGNATURE,
+            self._make_chunk(b"IHDR", header),
+            self._make_chunk(b"PLTE", palette),
+            self._make_chunk(b"tRNS", transparency),
+            self._make_chunk(b"IDAT", data),
+            self._make_chunk(b"IEND", b""),
+        ))
+
+    @staticmethod
+    def _make_chunk(
+            chunk_type: bytes,
+            data: bytes
+        ) -> bytes:
+        """
+        Return PNG chunk of given type containing given data.
+        """
+        crc = zlib.crc32(chunk_type + data) & 0xffffffff
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
@@ -1,14 +1,21 @@
 import datetime
 
-from flask import Blueprint, Response
-from flask import render_template, redirect, url_for
+from flask import Blueprint, Response, current_app
+from flask import render_template, redirect, url_for, abort, stream_with_context, flash
 from flask import request
 
 from flask_login import login_required
 from flask_login import current_user
 
+from werkzeug.exceptions import RequestEntityTooLarge
+
 from . import db
-from .models import Habit, State
+from .models import Habit, State, User
+from .plot_handler import plot_cache
+from .day_status import day_status_cache
+from .user_cache import user_cache
+from .export import DataExporter
+from .importer import DataImporter
 
 settings = Blueprint('settings', __name__)
 
@@ -41,6 +48,7 @@ def add_habit() -> Response:
     )
     db.session.add(habit)
     db.session.commit()
+    user_cache.invalidate(uid)
 
     return redirect(url_for("settings.settings_index"))
 
@@ -61,6 +69,7 @@ def add_state() -> Response:
     )
     db.session.add(state)
     db.session.commit()
+    user_cache.invalidate(uid)
 
     return redirect(url_for("settings.settings_index"))
 
@@ -78,8 +87,15 @@ def delete_habit() -> Response:
         db.select(Habit)
         .filter_by(user_id=uid, id=habit_id)
     )
+    deleted_id = habit.id
     db.session.delete(habit)
+    db.session.flush()
+    # first entry date may belong to removed entries
+    User.refresh_first_entry_dates([uid])
     db.session.commit()
+    plot_cache.invalidate("Habit", deleted_id)
+    day_status_cache.invalidate(uid)
+    user_cache.invalidate(uid)
     return redirect(url_for("settings.settings_index"))
 
 @settings.route('/delete_state', methods = ['POST'])
@@ -96,6 +112,66 @@ def delete_state() -> Response:
         db.select(State)
         .filter_by(user_id=uid, id=state_id)
     )
+    deleted_id = state.id
     db.session.delete(state)
+    db.session.flush()
+    # first entry date may belong to removed entries
+    User.refresh_first_entry_dates([uid])
     db.session.commit()
-    return redirect(url_for("settings.settings_index"))
\ No newline at end of file
+    plot_cache.invalidate("State", deleted_id)
+    day_status_cache.invalidate(uid)
+    user_cache.invalidate(uid)
+    return redirect(url_for("settings.settings_index"))
+
+@settings.route('/export', methods = ['GET'])
+@login_required
+def export_data() -> Response:
+    """
+    View streams all data of current user as a file. Format is chosen with
+    "format" parameter, "csv" or "ndjson", and output is gzipped if "gzip"
+    parameter is set.
+    """
+    data_format = request.args.get("format", "csv")
+    compress = request.args.get("gzip", "0") not in ("", "0")
+    try:
+        chunks = DataExporter.export(current_user.id, data_format, compress)
+    except ValueError:
+        abort(404)
+
+    filename = DataExporter.get_filename(data_format, compress)
+    return Response(
+        stream_with_context(chunks),
+        mimetype="application/gzip" if compress else DataExporter.FORMATS[data_format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@settings.route('/import', methods = ['POST'])
+@login_required
+def import_data() -> Response:
+    """
+    View imports history of current user from uploaded CSV or JSON Lines
+    file, optionally gzipped, in the shape of export. Format is guessed
+    from file's name. Result or error is shown on settings page.
+    """
+    try:
+        file = request.files.get("file")
+    except RequestEntityTooLarge:
+        limit = current_app.config["MAX_CONTENT_LENGTH"]
+        flash(f"File is too large, the limit is {limit // 2**20} MB.", "is-danger")
+        return redirect(url_for("settings.settings_index"))
+
+    try:
+        if file is None or not file.filename:
+            raise ValueError("Choose a file to import.")
+        data_format, compress = DataImporter.get_format(file.filename)
+        result = DataImporter.import_data(current_user.id, file.stream, data_format, compress)
+    except ValueError as error:
+        db.session.rollback()
+        flash(str(error), "is-danger")
+    else:
+        flash(
+            f"Imported {result.habit_entries} habit entries, {result.state_entries} state entries "
+            f"and {result.journal_entries} journal entries.",
+            "is-success"
+        )
+    return redirect(url_for("settings.settings_index"))
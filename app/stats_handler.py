@@ -0,0 +1,503 @@
+import datetime
+from itertools import groupby
+from typing import Literal, NamedTuple, Any
+
+import numpy as np
+from sqlalchemy import case, func, Integer, Select
+
+from app import db
+from app.models import Habit, HabitEntry, HabitStats, State, StateEntry, StateStats
+from app.streaks import StreakEngine
+
+
+class EntryChange(NamedTuple):
+    """
+    Description of one saved HabitEntry or StateEntry.
+
+    Attributes:
+        obj_id -- id of Habit or State the entry belongs to
+        date -- date of entry
+        old_value -- value before change, ignored if entry was created
+        new_value -- value after change
+        created -- True if entry didn't exist before
+    """
+    obj_id: int
+    date: datetime.date
+    old_value: Any
+    new_value: Any
+    created: bool
+
+
+class StatsTableHandler:
+    """
+    Maintains HabitStats and StateStats tables. Statistics are updated
+    incrementally every time entries are saved, so dashboard doesn't have
+    to read whole history of habits and states.
+    """
+    @classmethod
+    def get_models(
+            cls,
+            data_type: Literal["Habit", "State"]
+        ) -> tuple:
+        """
+        Return tuple (stats model, entry model, entry's column with owner id)
+        for given type of data. Raise ValueError for unknown type.
+
+        Arguments:
+            data_type -- string indicating type of data
+        """
+        if data_type == "Habit":
+            return HabitStats, HabitEntry, HabitEntry.habit_id
+        elif data_type == "State":
+            return StateStats, StateEntry, StateEntry.state_id
+        else:
+            raise ValueError("Incorrect data type!")
+
+    @classmethod
+    def get_score(
+            cls,
+            value: Any
+        ) -> int | None:
+        """
+        Return numeric value of entry or None if entry has no value.
+
+        Habit's values are booleans, state's values are integers from 1 to 5,
+        but they may come as strings straight from the form. States
+        without value are saved as None or -1.
+
+        Arguments:
+            value -- value of HabitEntry or StateEntry
+        """
+        if value is None:
+            return None
+        score = int(value)
+        return None if score < 0 else score
+
+    @classmethod
+    def is_done(
+            cls,
+            data_type: Literal["Habit", "State"],
+            value: Any
+        ) -> bool:
+        """
+        Return True if entry counts as done: habit was done or state
+        was given any value.
+
+        Arguments:
+            data_type -- string indicating type of data
+            value -- value of HabitEntry or StateEntry
+        """
+        score = cls.get_score(value)
+        if data_type == "Habit":
+            return bool(score)
+        return score is not None
+
+    @classmethod
+    def get_stats(
+            cls,
+            objs: list[Habit | State],
+            data_type: Literal["Habit", "State"]
+        ) -> dict[int, HabitStats | StateStats]:
+        """
+        Return dictionary mapping object's id to its statistics, loaded
+        with one query. Statistics of objects without row in stats table
+        are calculated from entries and returned without saving.
+
+        Arguments:
+            objs -- collection of Habit or State objects
+            data_type -- string indicating type of data
+        """
+        stats_model, _, owner_id = cls.get_models(data_type)
+        ids = [obj.id for obj in objs]
+        key = getattr(stats_model, owner_id.name)
+
+        stats = {
+            getattr(row, owner_id.name): row
+            for row in db.session.scalars(
+                db.select(stats_model).filter(key.in_(ids))
+            )
+        }
+        missing = [obj_id for obj_id in ids if obj_id not in stats]
+        if missing:
+            stats.update(QueryStatsHandler.get_stats_by_ids(missing, data_type))
+        return stats
+
+    @classmethod
+    def calculate(
+            cls,
+            data_type: Literal["Habit", "State"],
+            obj_id: int
+        ) -> HabitStats | StateStats:
+        """
+        Calculate statistics of object from all its entries. Returned
+        object isn't added to session.
+
+        Arguments:
+            data_type -- string indicating type of data
+            obj_id -- id of Habit or State
+        """
+        stats_model, entry_model, owner_id = cls.get_models(data_type)
+        entries = db.session.execute(
+            db.select(entry_model.date, entry_model.value)
+            .filter(owner_id == obj_id)
+            .order_by(entry_model.date)
+        ).all()
+
+        stats = stats_model(**{owner_id.name: obj_id})
+        stats.total_count = len(entries)
+        stats.done_count = 0
+        stats.value_sum = 0
+        for _, value in entries:
+            stats.done_count += cls.is_done(data_type, value)
+            stats.value_sum += cls.get_score(value) or 0
+        stats.last_entry_date = entries[-1].date if entries else None
+        cls.set_streaks(stats, data_type, [value for _, value in entries])
+
+        return stats
+
+    @classmethod
+    def set_streaks(
+            cls,
+            stats: HabitStats | StateStats,
+            data_type: Literal["Habit", "State"],
+            values: list[Any]
+        ) -> None:
+        """
+        Set current and longest streak of stats, basing on values of all
+        entries ordered by date. Streak is a count of consecutive entries,
+        that are done.
+
+        Arguments:
+            stats -- HabitStats or StateStats object
+            data_type -- string indicating type of data
+            values -- values of entries ordered by date
+        """
+        done = cls.get_done_mask(data_type, values)
+        stats.current_streak, stats.longest_streak = StreakEngine.get_streaks(done)
+
+    @classmethod
+    def get_done_mask(
+            cls,
+            data_type: Literal["Habit", "State"],
+            values: list[Any]
+        ) -> np.ndarray:
+        """
+        Return boolean array, True for every done value. It's vectorized
+        version of is_done method.
+
+        Arguments:
+            data_type -- string indicating type of data
+            values -- values of entries
+        """
+        # None values are converted to NaN, comparisons with NaN are False
+        scores = np.array(values, dtype=np.float64).reshape(-1)
+        if data_type == "Habit":
+            return scores > 0
+        return scores >= 0
+
+    @classmethod
+    def apply_changes(
+            cls,
+            data_type: Literal["Habit", "State"],
+            changes: list[EntryChange]
+        ) -> None:
+        """
+        Update statistics of objects, which entries were changed.
+
+        Counts and sums are updated by difference between old and new value.
+        Streaks are updated in place if entry was appended after the last one,
+        otherwise they are calculated again from entries.
+
+        Arguments:
+            data_type -- string indicating type of data
+            changes -- collection of changes of entries
+        """
+        stats_model, _, owner_id = cls.get_models(data_type)
+        changes = sorted(changes, key=lambda change: (change.obj_id, change.date))
+        stats_key = getattr(stats_model, owner_id.key)
+        all_stats = {
+            getattr(stats, owner_id.key): stats
+            for stats in db.session.scalars(
+                db.select(stats_model)
+                .filter(stats_key.in_({change.obj_id for change in changes}))
+            )
+        }
+
+        streaks_to_recalculate = []
+        for obj_id, obj_changes in groupby(changes, key=lambda change: change.obj_id):
+            stats = all_stats.get(obj_id)
+            if stats is None:
+                # entries are flushed, so calculated stats already contain changes
+                db.session.flush()
+                db.session.add(cls.calculate(data_type, obj_id))
+                continue
+
+            recalculate_streaks = False
+            for change in obj_changes:
+                score_delta = cls.get_score(change.new_value) or 0
+                done_delta = int(cls.is_done(data_type, change.new_value))
+
+                if change.created:
+                    stats.total_count += 1
+                    is_appended = stats.last_entry_date is None or change.date > stats.last_entry_date
+                    if is_appended and not recalculate_streaks:
+                        stats.current_streak = stats.current_streak + 1 if done_delta else 0
+                        stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+                    else:
+                        recalculate_streaks = True
+                else:
+                    score_delta -= cls.get_score(change.old_value) or 0
+                    done_delta -= cls.is_done(data_type, change.old_value)
+                    recalculate_streaks = recalculate_streaks or done_delta != 0
+
+                stats.done_count += done_delta
+                stats.value_sum += score_delta
+                if stats.last_entry_date is None or change.date > stats.last_entry_date:
+                    stats.last_entry_date = change.date
+
+            if recalculate_streaks:
+                streaks_to_recalculate.append(stats)
+
+        if streaks_to_recalculate:
+            db.session.flush()
+            values = cls.get_values(
+                data_type, [getattr(stats, owner_id.key) for stats in streaks_to_recalculate]
+            )
+            for stats in streaks_to_recalculate:
+                cls.set_streaks(stats, data_type, values.get(getattr(stats, owner_id.key), []))
+
+    @classmethod
+    def get_values(
+            cls,
+            data_type: Literal["Habit", "State"],
+            ids: list[int]
+        ) -> dict[int, list[Any]]:
+        """
+        Return dictionary mapping id of object to values of all its entries
+        ordered by date. All objects are read with one query.
+
+        Arguments:
+            data_type -- string indicating type of data
+            ids -- ids of Habit or State objects
+        """
+        _, entry_model, owner_id = cls.get_models(data_type)
+        entries = db.session.execute(
+            db.select(owner_id, entry_model.value)
+            .filter(owner_id.in_(ids))
+            .order_by(owner_id, entry_model.date)
+        )
+        return {
+            obj_id: [value for _, value in obj_entries]
+            for obj_id, obj_entries in groupby(entries, key=lambda entry: entry[0])
+        }
+
+    @classmethod
+    def refresh(
+            cls,
+            data_type: Literal["Habit", "State"],
+            ids: list[int]
+        ) -> None:
+        """
+        Replace statistics of given objects with ones calculated from all
+        their entries. It's used instead of apply_changes, when many entries
+        were saved at once.
+
+        Arguments:
+            data_type -- string indicating type of data
+            ids -- ids of Habit or State objects
+        """
+        stats_model, _, owner_id = cls.get_models(data_type)
+        stats_key = getattr(stats_model, owner_id.key)
+        db.session.execute(db.delete(stats_model).filter(stats_key.in_(ids)))
+        db.session.add_all(QueryStatsHandler.get_stats_by_ids(ids, data_type).values())
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """
+        Calculate again statistics of all habits and states and save them.
+        Return count of rebuilt rows.
+        """
+        count = 0
+        for data_type, model, stats_model in (("Habit", Habit, HabitStats), ("State", State, StateStats)):
+            db.session.execute(db.delete(stats_model))
+            ids = db.session.scalars(db.select(model.id)).all()
+            stats = QueryStatsHandler.get_stats_by_ids(ids, data_type)
+            db.session.add_all(stats.values())
+            count += len(stats)
+        db.session.commit()
+        return count
+
+
+class QueryStatsHandler:
+    """
+    Calculates statistics of habits and states in database. Counts and sums
+    of all given objects are calculated with one GROUP BY query, streaks
+    with one query using window functions. No entries are loaded
+    as ORM objects.
+
+    Results have the same form as rows of HabitStats and StateStats tables,
+    but they aren't saved.
+    """
+    @classmethod
+    def get_stats(
+            cls,
+            objs: list[Habit | State],
+            data_type: Literal["Habit", "State"]
+        ) -> dict[int, HabitStats | StateStats]:
+        """
+        Return dictionary mapping object's id to its statistics.
+
+        Arguments:
+            objs -- collection of Habit or State objects
+            data_type -- string indicating type of data
+        """
+        return cls.get_stats_by_ids([obj.id for obj in objs], data_type)
+
+    @classmethod
+    def get_stats_by_ids(
+            cls,
+            ids: list[int],
+            data_type: Literal["Habit", "State"]
+        ) -> dict[int, HabitStats | StateStats]:
+        """
+        Return dictionary mapping id of object to its statistics.
+
+        Arguments:
+            ids -- ids of Habit or State objects
+            data_type -- string indicating type of data
+        """
+        stats_model, entry_model, owner_id = StatsTableHandler.get_models(data_type)
+        stats = {obj_id: cls.empty_stats(stats_model, owner_id.name, obj_id) for obj_id in ids}
+        if not ids:
+            return stats
+
+        done = cls.get_done_expression(data_type, entry_model)
+        score = cls.get_score_expression(data_type, entry_model)
+
+        aggregates = db.session.execute(
+            db.select(
+                owner_id,
+                func.count(),
+                func.sum(done),
+                func.sum(score),
+                func.max(entry_model.date)
+            )
+            .filter(owner_id.in_(ids))
+            .group_by(owner_id)
+        )
+        for obj_id, total_count, done_count, value_sum, last_entry_date in aggregates:
+            stats[obj_id].total_count = total_count
+            stats[obj_id].done_count = done_count or 0
+            stats[obj_id].value_sum = value_sum or 0
+            stats[obj_id].last_entry_date = last_entry_date
+
+        for obj_id, current_streak, longest_streak in db.session.execute(
+                cls.get_streaks_query(ids, data_type)):
+            stats[obj_id].current_streak = current_streak or 0
+            stats[obj_id].longest_streak = longest_streak or 0
+
+        return stats
+
+    @classmethod
+    def get_streaks_query(
+            cls,
+            ids: list[int],
+            data_type: Literal["Habit", "State"]
+        ) -> Select:
+        """
+        Return query selecting (id, current streak, longest streak) for given
+        objects.
+
+        Every entry, that isn't done, starts new island of entries. Island's
+        number is a running count of not done entries ordered by date.
+        Streak is a count of done entries in island, current streak is
+        the one in the last island.
+
+        Arguments:
+            ids -- ids of Habit or State objects
+            data_type -- string indicating type of data
+        """
+        _, entry_model, owner_id = StatsTableHandler.get_models(data_type)
+        done = cls.get_done_expression(data_type, entry_model)
+
+        entries = (
+            db.select(
+                owner_id.label("obj_id"),
+                done.label("done"),
+                func.sum(1 - done).over(
+                    partition_by=owner_id,
+                    order_by=entry_model.date,
+                    rows=(None, 0)
+                ).label("island")
+            )
+            .filter(owner_id.in_(ids))
+            .subquery()
+        )
+        islands = (
+            db.select(
+                entries.c.obj_id,
+                func.sum(entries.c.done).label("length"),
+                func.row_number().over(
+                    partition_by=entries.c.obj_id,
+                    order_by=entries.c.island.desc()
+                ).label("recency")
+            )
+            .group_by(entries.c.obj_id, entries.c.island)
+            .subquery()
+        )
+        return (
+            db.select(
+                islands.c.obj_id,
+                func.max(case((islands.c.recency == 1, islands.c.length), else_=0)),
+                func.max(islands.c.length)
+            )
+            .group_by(islands.c.obj_id)
+        )
+
+    @classmethod
+    def get_done_expression(
+            cls,
+            data_type: Literal["Habit", "State"],
+            entry_model: type
+        ):
+        """
+        Return SQL expression equal to 1 if entry is done, 0 otherwise.
+        It's SQL version of StatsTableHandler.is_done method.
+        """
+        if data_type == "Habit":
+            return case((entry_model.value == True, 1), else_=0)
+        return case((entry_model.value.cast(Integer) >= 0, 1), else_=0)
+
+    @classmethod
+    def get_score_expression(
+            cls,
+            data_type: Literal["Habit", "State"],
+            entry_model: type
+        ):
+        """
+        Return SQL expression equal to numeric value of entry or 0 if entry
+        has no value. It's SQL version of StatsTableHandler.get_score method.
+        """
+        value = entry_model.value.cast(Integer)
+        return case((value >= 0, value), else_=0)
+
+    @classmethod
+    def empty_stats(
+            cls,
+            stats_model: type,
+            owner_column: str,
+            obj_id: int
+        ) -> HabitStats | StateStats:
+        """
+        Return statistics of object without any entries.
+        """
+        return stats_model(**{
+            owner_column: obj_id,
+            "done_count": 0,
+            "total_count": 0,
+            "value_sum": 0,
+            "current_streak": 0,
+            "longest_streak": 0,
+            "last_entry_date": None,
+        })
+
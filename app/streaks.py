@@ -0,0 +1,240 @@
+import datetime
+from typing import Any, Iterable, NamedTuple
+
+import numpy as np
+
+
+class Streak(NamedTuple):
+    """
+    Range of consecutive entries with habit done.
+    """
+    start_date: datetime.date
+    end_date: datetime.date
+    length: int
+
+
+class Gap(NamedTuple):
+    """
+    Range of consecutive days without any entry.
+    """
+    start_date: datetime.date
+    end_date: datetime.date
+
+
+class StreakSummary(NamedTuple):
+    """
+    All streak metrics of one habit.
+    """
+    current_streak: int
+    longest_streak: int
+    streaks: list[Streak]
+    gaps: list[Gap]
+
+
+class HabitHistory:
+    """
+    History of habit stored as packed bit arrays, one bit for every day
+    from start_date to end_date.
+
+    Masks:
+        done -- days with habit done
+        broken -- days with entry, but habit not done
+        missing -- days without entry, calculated from two other masks
+    """
+    def __init__(
+            self,
+            start_date: datetime.date,
+            n_days: int,
+            done: np.ndarray,
+            broken: np.ndarray
+        ) -> None:
+        """
+        Initialize attributes of object.
+
+        Arguments:
+            start_date -- date of first bit
+            n_days -- count of days in history
+            done -- packed bit array of days with habit done
+            broken -- packed bit array of days with habit not done
+        """
+        self.start_date = start_date
+        self.n_days = n_days
+        self.done = done
+        self.broken = broken
+
+    @classmethod
+    def from_entries(
+            cls,
+            start_date: datetime.date,
+            end_date: datetime.date,
+            entries: Iterable[tuple[datetime.date, Any]]
+        ) -> "HabitHistory":
+        """
+        Create history from (date, value) pairs. Entries outside of range
+        are skipped.
+
+        Arguments:
+            start_date -- first day of history
+            end_date -- last day of history
+            entries -- pairs of entry's date and value
+        """
+        n_days = max((end_date - start_date).days + 1, 0)
+        entries = list(entries)
+        dates, values = zip(*entries) if entries else ((), ())
+
+        offsets = (
+            np.array(dates, dtype="datetime64[D]")
+            - np.datetime64(start_date, "D")
+        ).astype(np.int64)
+        values = np.array(values, dtype=np.float64) > 0
+        in_range = (offsets >= 0) & (offsets < n_days)
+
+        done = np.zeros(n_days, dtype=bool)
+        broken = np.zeros(n_days, dtype=bool)
+        done[offsets[in_range & values]] = True
+        broken[offsets[in_range & ~values]] = True
+
+        return cls(start_date, n_days, np.packbits(done), np.packbits(broken))
+
+    @classmethod
+    def from_values(
+            cls,
+            start_date: datetime.date,
+            values: np.ndarray
+        ) -> "HabitHistory":
+        """
+        Create history from array of values, one for every day starting
+        at start_date. Negative values mean days without entry.
+
+        Arguments:
+            start_date -- first day of history
+            values -- array of habit's values
+        """
+        values = np.asarray(values)
+        done = values > 0
+        broken = values == 0
+        return cls(start_date, len(values), np.packbits(done), np.packbits(broken))
+
+    def unpack(
+            self,
+            mask: np.ndarray
+        ) -> np.ndarray:
+        """
+        Return packed mask as array of booleans, one for every day.
+        """
+        return np.unpackbits(mask, count=self.n_days).astype(bool)
+
+    @property
+    def missing(self) -> np.ndarray:
+        """
+        Packed bit array of days without any entry.
+        """
+        return np.packbits(~(self.unpack(self.done) | self.unpack(self.broken)))
+
+
+class StreakEngine:
+    """
+    Calculates streak metrics from HabitHistory with vectorized operations.
+
+    Streak is a count of consecutive entries with habit done. Days without
+    any entry don't break streak, same as in other statistics of
+    application, but they are reported as gaps.
+    """
+    @classmethod
+    def get_runs(
+            cls,
+            mask: np.ndarray
+        ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return indexes of starts and lengths of all runs of True values
+        in boolean array.
+
+        Arguments:
+            mask -- array of booleans
+        """
+        edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        return starts, ends - starts
+
+    @classmethod
+    def summarize(
+            cls,
+            history: HabitHistory
+        ) -> StreakSummary:
+        """
+        Calculate all streak metrics of habit.
+
+        Arguments:
+            history -- history of habit
+        """
+        done = history.unpack(history.done)
+        recorded_days = np.flatnonzero(done | history.unpack(history.broken))
+
+        # streaks are runs of done entries among days with any entry
+        starts, lengths = cls.get_runs(done[recorded_days])
+        current_streak, longest_streak = cls.get_current_and_longest(
+            starts, lengths, len(recorded_days)
+        )
+
+        first_days = recorded_days[starts]
+        last_days = recorded_days[starts + lengths - 1]
+        streaks = [
+            Streak(cls.get_date(history, first), cls.get_date(history, last), int(length))
+            for first, last, length in zip(first_days, last_days, lengths)
+        ]
+
+        gap_starts, gap_lengths = cls.get_runs(history.unpack(history.missing))
+        gaps = [
+            Gap(cls.get_date(history, start), cls.get_date(history, start + length - 1))
+            for start, length in zip(gap_starts, gap_lengths)
+        ]
+
+        return StreakSummary(current_streak, longest_streak, streaks, gaps)
+
+    @classmethod
+    def get_streaks(
+            cls,
+            done: np.ndarray
+        ) -> tuple[int, int]:
+        """
+        Return current and longest streak of consecutive entries.
+
+        Arguments:
+            done -- boolean array, True for entries with habit done,
+                ordered by date
+        """
+        done = np.asarray(done, dtype=bool)
+        starts, lengths = cls.get_runs(done)
+        return cls.get_current_and_longest(starts, lengths, len(done))
+
+    @classmethod
+    def get_current_and_longest(
+            cls,
+            starts: np.ndarray,
+            lengths: np.ndarray,
+            n_entries: int
+        ) -> tuple[int, int]:
+        """
+        Return current and longest streak from runs of done entries.
+        Current streak is the run ending at the last entry.
+
+        Arguments:
+            starts -- indexes of first entries of runs
+            lengths -- lengths of runs
+            n_entries -- count of all entries
+        """
+        if not len(lengths):
+            return 0, 0
+        current_streak = int(lengths[-1]) if starts[-1] + lengths[-1] == n_entries else 0
+        return current_streak, int(lengths.max())
+
+    @staticmethod
+    def get_date(
+            history: HabitHistory,
+            offset: int
+        ) -> datetime.date:
+        """
+        Return date of day with given offset in history.
+        """
+        return history.start_date + datetime.timedelta(days=int(offset))
@@ -0,0 +1,237 @@
+import datetime
+from typing import Literal, NamedTuple
+
+import numpy as np
+
+from app import db
+from app.models import Habit, HabitEntry, State, StateEntry
+from app.raster import DEFAULT_PALETTES
+
+
+class Trend(NamedTuple):
+    """
+    Rolling statistics of one habit or state.
+
+    Attributes:
+        values -- dictionary mapping window's length to percentage of days
+            with habit done or to average state value in last days,
+            None if there is no data in window
+        sparkline -- SVG image of rolling statistic over the whole period
+    """
+    values: dict[int, float | None]
+    sparkline: str
+
+
+class TrendHandler:
+    """
+    Calculates rolling-window statistics of habits and states.
+
+    Entries of all given objects are loaded with one query into arrays
+    of shape (days, objects). After one pass of cumulative sum, sum over
+    any window is a difference of two rows, so every window costs O(1)
+    per day and object.
+
+    Habit's value in window is a percentage of tracked days with habit done,
+    same as all-time percentage on dashboard. State's value in window
+    is an average of entries with value.
+    """
+    @classmethod
+    def get_trends(
+            cls,
+            objs: list[Habit | State],
+            data_type: Literal["Habit", "State"],
+            end_date: datetime.date,
+            windows: list[int],
+            sparkline_window: int,
+            n_days: int = 365
+        ) -> dict[int, Trend]:
+        """
+        Return dictionary mapping object's id to its trend.
+
+        Arguments:
+            objs -- collection of Habit or State objects
+            data_type -- string indicating type of data
+            end_date -- last day of all windows
+            windows -- lengths of windows, in days
+            sparkline_window -- length of window used by sparkline
+            n_days -- count of days shown by sparkline
+        """
+        if not objs:
+            return {}
+        longest = max(list(windows) + [sparkline_window])
+        start_date = end_date - datetime.timedelta(days=n_days + longest - 2)
+        sums, counts = cls.get_arrays(objs, data_type, start_date, end_date)
+
+        cum_sums = cls.get_cumulative(sums)
+        cum_counts = cls.get_cumulative(counts)
+        scale = 100 if data_type == "Habit" else 1
+        current = {
+            window: cls.get_rolling(cum_sums, cum_counts, window)[-1] * scale
+            for window in windows
+        }
+        history = cls.get_rolling(cum_sums, cum_counts, sparkline_window)[-n_days:] * scale
+
+        palette = DEFAULT_PALETTES[data_type.lower()]
+        vmax = 100 if data_type == "Habit" else 5
+        return {
+            obj.id: Trend(
+                values={
+                    window: None if np.isnan(value[i]) else round(float(value[i]), 2)
+                    for window, value in current.items()
+                },
+                sparkline=SparklinePlotter(history[:, i], 0, vmax, palette[-1]).plot_to_svg(),
+            )
+            for i, obj in enumerate(objs)
+        }
+
+    @classmethod
+    def get_arrays(
+            cls,
+            objs: list[Habit | State],
+            data_type: Literal["Habit", "State"],
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return two arrays of shape (days, objects) from start_date to end_date:
+        sums of values and counts of days taken into account.
+
+        For habits value is 1 if habit was done, and every day since start
+        of tracking is counted. For states value is state's value and only
+        days with value are counted.
+
+        Arguments:
+            objs -- collection of Habit or State objects
+            data_type -- string indicating type of data
+            start_date -- first day of arrays
+            end_date -- last day of arrays
+        """
+        if data_type == "Habit":
+            model, owner_id = HabitEntry, HabitEntry.habit_id
+        elif data_type == "State":
+            model, owner_id = StateEntry, StateEntry.state_id
+        else:
+            raise ValueError("Incorrect data type!")
+
+        n_days = (end_date - start_date).days + 1
+        columns = {obj.id: i for i, obj in enumerate(objs)}
+        entries = db.session.execute(
+            db.select(owner_id, model.date, model.value.cast(db.Integer))
+            .filter(owner_id.in_(list(columns)))
+            .filter(model.date.between(start_date, end_date))
+        ).all()
+
+        values = np.full((n_days, len(objs)), np.nan)
+        if entries:
+            owner_ids, dates, entry_values = zip(*entries)
+            rows = (
+                np.array(dates, dtype="datetime64[D]") - np.datetime64(start_date, "D")
+            ).astype(np.int64)
+            cols = np.fromiter((columns[obj_id] for obj_id in owner_ids), dtype=np.int64, count=len(owner_ids))
+            values[rows, cols] = np.array(entry_values, dtype=np.float64)
+
+        if data_type == "Habit":
+            start_offsets = np.array([(obj.start_date - start_date).days for obj in objs])
+            counts = np.arange(n_days)[:, None] >= start_offsets[None, :]
+            sums = values > 0
+        else:
+            counts = values >= 0
+            sums = np.where(counts, values, 0)
+        return sums.astype(np.float64), counts.astype(np.float64)
+
+    @staticmethod
+    def get_cumulative(array: np.ndarray) -> np.ndarray:
+        """
+        Return cumulative sums of array along days, with row of zeros
+        prepended, so sum of days [a, b) is cum[b] - cum[a].
+        """
+        cumulative = np.zeros((array.shape[0] + 1,) + array.shape[1:])
+        np.cumsum(array, axis=0, out=cumulative[1:])
+        return cumulative
+
+    @staticmethod
+    def get_rolling(
+            cum_sums: np.ndarray,
+            cum_counts: np.ndarray,
+            window: int
+        ) -> np.ndarray:
+        """
+        Return ratio of sum to count in every window of given length ending
+        at consecutive days. Array starts at the first day with full window.
+        Windows without any counted day contain NaN.
+
+        Arguments:
+            cum_sums -- cumulative sums of values
+            cum_counts -- cumulative counts of days
+            window -- length of window, in days
+        """
+        window = min(window, len(cum_sums) - 1)
+        sums = cum_sums[window:] - cum_sums[:-window]
+        counts = cum_counts[window:] - cum_counts[:-window]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+
+class SparklinePlotter:
+    """
+    Class plotting small line chart without axes as SVG image. Missing values
+    break the line.
+    """
+    def __init__(
+            self,
+            values: np.ndarray,
+            vmin: float,
+            vmax: float,
+            color: str,
+            width: int = 240,
+            height: int = 40
+        ) -> None:
+        """
+        Initializes class attributes.
+
+        Arguments:
+            values -- values to plot, NaN for missing ones
+            vmin -- value at the bottom of image
+            vmax -- value at the top of image
+            color -- color of line
+            width -- width of image in pixels
+            height -- height of image in pixels
+        """
+        self.values = np.asarray(values, dtype=np.float64)
+        self.vmin = vmin
+        self.vmax = vmax
+        self.color = color
+        self.width = width
+        self.height = height
+
+    def get_segments(self) -> list[np.ndarray]:
+        """
+        Return list of arrays of (x, y) points of continuous parts of line.
+        """
+        n = len(self.values)
+        xs = np.arange(n) * (self.width / max(n - 1, 1))
+        ys = self.height - (self.values - self.vmin) / (self.vmax - self.vmin) * self.height
+        points = np.column_stack((xs, ys))
+
+        present = ~np.isnan(self.values)
+        edges = np.diff(np.concatenate(([0], present.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        return [points[start:end] for start, end in zip(starts, ends)]
+
+    def plot_to_svg(self) -> str:
+        """
+        Create sparkline. Return it as SVG markup.
+        """
+        lines = [
+            '<polyline points="'
+            + " ".join(f"{x:.1f},{y:.1f}" for x, y in segment)
+            + f'" fill="none" stroke="{self.color}" stroke-width="1.5"/>'
+            for segment in self.get_segments()
+        ]
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" '
+            f'height="{self.height}" viewBox="0 0 {self.width} {self.height}">'
+            + "".join(lines)
+            + "</svg>"
+        )
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.orm import make_transient_to_detached, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.models import Habit, State, User
+
+
+class UserCache:
+    """
+    Cache of logged in users with their habits and states, kept in LRU
+    order. Entries expire after ttl seconds, so changes made by other
+    processes are seen after that time. Changes made by this process drop
+    user's entry.
+
+    Only column values are cached. Every request gets new objects, which
+    are merged into its session without querying database.
+    """
+    def __init__(
+            self,
+            max_users: int = 1024,
+            ttl: float = 60
+        ) -> None:
+        """
+        Initialize attributes of object.
+
+        Arguments:
+            max_users -- maximal count of cached users
+            ttl -- seconds after which cached user is loaded again,
+                0 turns cache off
+        """
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self._generation = 0
+        self.max_users = max_users
+        self.ttl = ttl
+
+    def configure(
+            self,
+            max_users: int,
+            ttl: float
+        ) -> None:
+        """
+        Set maximal count of cached users and their time to live and clear cache.
+        """
+        with self._lock:
+            self.max_users = max_users
+            self.ttl = ttl
+            self._users.clear()
+
+    @staticmethod
+    def get_columns(obj: Any) -> dict[str, Any]:
+        """
+        Return dictionary with values of all columns of model's object.
+        """
+        return {attr.key: getattr(obj, attr.key) for attr in sa.inspect(type(obj)).column_attrs}
+
+    @classmethod
+    def make_snapshot(cls, user: User) -> tuple[dict, list[dict], list[dict]]:
+        """
+        Return column values of user, its habits and states.
+        """
+        return (
+            cls.get_columns(user),
+            [cls.get_columns(habit) for habit in user.habits],
+            [cls.get_columns(state) for state in user.states],
+        )
+
+    @staticmethod
+    def restore(snapshot: tuple[dict, list[dict], list[dict]]) -> User:
+        """
+        Return user created from snapshot and merged into current session.
+        """
+        user_columns, habit_columns, state_columns = snapshot
+        user = User(**user_columns)
+        habits = [Habit(**columns) for columns in habit_columns]
+        states = [State(**columns) for columns in state_columns]
+        for obj in [user, *habits, *states]:
+            make_transient_to_detached(obj)
+        set_committed_value(user, "habits", habits)
+        set_committed_value(user, "states", states)
+        return db.session.merge(user, load=False)
+
+    def get(
+            self,
+            uid: int
+        ) -> User | None:
+        """
+        Return user with given id with loaded habits and states, or None
+        if it doesn't exist.
+
+        Arguments:
+            uid -- user's id
+        """
+        with self._lock:
+            cached = self._users.get(uid)
+            if cached is not None and cached[0] > time.monotonic():
+                self._users.move_to_end(uid)
+                snapshot = cached[1]
+            else:
+                snapshot = None
+            generation = self._generation
+
+        if snapshot is not None:
+            return self.restore(snapshot)
+
+        user = db.session.scalar(
+            db.select(User)
+            .filter_by(id=uid)
+            .options(selectinload(User.habits), selectinload(User.states))
+        )
+        if user is None or self.ttl <= 0:
+            return user
+
+        snapshot = self.make_snapshot(user)
+        with self._lock:
+            if generation == self._generation:
+                self._users[uid] = (time.monotonic() + self.ttl, snapshot)
+                self._users.move_to_end(uid)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+        return user
+
+    def invalidate(
+            self,
+            uid: int
+        ) -> None:
+        """
+        Drop cached user. It has to be called every time user, its habits
+        or states are changed.
+
+        Arguments:
+            uid -- user's id
+        """
+        with self._lock:
+            self._generation += 1
+            self._users.pop(uid, None)
+
+    def clear(self) -> None:
+        """
+        Drop all cached users.
+        """
+        with self._lock:
+            self._generation += 1
+            self._users.clear()
+
+
+user_cache = UserCache()
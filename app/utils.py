@@ -1,14 +1,26 @@
+import calendar
 import datetime
+from functools import lru_cache
+from typing import Literal, Any
 
 from flask import url_for, abort
 from flask_login import current_user
 
 from werkzeug.datastructures import ImmutableMultiDict
 
+from sqlalchemy import and_
 from sqlalchemy.sql import func
+from sqlalchemy.dialects.sqlite import insert
 
 from . import db
-from .models import JournalEntry, HabitEntry, Habit, State, StateEntry
+from .models import JournalEntry, HabitEntry, Habit, State, StateEntry, User
+from .plot_handler import plot_cache
+from .analytics import analytics_cache
+from .stats_handler import EntryChange, StatsTableHandler
+from .vector_storage import VectorStorage
+from .range_index import RangeIndex
+from .day_status import DayFill, day_status_cache
+from .user_cache import user_cache
 
 class CalendarUtils:
     """
@@ -49,10 +61,56 @@ class CalendarUtils:
 
         return last_month, next_month
 
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def get_month_layout(
+            year: int,
+            month: int
+        ) -> tuple[tuple[int, ...], ...]:
+        """
+        Return weeks of month as tuples of numbers of days. Days of previous
+        and next months are zeros. Layout doesn't depend on user, so it's
+        remembered. Raise ValueError for incorrect month.
+
+        Arguments:
+            year -- year as a number
+            month -- month as a number from 1 to 12
+        """
+        return tuple(tuple(week) for week in calendar.monthcalendar(year, month))
+
+    @staticmethod
+    def get_heat_color(
+            ratio: float | None
+        ) -> str | None:
+        """
+        Return CSS color of calendar's cell for given part of done habits,
+        more done habits give more intense color.
+        """
+        if ratio is None:
+            return None
+        return f"hsla(141, 53%, 53%, {0.15 + 0.85 * ratio:.2f})"
+
+    @staticmethod
+    def get_day_summary(
+            day_fill: DayFill
+        ) -> str:
+        """
+        Return short description of data entered for a day, shown as a tooltip
+        of calendar's cell.
+        """
+        parts = []
+        if day_fill.done_ratio is not None:
+            parts.append(f"Habits done: {day_fill.done_ratio:.0%}")
+        if day_fill.state_average is not None:
+            parts.append(f"Average state: {day_fill.state_average:.1f}")
+        if day_fill.has_journal:
+            parts.append("Journal")
+        return ", ".join(parts)
+
     @classmethod
     def generate_calendar_table(
             cls,
-            cal: list[list[int]],
+            cal: tuple[tuple[int, ...], ...],
             uid: int,
             mdate: str
         ) -> list[list[dict]]:
@@ -60,8 +118,11 @@ class CalendarUtils:
         Generate  and return table with calendar values, that will be used to
         render proper calendar for given month and given user.
 
+        Data entered for every day are read for whole month at once,
+        see DayStatus.get_fill.
+
         Arguments:
-            cal -- calendar's object for given month
+            cal -- layout of given month, see get_month_layout
             uid -- current user's id
             mdate -- date entered in format YYYYMM, where Y = Year,
                 M = Month. For example 202302
@@ -71,6 +132,15 @@ class CalendarUtils:
         min_date = current_user.get_min_date()
         first_date = min_date.strftime(r"%Y%m%d")
 
+        year, month = int(mdate[:4]), int(mdate[4:])
+        fill = day_status_cache.get_fill(
+            uid,
+            datetime.date(year, month, 1),
+            datetime.date(year, month, calendar.monthrange(year, month)[1])
+        )
+        # url_for is called once, links of days differ only in date
+        link_template = url_for("main.day_date", date="00000000")
+
         generated_calendar = []
         for week in cal:
             generated_week = []
@@ -80,10 +150,15 @@ class CalendarUtils:
                     d = {}
                 else:
                     date = f"{mdate}{str(day).zfill(2)}"
+                    day_fill = fill.get(datetime.date(year, month, day))
                     d = {
-                        "link": url_for("main.day_date", date=date),
+                        "link": link_template.replace("00000000", date),
                         "day": day,
-                        "is_active": True if first_date <= date <= today else False
+                        "is_active": True if first_date <= date <= today else False,
+                        "has_data": day_fill is not None,
+                        "has_journal": day_fill.has_journal if day_fill else False,
+                        "summary": cls.get_day_summary(day_fill) if day_fill else "",
+                        "color": cls.get_heat_color(day_fill.done_ratio) if day_fill else None
                     }
                 generated_week.append(d)
             generated_calendar.append(generated_week)
@@ -95,22 +170,6 @@ class DataOperationUtils:
     Utils related to accesing data from forms and putting
     or updating them in database.
     """
-    @classmethod
-    def update_note(
-            cls,
-            uid: int,
-            form: ImmutableMultiDict,
-            date: datetime.date
-        ) -> None:
-        """
-        Update journal note for given day, using data entered to form.
-        """
-        journal_entry = db.session.scalar(
-            db.select(JournalEntry)
-            .filter_by(user_id=uid, date=date)
-        )
-        journal_entry.note = form.get("journal_entry")
-
     @classmethod
     def get_habit_value(
             cls,
@@ -131,207 +190,220 @@ class DataOperationUtils:
     def get_state_value(
             cls,
             state: State,
-            form: ImmutableMultiDict
-        ) -> int:
+            form: ImmutableMultiDict,
+            default: int | None = None
+        ) -> int | None:
         """
         Get state value from form.
+
+        Arguments:
+            state -- State object
+            form -- data entered to form
+            default -- value used if state wasn't chosen
         """
         if state.name in form.keys():
             state_value = form.get(state.name)
         else:
-            state_value = None
+            state_value = default
 
         return state_value
 
     @classmethod
-    def update_states(
+    def save_day(
             cls,
-            states: list[State],
+            uid: int,
             date: datetime.date,
-            form: ImmutableMultiDict
-        ) -> None:
-        """
-        Update values for given states, using data entered to form.
-        """
-        for state in states:
-            state_value = cls.get_state_value(state, form)
-
-            state_entry = db.session.scalar(
-                db.select(StateEntry)
-                .filter_by(state_id=state.id, date=date)
-            )
-            state_entry.value = state_value
-
-    @classmethod
-    def update_habits(
-            cls,
             habits: list[Habit],
-            date: datetime.date,
-            form: ImmutableMultiDict
+            states: list[State],
+            form: ImmutableMultiDict,
+            empty_state_value: int | None = -1
         ) -> None:
         """
-        Update values for given habits, using data entered to form.
-        """
+        Save journal note and entries of all given habits and states for one
+        day, using data entered to form. Existing entries are overwritten,
+        so the same method handles new days, edits and repeated submits.
 
-        for habit in habits:
-            habit_value = cls.get_habit_value(habit, form)
+        Every table is written with one statement, no matter how many habits
+        and states user has.
 
-            habit_entry = db.session.scalar(
-                db.select(HabitEntry)
-                .filter_by(habit_id=habit.id, date=date)
-            )
-            habit_entry.value = habit_value
+        Arguments:
+            uid -- user's id
+            date -- date object
+            habits -- Habit objects, that have entry on this day
+            states -- State objects, that have entry on this day
+            form -- data entered to form
+            empty_state_value -- value saved for states, that weren't chosen
+        """
+        cls.save_journal_entry(uid, date, form.get("journal_entry"))
+        cls.save_entries("Habit", date, {
+            habit.id: cls.get_habit_value(habit, form) for habit in habits
+        })
+        cls.save_entries("State", date, {
+            state.id: cls.get_state_value(state, form, empty_state_value) for state in states
+        })
+        # statuses are dropped only when new data can be read by other requests
+        db.session().call_after_commit(day_status_cache.invalidate, uid)
 
     @classmethod
     def save_journal_entry(
             cls,
             uid: int,
             date: datetime.date,
-            note: str
+            note: str | None
         ) -> None:
         """
-        Save journal entry to database.
+        Save journal entry to database, replacing existing one.
 
         Arguments:
             uid -- user's id
             date -- date object
             note -- string containing journal entry
         """
-        journal = JournalEntry(
-                user_id=uid,
-                date=date,
-                note=note
-            )
-        db.session.add(journal)
-
-    @classmethod
-    def save_habit_entries(
-            cls,
-            habits: list[Habit],
-            fields: ImmutableMultiDict[str, str],
-            date: datetime.date
-        ) -> None:
-        """
-        Save all habit entries to database
-
-        Arguments:
-            habits -- collection containing all Habit objects, belonging
-                to one user
-            checked_values -- dict containing all names of entered form fields
-            date -- date object
-        """
-        for habit in habits:
-            if fields.get(habit.name, default=False):
-                habit_value = True
-            else:
-                habit_value = False
-
-            cls.save_habit_entry(habit.id, date, habit_value)
-
-    @classmethod
-    def save_state_entries(
-            cls,
-            states: list[State],
-            fields: ImmutableMultiDict[str, str],
-            date: datetime.date
-        ) -> None:
-        """
-        Save all state entries to database
-
-        Arguments:
-            states -- collection containing all State objects, belonging
-                to one user
-            checked_values -- dict containing all names of entered form fields
-            date -- date object
-        """
-        for state in states:
-            state_value = fields.get(state.name, default=-1)
-
-            cls.save_state_entry(state.id, date, state_value)
+        statement = insert(JournalEntry)
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[JournalEntry.user_id, JournalEntry.date],
+                set_={"note": statement.excluded.note}
+            ),
+            {"user_id": uid, "date": date, "note": note}
+        )
+        if User.entry_saved(uid, date):
+            db.session().call_after_commit(user_cache.invalidate, uid)
 
     @classmethod
-    def save_habit_entry(
+    def save_entries(
             cls,
-            habit_id: int,
+            data_type: Literal["Habit", "State"],
             date: datetime.date,
-            value: bool
+            values: dict[int, Any]
         ) -> None:
         """
-        Add one habit entry to database.
+        Save entries of one day with a single INSERT ... ON CONFLICT DO UPDATE
+        executed for all rows, replacing values of existing entries.
+        Old values are read with one query, so changes can be passed
+        to entries_changed. The same query returns first entry dates of owners,
+        so users are updated only when entry is older than all their entries.
 
         Arguments:
-            habit_id -- id of habit
+            data_type -- string indicating type of data
             date -- date object
-            value -- value of entry
+            values -- dict mapping id of Habit or State to value of entry
         """
-        habit_entry = HabitEntry(
-            habit_id=habit_id,
-            date=date,
-            value=value
+        if not values:
+            return
+
+        _, entry_model, owner_id = StatsTableHandler.get_models(data_type)
+        owner_model = Habit if data_type == "Habit" else State
+        rows = db.session.execute(
+            db.select(owner_model.id, owner_model.user_id, User.first_entry_date,
+                      entry_model.date, entry_model.value)
+            .join(User, User.id == owner_model.user_id)
+            .outerjoin(entry_model, and_(owner_id == owner_model.id, entry_model.date == date))
+            .filter(owner_model.id.in_(values.keys()))
+        ).all()
+        old_values = {
+            obj_id: value
+            for obj_id, _, _, entry_date, value in rows
+            if entry_date is not None
+        }
+        uids = {
+            uid
+            for _, uid, first_entry_date, _, _ in rows
+            if first_entry_date is None or first_entry_date > date
+        }
+
+        statement = insert(entry_model)
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[owner_id, entry_model.date],
+                set_={"value": statement.excluded.value}
+            ),
+            [
+                {owner_id.key: obj_id, "date": date, "value": value}
+                for obj_id, value in values.items()
+            ]
         )
-        
-        db.session.add(habit_entry)
+        for uid in uids:
+            if User.entry_saved(uid, date):
+                db.session().call_after_commit(user_cache.invalidate, uid)
+
+        cls.entries_changed(data_type, [
+            EntryChange(obj_id, date, old_values.get(obj_id), value, obj_id not in old_values)
+            for obj_id, value in values.items()
+        ])
 
     @classmethod
-    def save_state_entry(
+    def entries_changed(
             cls,
-            state_id,
-            date,
-            value
+            data_type: Literal["Habit", "State"],
+            changes: list[EntryChange]
         ) -> None:
         """
-        Add one state entry to database.
+        Update everything that depends on entries: drop cached plots
+        and analytics, update statistics and range indexes of changed habits
+        or states and their compact vectors, if they are enabled.
+        Every method saving HabitEntry or StateEntry has to call it.
 
         Arguments:
-            state_id -- id of state
-            date -- date object
-            value -- value of entry
+            data_type -- string indicating type of changed entries
+            changes -- collection of changes of entries
         """
-        state_entry = StateEntry(
-            state_id=state_id,
-            date=date,
-            value=value
-        )
-        db.session.add(state_entry)
+        session = db.session()
+        for obj_id in {change.obj_id for change in changes}:
+            # dropped before commit, plots and analytics of old entries
+            # could be calculated and cached again by other request
+            session.call_after_commit(plot_cache.invalidate, data_type, obj_id)
+            session.call_after_commit(analytics_cache.invalidate, data_type, obj_id)
+        StatsTableHandler.apply_changes(data_type, changes)
+        RangeIndex.apply_changes(data_type, changes)
+        if VectorStorage.is_enabled():
+            VectorStorage.apply_changes(data_type, changes)
 
     @classmethod
     def add_missing_entries(
         cls,
-        habits: list[Habit],
-        states: list[State],
+        uid: int,
         date: datetime.date
     ) -> None:
         """
-        Create entries for habits and states with default value and with given
-        date attribute.
+        Create entries with default value for user's habits and states, that
+        already started on given date, but have no entry for it.
         They are created only to be replaced by user input. They have to be created,
         so edit form will be displayed correctly.
 
+        Objects without entry are found with one anti-join query per table
+        and their entries are inserted with one statement, so cost doesn't
+        depend on length of user's history.
+
         Arguments:
-            habits -- collection containing all Habit objects, belonging
-                to one user
-            states -- collection containing all State objects, belonging
-                to one user
+            uid -- user's id
             date -- date object
         """
-        for habit in habits:
-            if not habit.habit_entries and date <= habit.start_date:
-                entry = HabitEntry(
-                    habit_id=habit.id,
-                    date=date,
-                    value=False
-                )
-                db.session.add(entry)
-
-        for state in states:
-            if not state.state_entries and date <= state.start_date:
-                entry = StateEntry(
-                    state_id=state.id,
-                    date=date,
-                    value=-1
-                )
-                db.session.add(entry)
-        db.session.commit()
+        added = False
+        for data_type, model, default in (("Habit", Habit, False), ("State", State, -1)):
+            _, entry_model, owner_id = StatsTableHandler.get_models(data_type)
+            missing_ids = db.session.scalars(
+                db.select(model.id)
+                .filter(model.user_id == uid, model.start_date <= date)
+                .filter(~db.select(entry_model)
+                    .filter(owner_id == model.id, entry_model.date == date)
+                    .exists())
+            ).all()
+            if not missing_ids:
+                continue
+
+            db.session.execute(insert(entry_model), [
+                {owner_id.key: obj_id, "date": date, "value": default}
+                for obj_id in missing_ids
+            ])
+            cls.entries_changed(data_type, [
+                EntryChange(obj_id, date, None, default, True) for obj_id in missing_ids
+            ])
+            added = True
+
+        if added:
+            db.session.commit()
+            day_status_cache.invalidate(uid)
 
 
 class DatetimeUtils:
@@ -379,3 +451,26 @@ class DatetimeUtils:
             return url_for("main.past")
         else:
             return None
+
+    @classmethod
+    def get_month_ranges(
+            cls,
+            year: int,
+            today: datetime.date
+        ) -> list[tuple[datetime.date, datetime.date]]:
+        """
+        Return pairs of first and last day of every month of year,
+        that already started. Range of current month ends today.
+
+        Arguments:
+            year -- year, e.g. 2024
+            today -- current date
+        """
+        ranges = []
+        for month in range(1, 13):
+            start_date = datetime.date(year, month, 1)
+            if start_date > today:
+                break
+            end_date = datetime.date(year, month, calendar.monthrange(year, month)[1])
+            ranges.append((start_date, min(end_date, today)))
+        return ranges
@@ -0,0 +1,210 @@
+import datetime
+from collections import defaultdict
+from typing import Literal, Any
+
+import numpy as np
+from flask import current_app
+
+from app import db
+from app.models import HabitEntry, HabitYearVector, StateEntry, StateYearVector
+from app.stats_handler import EntryChange
+
+"""
+Every year is stored as 366 bytes, one for every day of leap year.
+In other years the last byte is never used.
+"""
+DAYS_IN_YEAR = 366
+
+
+class VectorStorage:
+    """
+    Keeps values of entries in compact form: one row per habit or state
+    and year, holding a byte vector of daily values. Byte is equal to
+    value + 1, so 0 means that there is no entry (or entry without value)
+    and decoded vector uses -1 for days without data, same as plots.
+
+    Vectors are copies of HabitEntry and StateEntry tables, which stay
+    the source of truth. They are kept in sync only if COMPACT_STORAGE
+    is enabled, after enabling it they have to be built with
+    `flask build-vectors` command.
+    """
+    @classmethod
+    def is_enabled(cls) -> bool:
+        """
+        Return True if vectors are maintained and used for reading.
+        """
+        return current_app.config.get("COMPACT_STORAGE", False)
+
+    @classmethod
+    def get_models(
+            cls,
+            data_type: Literal["Habit", "State"]
+        ) -> tuple[Any, Any, Any, Any]:
+        """
+        Return vector model, its owner's id column, entry model and its
+        owner's id column for given data type.
+        """
+        if data_type == "Habit":
+            return HabitYearVector, HabitYearVector.habit_id, HabitEntry, HabitEntry.habit_id
+        elif data_type == "State":
+            return StateYearVector, StateYearVector.state_id, StateEntry, StateEntry.state_id
+        raise ValueError("Incorrect data type!")
+
+    @staticmethod
+    def encode(value: Any) -> int:
+        """
+        Return byte representing given value of entry.
+        """
+        if value is None or value == "":
+            return 0
+        return max(int(value) + 1, 0)
+
+    @staticmethod
+    def get_day_index(date: datetime.date) -> int:
+        """
+        Return position of date in vector of its year.
+        """
+        return date.timetuple().tm_yday - 1
+
+    @classmethod
+    def apply_changes(
+            cls,
+            data_type: Literal["Habit", "State"],
+            changes: list[EntryChange]
+        ) -> None:
+        """
+        Write changed values of entries to vectors. All needed vectors
+        are loaded with one query, missing ones are created.
+
+        Arguments:
+            data_type -- string indicating type of changed entries
+            changes -- collection of changes of entries
+        """
+        if not changes:
+            return
+        vector_model, owner_id, _, _ = cls.get_models(data_type)
+        keys = {(change.obj_id, change.date.year) for change in changes}
+
+        rows = db.session.scalars(
+            db.select(vector_model)
+            .filter(owner_id.in_({obj_id for obj_id, _ in keys}))
+            .filter(vector_model.year.in_({year for _, year in keys}))
+        ).all()
+        rows = {(getattr(row, owner_id.key), row.year): row for row in rows}
+
+        vectors = {
+            key: bytearray(rows[key].values) if key in rows else bytearray(DAYS_IN_YEAR)
+            for key in keys
+        }
+        for change in changes:
+            vector = vectors[(change.obj_id, change.date.year)]
+            vector[cls.get_day_index(change.date)] = cls.encode(change.new_value)
+
+        for (obj_id, year), vector in vectors.items():
+            if (obj_id, year) in rows:
+                rows[(obj_id, year)].values = bytes(vector)
+            else:
+                db.session.add(vector_model(**{owner_id.key: obj_id}, year=year, values=bytes(vector)))
+
+    @classmethod
+    def get_window(
+            cls,
+            data_type: Literal["Habit", "State"],
+            obj_id: int,
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> np.ndarray:
+        """
+        Return array of values of entries from start_date to end_date,
+        one for every day. Days without data contain -1.
+
+        Arguments:
+            data_type -- string indicating type of data
+            obj_id -- id of Habit or State
+            start_date -- first day of window
+            end_date -- last day of window
+        """
+        return cls.get_windows(data_type, [obj_id], start_date, end_date)[obj_id]
+
+    @classmethod
+    def get_windows(
+            cls,
+            data_type: Literal["Habit", "State"],
+            ids: list[int],
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> dict[int, np.ndarray]:
+        """
+        Return dictionary mapping id of object to its window, see get_window.
+        Vectors of all objects are read with one query.
+
+        Arguments:
+            data_type -- string indicating type of data
+            ids -- ids of Habit or State objects
+            start_date -- first day of window
+            end_date -- last day of window
+        """
+        vector_model, owner_id, _, _ = cls.get_models(data_type)
+        vectors = defaultdict(dict)
+        for obj_id, year, values in db.session.execute(
+                db.select(owner_id, vector_model.year, vector_model.values)
+                .filter(owner_id.in_(ids))
+                .filter(vector_model.year.between(start_date.year, end_date.year))):
+            vectors[obj_id][year] = values
+        return {
+            obj_id: cls.decode_window(vectors[obj_id], start_date, end_date)
+            for obj_id in ids
+        }
+
+    @classmethod
+    def decode_window(
+            cls,
+            vectors: dict[int, bytes],
+            start_date: datetime.date,
+            end_date: datetime.date
+        ) -> np.ndarray:
+        """
+        Cut window from start_date to end_date out of yearly vectors
+        and decode it. Missing years are treated as years without entries.
+
+        Arguments:
+            vectors -- dictionary mapping year to its vector
+            start_date -- first day of window
+            end_date -- last day of window
+        """
+        parts = []
+        for year in range(start_date.year, end_date.year + 1):
+            vector = np.frombuffer(vectors.get(year, bytes(DAYS_IN_YEAR)), dtype=np.uint8)
+            first = start_date if year == start_date.year else datetime.date(year, 1, 1)
+            last = end_date if year == end_date.year else datetime.date(year, 12, 31)
+            parts.append(vector[cls.get_day_index(first):cls.get_day_index(last) + 1])
+
+        if not parts:
+            return np.zeros(0, dtype=np.int8)
+        return np.concatenate(parts).astype(np.int8) - 1
+
+    @classmethod
+    def build(cls) -> int:
+        """
+        Create again vectors of all habits and states from their entries.
+        Return count of created vectors.
+        """
+        count = 0
+        for data_type in ("Habit", "State"):
+            vector_model, owner_id, entry_model, entry_owner_id = cls.get_models(data_type)
+            db.session.execute(db.delete(vector_model))
+
+            vectors = defaultdict(lambda: bytearray(DAYS_IN_YEAR))
+            entries = db.session.execute(
+                db.select(entry_owner_id, entry_model.date, entry_model.value)
+            )
+            for obj_id, date, value in entries:
+                vectors[(obj_id, date.year)][cls.get_day_index(date)] = cls.encode(value)
+
+            db.session.add_all(
+                vector_model(**{owner_id.key: obj_id}, year=year, values=bytes(vector))
+                for (obj_id, year), vector in vectors.items()
+            )
+            count += len(vectors)
+        db.session.commit()
+        return count
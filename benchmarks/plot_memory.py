@@ -0,0 +1,82 @@
+"""
+Benchmark checking that rendering heatmaps doesn't leak memory.
+
+It renders given count of heatmaps with chosen renderer and measures
+resident set size of the process. Benchmark fails if RSS after all renders
+grew more than allowed, compared to RSS measured after warm-up renders.
+
+Usage:
+    python -m benchmarks.plot_memory --count 2000 --renderer july
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+
+from app.plot_handler import RENDERERS
+
+
+def get_rss_mb() -> float:
+    """
+    Return current resident set size of process in megabytes.
+    """
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def render(
+        renderer: str,
+        dates: list[datetime.date],
+        data_type: str
+    ) -> None:
+    """
+    Render one heatmap with random data.
+    """
+    high = 1 if data_type == "Habit" else 5
+    data = [random.randint(-1, high) for _ in dates]
+    RENDERERS[renderer](dates, data, data_type).plot_to_png()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=2000,
+                        help="count of rendered heatmaps")
+    parser.add_argument("--warmup", type=int, default=50,
+                        help="count of renders before first measurement")
+    parser.add_argument("--renderer", choices=RENDERERS.keys(), default="july")
+    parser.add_argument("--max-growth", type=float, default=20,
+                        help="allowed growth of RSS in megabytes")
+    args = parser.parse_args()
+
+    today = datetime.date.today()
+    dates = [today - datetime.timedelta(days=i) for i in range(365, -1, -1)]
+
+    for i in range(args.warmup):
+        render(args.renderer, dates, ("Habit", "State")[i % 2])
+    baseline = get_rss_mb()
+
+    start = time.perf_counter()
+    for i in range(args.count):
+        render(args.renderer, dates, ("Habit", "State")[i % 2])
+        if (i + 1) % 500 == 0:
+            print(f"{i + 1:>6} renders, RSS {get_rss_mb():.1f} MB")
+    elapsed = time.perf_counter() - start
+
+    growth = get_rss_mb() - baseline
+    print(
+        f"{args.count} renders in {elapsed:.1f} s "
+        f"({elapsed / args.count * 1000:.1f} ms each), "
+        f"RSS growth {growth:.1f} MB"
+    )
+
+    if growth > args.max_growth:
+        print(f"FAIL: RSS grew by more than {args.max_growth} MB")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
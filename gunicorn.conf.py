@@ -0,0 +1,19 @@
+"""
+Gunicorn settings. Application is created once in master process, so heavy
+imports (numpy, matplotlib, july) are shared by all forked workers.
+
+Caches are kept separately by every worker, changes saved by one worker
+are seen by others after time to live of caches, see *_CACHE_TTL settings.
+"""
+import multiprocessing
+
+wsgi_app = "wsgi:app"
+preload_app = True
+workers = multiprocessing.cpu_count()
+
+
+def post_fork(server, worker):
+    from app import after_fork
+    from wsgi import app
+
+    after_fork(app)
@@ -0,0 +1,108 @@
+import datetime
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple
+
+import pytest
+import sqlalchemy as sa
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import User, Habit, State
+
+"""
+Default start date of seeded habits and states.
+"""
+SEED_DATE = datetime.date(2024, 3, 10)
+
+"""
+Password of every seeded user, hashed with one iteration, so logging in
+before every request is cheap.
+"""
+PASSWORD = "x"
+PASSWORD_HASH = generate_password_hash(PASSWORD, method="pbkdf2:sha256:1")
+
+
+class ExecutedStatement(NamedTuple):
+    """
+    SQL statement sent to database, with its parameters.
+    """
+    sql: str
+    parameters: object
+    executemany: bool
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "seed(users, habits, states, start_date): data added to database of app fixture"
+    )
+
+
+def seed_database(
+        users: int = 1,
+        habits: list[str] = (),
+        states: list[str] = (),
+        start_date: datetime.date = SEED_DATE
+    ) -> None:
+    """
+    Add users with ids 1, 2, ... and emails "<id>@dummy.com". Every user gets
+    active habits and states with given names, "{uid}" in a name is replaced
+    with user's id.
+    """
+    for uid in range(1, users + 1):
+        db.session.add(User(email=f"{uid}@dummy.com", name=str(uid), password=PASSWORD_HASH))
+        db.session.add_all([
+            Habit(user_id=uid, name=name.format(uid=uid), start_date=start_date, is_active=True)
+            for name in habits
+        ] + [
+            State(user_id=uid, name=name.format(uid=uid), start_date=start_date, is_active=True)
+            for name in states
+        ])
+    db.session.commit()
+
+
+@pytest.fixture
+def app(request):
+    """
+    Application with new in-memory database. Database is seeded with
+    arguments of seed_database taken from the closest "seed" marker, e.g.
+
+        pytestmark = pytest.mark.seed(users=2, habits=["h"], states=["s"])
+
+    Without marker it contains one user, 1@dummy.com.
+    """
+    marker = request.node.get_closest_marker("seed")
+    app = create_app("testing")
+    with app.app_context():
+        seed_database(**(marker.kwargs if marker else {}))
+    yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, uid: int = 1) -> None:
+    """
+    Log in seeded user with given id.
+    """
+    client.post("/login", data={"email": f"{uid}@dummy.com", "password": PASSWORD})
+
+
+@contextmanager
+def count_statements() -> Iterator[list[ExecutedStatement]]:
+    """
+    Collect statements run by main engine of current application inside
+    of the block.
+    """
+    statements = []
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(ExecutedStatement(statement, parameters, executemany))
+
+    engine = db.engines[None]
+    sa.event.listen(engine, "before_cursor_execute", listener)
+    try:
+        yield statements
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", listener)
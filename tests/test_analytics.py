@@ -0,0 +1,85 @@
+import pytest
+
+import numpy as np
+
+from app.analytics import AnalyticsHandler, AnalyticsCache
+
+nan = np.nan
+
+class TestAnalyticsHandler:
+    @pytest.mark.parametrize(
+            'a,b,expected',
+            [([1, 0, 1, 0], [5, 1, 5, 1], 1.0),
+             ([1, 0, 1, 0], [1, 5, 1, 5], -1.0),
+             ([1, 0, nan, 1, 0], [4, 2, 5, 4, 2], 1.0),
+             ([1, 1, 1, 1], [1, 2, 3, 4], None),
+             ([1, 0, nan, nan], [1, 2, 3, 4], None),]
+    )
+    def test_correlate(self, a, b, expected):
+        corr = AnalyticsHandler.correlate(
+            np.array(a, dtype=np.float64)[:, None],
+            np.array(b, dtype=np.float64)[:, None]
+        )
+        if expected is None:
+            assert np.isnan(corr[0, 0])
+        else:
+            assert corr[0, 0] == pytest.approx(expected)
+
+    def test_correlate_matches_numpy(self):
+        rng = np.random.default_rng(0)
+        a = rng.integers(0, 2, (50, 3)).astype(np.float64)
+        b = rng.integers(1, 6, (50, 2)).astype(np.float64)
+        a[rng.random(a.shape) < 0.2] = nan
+        b[rng.random(b.shape) < 0.2] = nan
+
+        corr = AnalyticsHandler.correlate(a, b)
+        for i in range(3):
+            for j in range(2):
+                both = ~np.isnan(a[:, i]) & ~np.isnan(b[:, j])
+                expected = np.corrcoef(a[both, i], b[both, j])[0, 1]
+                assert corr[i, j] == pytest.approx(expected)
+
+    def test_conditional_averages(self):
+        habits = np.array([[1, 0], [1, 1], [0, nan], [nan, 0]])
+        states = np.array([[4], [2], [1], [nan]])
+        done, not_done = AnalyticsHandler.get_conditional_averages(habits, states)
+
+        assert done[:, 0].tolist() == [3, 2]
+        assert not_done[0, 0] == 1
+        assert not_done[1, 0] == 4
+
+class TestAnalyticsCache:
+    def test_invalidate(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            AnalyticsHandler, "analyze",
+            lambda habits, states: calls.append(1) or len(calls)
+        )
+        cache = AnalyticsCache()
+
+        class Obj:
+            def __init__(self, id):
+                self.id = id
+
+        habits, states = [Obj(1)], [Obj(2)]
+        assert cache.get(1, habits, states) == 1
+        assert cache.get(1, habits, states) == 1
+        # different set of habits
+        assert cache.get(1, habits + [Obj(3)], states) == 2
+
+        cache.invalidate("State", 2)
+        assert cache.get(1, habits + [Obj(3)], states) == 3
+        cache.invalidate("State", 7)
+        assert cache.get(1, habits + [Obj(3)], states) == 3
+
+    @pytest.mark.parametrize("ttl, expected", [(60, 1), (0, 2), (-1, 2)])
+    def test_expired(self, monkeypatch, ttl, expected):
+        calls = []
+        monkeypatch.setattr(
+            AnalyticsHandler, "analyze",
+            lambda habits, states: calls.append(1) or len(calls)
+        )
+        cache = AnalyticsCache(ttl=ttl)
+        cache.get(1, [], [])
+
+        assert cache.get(1, [], []) == expected
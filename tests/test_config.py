@@ -0,0 +1,25 @@
+import pytest
+
+from app import create_app, db
+from app.config import Config, ProductionConfig
+
+class TestCreateApp:
+    def test_testing_config(self, app):
+        assert app.testing
+        with app.app_context():
+            assert db.engine.url.database in (None, "", ":memory:")
+
+    def test_secret_key_required(self, monkeypatch):
+        monkeypatch.setattr(ProductionConfig, "SECRET_KEY", None)
+        with pytest.raises(RuntimeError):
+            create_app("production")
+
+    def test_schema_not_created(self, tmp_path):
+        class NoSchemaConfig(Config):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.sqlite'}"
+            CREATE_SCHEMA = False
+
+        app = create_app(NoSchemaConfig)
+        with app.app_context():
+            assert db.inspect(db.engine).get_table_names() == []
+            db.engine.dispose()
@@ -0,0 +1,81 @@
+import pytest
+
+import sqlalchemy as sa
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from app.database import RoutingSession, SQLiteProfile, READ_BIND_KEY
+
+@pytest.fixture
+def profiled_app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'test.sqlite'}"
+    app.config["SQLITE_READ_ENGINE"] = True
+    app.config["SQLITE_POOL_SIZE"] = 3
+
+    db = SQLAlchemy(session_options={"class_": RoutingSession})
+    SQLiteProfile.configure(app)
+    db.init_app(app)
+    SQLiteProfile.init_engines(app, db)
+    yield app, db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+class TestSQLiteProfile:
+    @pytest.mark.parametrize(
+            'uri,expected',
+            [("sqlite:///db.sqlite", True),
+             ("sqlite://", False),
+             ("sqlite:///:memory:", False),
+             ("postgresql://user@localhost/db", False),]
+    )
+    def test_is_file_database(self, uri, expected):
+        assert SQLiteProfile.is_file_database(uri) == expected
+
+    def test_pragmas(self, profiled_app):
+        app, db = profiled_app
+        with app.app_context():
+            with db.engines[None].connect() as connection:
+                assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+                assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+                assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+            with db.engines[READ_BIND_KEY].connect() as connection:
+                assert connection.exec_driver_sql("PRAGMA query_only").scalar() == 1
+            assert db.engines[READ_BIND_KEY].pool.size() == 3
+
+class TestRoutingSession:
+    @pytest.mark.parametrize('method,read', [("GET", True), ("HEAD", True), ("POST", False)])
+    def test_routing(self, profiled_app, method, read):
+        app, db = profiled_app
+        with app.test_request_context("/", method=method):
+            expected = db.engines[READ_BIND_KEY if read else None]
+            assert db.session.get_bind() is expected
+
+    def test_main_engine_after_write(self, profiled_app):
+        app, db = profiled_app
+        table = sa.Table("item", sa.MetaData(), sa.Column("id", sa.Integer, primary_key=True))
+        with app.app_context():
+            table.create(db.engines[None])
+
+        with app.test_request_context("/", method="GET"):
+            db.session.execute(table.insert().values(id=1))
+            assert db.session.get_bind() is db.engines[None]
+            # uncommitted row is visible, because read uses the same connection
+            assert db.session.execute(sa.select(table)).all() == [(1,)]
+
+    def test_call_after_commit(self, profiled_app):
+        app, db = profiled_app
+        calls = []
+        with app.app_context():
+            session = db.session()
+            session.call_after_commit(calls.append, 1)
+            session.call_after_commit(calls.append, 1)
+            assert calls == []
+            db.session.commit()
+            assert calls == [1]
+
+            session.call_after_commit(calls.append, 2)
+            db.session.rollback()
+            db.session.commit()
+            assert calls == [1]
@@ -0,0 +1,100 @@
+import datetime
+
+import pytest
+from werkzeug.datastructures import ImmutableMultiDict
+
+from app import db
+from app.models import User, Habit, State, JournalEntry
+from app.day_status import DayFill, DayStatus, DayStatusCache, day_status_cache
+from app.utils import DataOperationUtils
+
+
+DAY = datetime.date(2024, 3, 10)
+
+pytestmark = pytest.mark.seed(users=2, habits=["h"], states=["s"], start_date=DAY)
+
+
+class TestDayStatus:
+    @pytest.mark.parametrize(
+            "form",
+            [{"journal_entry": "note"}, {"h": "on"}, {"s": "3"}]
+    )
+    def test_has_data(self, app, form):
+        with app.app_context():
+            user = db.session.get(User, 2)
+            DataOperationUtils.save_day(2, DAY, user.habits, user.states, ImmutableMultiDict(form))
+            db.session.commit()
+
+            assert DayStatus.has_data(2, DAY)
+            assert not DayStatus.has_data(2, DAY + datetime.timedelta(days=1))
+            # data of other user don't count
+            assert not DayStatus.has_data(1, DAY)
+
+    def test_has_data_of_habit_entry_only(self, app):
+        with app.app_context():
+            user = db.session.get(User, 1)
+            DataOperationUtils.save_entries("Habit", DAY, {user.habits[0].id: True})
+            db.session.commit()
+
+            assert db.session.scalar(db.select(JournalEntry)) is None
+            assert DayStatus.has_data(1, DAY)
+
+    def test_days_with_data(self, app):
+        with app.app_context():
+            user = db.session.get(User, 1)
+            days = [DAY, DAY + datetime.timedelta(days=2), DAY + datetime.timedelta(days=40)]
+            for day in days:
+                DataOperationUtils.save_day(1, day, user.habits, user.states, ImmutableMultiDict())
+            db.session.commit()
+
+            assert DayStatus.get_days_with_data(
+                1, DAY, DAY + datetime.timedelta(days=30)
+            ) == frozenset(days[:2])
+            assert DayStatus.get_days_with_data(2, DAY, DAY + datetime.timedelta(days=30)) == frozenset()
+
+    def test_fill(self, app):
+        with app.app_context():
+            user = db.session.get(User, 1)
+            habit = Habit(user_id=1, name="h2", start_date=DAY, is_active=True)
+            db.session.add(habit)
+            forms = [{"h": "on", "s": "4", "journal_entry": "note"}, {"journal_entry": ""}]
+            for days, form in enumerate(forms):
+                date = DAY + datetime.timedelta(days=days)
+                DataOperationUtils.save_day(1, date, user.habits, user.states, ImmutableMultiDict(form))
+            db.session.commit()
+
+            fill = DayStatus.get_fill(1, DAY, DAY + datetime.timedelta(days=30))
+            assert fill == {
+                DAY: DayFill(1, 2, 4, 1, True),
+                DAY + datetime.timedelta(days=1): DayFill(0, 2, 0, 0, False),
+            }
+            assert fill[DAY].done_ratio == 0.5
+            assert fill[DAY].state_average == 4
+            assert DayStatus.get_fill(2, DAY, DAY) == {}
+
+
+class TestDayStatusCache:
+    def test_invalidated_on_save(self, app):
+        with app.app_context():
+            day_status_cache.clear()
+            assert not day_status_cache.has_data(1, DAY)
+
+            user = db.session.get(User, 1)
+            DataOperationUtils.save_day(1, DAY, user.habits, user.states, ImmutableMultiDict())
+            db.session.commit()
+            assert day_status_cache.has_data(1, DAY)
+
+    def test_lru(self, app):
+        cache = DayStatusCache(max_users=1)
+        with app.app_context():
+            cache.has_data(1, DAY)
+            cache.has_data(2, DAY)
+        assert list(cache._users) == [2]
+
+    def test_expired(self, app):
+        cache = DayStatusCache(ttl=0)
+        with app.app_context():
+            assert not cache.has_data(1, DAY)
+            db.session.add(JournalEntry(user_id=1, date=DAY, note="note"))
+            db.session.commit()
+            assert cache.has_data(1, DAY)
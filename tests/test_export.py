@@ -0,0 +1,93 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+
+import pytest
+
+from app import db
+from app.export import DataExporter
+from app.models import HabitEntry, StateEntry, JournalEntry
+from tests.conftest import login
+
+
+DAY = datetime.date(2024, 3, 10)
+
+pytestmark = pytest.mark.seed(users=2, habits=["habit {uid}"], states=["state {uid}"], start_date=DAY)
+
+
+@pytest.fixture(autouse=True)
+def entries(app):
+    with app.app_context():
+        for uid in (1, 2):
+            db.session.add(HabitEntry(habit_id=uid, date=DAY, value=True))
+            db.session.add(StateEntry(state_id=uid, date=DAY, value=4))
+            db.session.add(JournalEntry(user_id=uid, date=DAY, note='first line\nsecond, "quoted"'))
+        db.session.commit()
+
+
+def read(data: bytes, data_format: str) -> list[dict]:
+    text = data.decode("utf-8")
+    if data_format == "csv":
+        return list(csv.DictReader(io.StringIO(text)))
+    return [json.loads(line) for line in text.splitlines()]
+
+
+class TestDataExporter:
+    @pytest.mark.parametrize("data_format", ["csv", "ndjson"])
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_export(self, app, data_format, compress):
+        with app.app_context():
+            data = b"".join(DataExporter.export(1, data_format, compress))
+        if compress:
+            data = gzip.decompress(data)
+
+        records = read(data, data_format)
+        assert [record["type"] for record in records] == [
+            "habit", "state", "habit_entry", "state_entry", "journal"
+        ]
+        assert records[0]["name"] == "habit 1"
+        assert records[2]["date"] == "2024-03-10"
+        assert str(records[3]["value"]) == "4"
+        assert records[4]["note"] == 'first line\nsecond, "quoted"'
+
+    def test_streamed_in_chunks(self, app):
+        with app.app_context():
+            lines = DataExporter.iter_ndjson(
+                {"type": "journal", "note": "x" * 100} for _ in range(1000)
+            )
+            chunks = list(DataExporter.iter_chunks(lines, chunk_size=10_000))
+        assert len(chunks) > 5
+        assert all(len(chunk) < 11_000 for chunk in chunks)
+
+    def test_unknown_format(self, app):
+        with app.app_context():
+            with pytest.raises(ValueError):
+                DataExporter.export(1, "xml")
+
+
+class TestExportViews:
+    @pytest.fixture
+    def client(self, app):
+        client = app.test_client()
+        login(client, 2)
+        return client
+
+    def test_route(self, client):
+        response = client.get("/export?format=ndjson&gzip=1")
+
+        assert response.status_code == 200
+        assert response.mimetype == "application/gzip"
+        assert "attachment" in response.headers["Content-Disposition"]
+        names = {record.get("name") for record in read(gzip.decompress(response.data), "ndjson")}
+        assert names == {"habit 2", "state 2", None}
+
+    def test_route_unknown_format(self, client):
+        assert client.get("/export?format=xml").status_code == 404
+
+    def test_command(self, app):
+        result = app.test_cli_runner().invoke(args=["export-data", "1@dummy.com", "--format", "ndjson"])
+
+        assert result.exit_code == 0
+        assert len(result.output.splitlines()) == 5
@@ -0,0 +1,215 @@
+import datetime
+import gzip
+import io
+import json
+
+import pytest
+import sqlalchemy as sa
+
+from app import db
+from app.export import DataExporter
+from app.importer import DataImporter
+from app.models import User, Habit, State, HabitEntry, StateEntry, HabitStats, JournalEntry
+from app.range_index import RangeIndex
+from app.stats_handler import QueryStatsHandler
+from tests.conftest import count_statements, login
+
+
+DAY = datetime.date(2024, 3, 10)
+
+pytestmark = pytest.mark.seed(users=2)
+
+
+@pytest.fixture(autouse=True)
+def history(app):
+    with app.app_context():
+        db.session.add(Habit(user_id=1, name="run", start_date=DAY, is_active=True))
+        db.session.add(State(user_id=1, name="mood", start_date=DAY, is_active=False))
+        for days in range(3):
+            date = DAY + datetime.timedelta(days=days)
+            db.session.add(HabitEntry(habit_id=1, date=date, value=days != 1))
+            db.session.add(StateEntry(state_id=1, date=date, value=[4, None, -1][days]))
+        db.session.add(JournalEntry(user_id=1, date=DAY, note='first line\nsecond, "quoted"'))
+        db.session.commit()
+
+
+def ndjson(*records: dict) -> io.BytesIO:
+    return io.BytesIO("".join(json.dumps(record) + "\n" for record in records).encode())
+
+
+def entry(record_type: str, name: str, days: int, value) -> dict:
+    return {"type": record_type, "name": name, "date": str(DAY + datetime.timedelta(days=days)), "value": value}
+
+
+class TestDataImporter:
+    @pytest.mark.parametrize("data_format", ["csv", "ndjson"])
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_round_trip(self, app, data_format, compress):
+        with app.app_context():
+            data = b"".join(DataExporter.export(1, data_format, compress))
+            result = DataImporter.import_data(2, io.BytesIO(data), data_format, compress)
+
+            assert result == (1, 1, 3, 3, 1)
+            exported = [list(DataExporter.iter_records(uid)) for uid in (1, 2)]
+            for records in exported:
+                for record in records:
+                    record.pop("id", None)
+            assert exported[0] == exported[1]
+
+    def test_derived_data_is_calculated(self, app):
+        with app.app_context():
+            DataImporter.import_data(1, ndjson(*[entry("habit_entry", "run", days, True) for days in range(-5, 10)]), "ndjson")
+
+            stats = db.session.get(HabitStats, 1)
+            expected = QueryStatsHandler.get_stats_by_ids([1], "Habit")[1]
+            assert (stats.total_count, stats.done_count, stats.current_streak, stats.longest_streak) == \
+                (expected.total_count, expected.done_count, expected.current_streak, expected.longest_streak)
+            assert stats.total_count == 15
+            assert RangeIndex.get_range("Habit", 1, DAY, DAY + datetime.timedelta(days=2)).done_count == 3
+
+    def test_definitions(self, app):
+        with app.app_context():
+            DataImporter.import_data(1, ndjson(
+                {"type": "state", "name": "sleep", "start_date": "2024-01-01", "is_active": False},
+                entry("habit_entry", "run", -10, True),
+                entry("habit_entry", "read", 5, "false"),
+                entry("habit_entry", "read", 3, True),
+                entry("state_entry", "sleep", 0, 5),
+            ), "ndjson")
+
+            habits = db.session.scalars(sa.select(Habit).order_by(Habit.id)).all()
+            # existing habit is matched by name and starts with its first entry
+            assert [(habit.name, habit.start_date) for habit in habits] == [
+                ("run", DAY - datetime.timedelta(days=10)),
+                ("read", DAY + datetime.timedelta(days=3)),
+            ]
+            sleep = db.session.scalar(sa.select(State).filter_by(name="sleep"))
+            assert (sleep.start_date, sleep.is_active) == (datetime.date(2024, 1, 1), False)
+
+    def test_replaces_existing_entries(self, app):
+        with app.app_context():
+            DataImporter.import_data(1, ndjson(
+                entry("state_entry", "mood", 0, 2),
+                {"type": "journal", "date": str(DAY), "note": "replaced"},
+                {"type": "journal", "date": "2020-01-01", "note": "old"},
+            ), "ndjson")
+
+            assert db.session.get(StateEntry, (1, DAY)).value == 2
+            assert db.session.get(JournalEntry, (1, DAY)).note == "replaced"
+            assert db.session.get(User, 1).first_entry_date == datetime.date(2020, 1, 1)
+
+    @pytest.mark.parametrize(
+            "record",
+            [
+                {"type": "dummy"},
+                {"type": "habit_entry", "name": "run", "value": True},
+                {"type": "habit_entry", "name": "run", "date": "10.03.2024", "value": True},
+                {"type": "habit_entry", "name": "", "date": "2024-03-10", "value": True},
+                {"type": "habit_entry", "name": "run", "date": "2024-03-10", "value": "maybe"},
+                {"type": "habit_entry", "name": "run", "date": "2024-03-10", "value": ""},
+                {"type": "habit_entry", "name": "run", "date": "2024-03-10"},
+                {"type": "state_entry", "name": "mood", "date": "2024-03-10", "value": 7},
+                {"type": "state_entry", "name": "mood", "date": "2024-03-10", "value": 2.5},
+                {"type": "habit", "name": "run", "start_date": "yesterday"},
+            ]
+    )
+    def test_incorrect_record(self, app, record):
+        with app.app_context():
+            with pytest.raises(ValueError, match="Line 2"):
+                DataImporter.import_data(1, ndjson(entry("habit_entry", "new", 0, True), record), "ndjson")
+            # nothing is saved
+            assert db.session.scalar(sa.select(sa.func.count()).select_from(Habit)) == 1
+
+    def test_incorrect_file(self, app):
+        with app.app_context():
+            with pytest.raises(ValueError):
+                DataImporter.import_data(1, io.BytesIO(b"{not json"), "ndjson")
+            with pytest.raises(ValueError):
+                DataImporter.import_data(1, io.BytesIO(b"not gzip"), "csv", compress=True)
+
+    def test_written_in_batches(self, app):
+        with app.app_context():
+            with count_statements() as statements:
+                DataImporter.import_data(2, ndjson(
+                    *[entry("habit_entry", "run", days, True) for days in range(25)]
+                ), "ndjson", batch_size=10)
+
+        assert [
+            len(statement.parameters) if statement.executemany else 1
+            for statement in statements if statement.sql.startswith("INSERT INTO habit_entry")
+        ] == [10, 10, 5]
+
+    @pytest.mark.parametrize(
+            "filename, expected",
+            [
+                ("data.csv", ("csv", False)),
+                ("Data.NDJSON", ("ndjson", False)),
+                ("data.jsonl.gz", ("ndjson", True)),
+                ("habit-tracker-20240310.csv.gz", ("csv", True)),
+            ]
+    )
+    def test_get_format(self, filename, expected):
+        assert DataImporter.get_format(filename) == expected
+
+    @pytest.mark.parametrize("filename", ["data.xml", "data", "data.gz"])
+    def test_get_format_unknown(self, filename):
+        with pytest.raises(ValueError):
+            DataImporter.get_format(filename)
+
+
+class TestImportViews:
+    @pytest.fixture
+    def client(self, app):
+        client = app.test_client()
+        login(client, 2)
+        return client
+
+    def test_route(self, app, client):
+        data = gzip.compress(ndjson(entry("habit_entry", "walk", 0, True)).getvalue())
+        response = client.post(
+            "/import", data={"file": (io.BytesIO(data), "data.ndjson.gz")}, follow_redirects=True
+        )
+
+        assert response.request.path == "/settings"
+        assert b"Imported 1 habit entries" in response.data
+        assert b"walk" in response.data
+
+    def test_history_without_journal_can_be_opened(self, app, client):
+        data = ndjson(entry("habit_entry", "walk", -3, True), entry("state_entry", "mood", -1, 2))
+        client.post("/import", data={"file": (data, "data.ndjson")})
+
+        with app.app_context():
+            assert db.session.get(User, 2).first_entry_date == DAY - datetime.timedelta(days=3)
+        response = client.get(f"/day/{DAY - datetime.timedelta(days=3):%Y%m%d}")
+        assert response.status_code == 200
+        assert b"walk" in response.data
+
+    @pytest.mark.parametrize(
+            "file",
+            [(io.BytesIO(b""), "data.xml"), (io.BytesIO(b"type\ndummy\n"), "data.csv")]
+    )
+    def test_route_incorrect_file(self, client, file):
+        response = client.post("/import", data={"file": file}, follow_redirects=True)
+
+        assert response.request.path == "/settings"
+        assert b"is-danger" in response.data
+
+    def test_route_too_large_file(self, app, client):
+        app.config["MAX_CONTENT_LENGTH"] = 2**20
+        data = ndjson(*[entry("habit_entry", "walk", -days, True) for days in range(20000)])
+        response = client.post("/import", data={"file": (data, "data.ndjson")}, follow_redirects=True)
+
+        assert response.request.path == "/settings"
+        assert b"File is too large" in response.data
+        with app.app_context():
+            assert db.session.get(User, 2).habits == []
+
+    def test_command(self, app, tmp_path):
+        path = tmp_path / "data.ndjson"
+        path.write_bytes(ndjson(entry("state_entry", "mood", 0, 3)).getvalue())
+        result = app.test_cli_runner().invoke(args=["import-data", "2@dummy.com", str(path)])
+
+        assert result.exit_code == 0
+        assert "1 states" in result.output
+        with app.app_context():
+            assert db.session.scalar(sa.select(StateEntry.value).join(State).filter(State.user_id == 2)) == 3
@@ -0,0 +1,25 @@
+import datetime
+
+import pytest
+import sqlalchemy as sa
+
+from app import db
+from app.migrations import Migrations
+from app.models import User
+
+
+class TestMigrations:
+    @pytest.mark.seed(users=0)
+    def test_adds_missing_column(self, app):
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(sa.text("ALTER TABLE user DROP COLUMN first_entry_date"))
+                connection.execute(sa.text("INSERT INTO user (id, email) VALUES (1, 'a'), (2, 'b')"))
+                connection.execute(sa.text(
+                    "INSERT INTO journal_entry (user_id, date) VALUES (1, '2024-01-05'), (1, '2024-01-02')"
+                ))
+
+            assert Migrations.upgrade() == ["user.first_entry_date"]
+            assert db.session.get(User, 1).first_entry_date == datetime.date(2024, 1, 2)
+            assert db.session.get(User, 2).first_entry_date is None
+            assert Migrations.upgrade() == []
@@ -0,0 +1,123 @@
+import pytest
+import datetime
+
+import matplotlib.pyplot as plt
+
+from app.plot_handler import PlotCache, Plotter, RenderExecutor, render_plot, _matplotlib_lock
+
+class TestPlotCache:
+    @pytest.fixture
+    def date(self):
+        return datetime.date(2024, 1, 10)
+
+    def test_get_returns_put_image(self, date):
+        cache = PlotCache()
+        key = cache.make_key("Habit", 1, date)
+        cache.put(key, b"image")
+
+        assert cache.get(key).image == b"image"
+        assert cache.get(cache.make_key("Habit", 2, date)) is None
+        assert cache.get(cache.make_key("Habit", 1, date, "svg")) is None
+
+    def test_least_recently_used_image_is_evicted(self, date):
+        cache = PlotCache(max_entries=2)
+        keys = [cache.make_key("Habit", i, date) for i in range(3)]
+        cache.put(keys[0], b"0")
+        cache.put(keys[1], b"1")
+        cache.get(keys[0])
+        cache.put(keys[2], b"2")
+
+        assert cache.get(keys[0]).image == b"0"
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[2]).image == b"2"
+
+    def test_invalidate_changes_key(self, date):
+        cache = PlotCache()
+        old_key = cache.make_key("State", 1, date)
+        cache.put(old_key, b"old")
+        cache.invalidate("State", 1)
+
+        assert cache.make_key("State", 1, date) != old_key
+        assert cache.get(old_key) is None
+        assert cache.make_key("Habit", 1, date) == ("Habit", 1, date, 0, "png")
+
+    def test_outdated_image_is_not_stored(self, date, tmp_path):
+        cache = PlotCache(directory=str(tmp_path))
+        key = cache.make_key("Habit", 1, date)
+        cache.invalidate("Habit", 1)
+
+        assert cache.put(key, b"old").image == b"old"
+        assert cache.get(key) is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_expired_image_is_not_returned(self, date, tmp_path, monkeypatch):
+        cache = PlotCache(directory=str(tmp_path), ttl=60)
+        key = cache.make_key("Habit", 1, date)
+        cache.put(key, b"image")
+        later = PlotCache.now() + datetime.timedelta(seconds=61)
+        monkeypatch.setattr(PlotCache, "now", staticmethod(lambda: later))
+
+        assert cache.get(key) is None
+        cache.clear()
+        assert cache.get(key) is None
+
+    def test_disk_tier(self, date, tmp_path):
+        cache = PlotCache(directory=str(tmp_path))
+        key = cache.make_key("Habit", 1, date)
+        cache.put(key, b"image")
+        cache.clear()
+
+        assert cache.get(key).image == b"image"
+
+        cache.invalidate("Habit", 1)
+        cache.clear()
+
+        assert list(tmp_path.iterdir()) == []
+        assert cache.get(cache.make_key("Habit", 1, date)) is None
+
+class TestRenderExecutor:
+    @pytest.fixture
+    def jobs(self):
+        dates = [datetime.date(2024, 1, 1) + datetime.timedelta(days=i) for i in range(366)]
+        return [
+            ("raster", dates, [i % 3 - 1 for i in range(366)], "Habit", "png"),
+            ("raster", dates, [i % 7 - 1 for i in range(366)], "State", "svg"),
+        ]
+
+    def test_in_process(self, jobs):
+        executor = RenderExecutor(max_workers=0)
+
+        assert executor.render_many(jobs) == [render_plot(*job) for job in jobs]
+
+    def test_worker_processes(self, jobs):
+        executor = RenderExecutor(max_workers=2)
+        try:
+            assert executor.render_many(jobs) == [render_plot(*job) for job in jobs]
+        finally:
+            executor.shutdown()
+
+    def test_timeout_falls_back_to_current_process(self, jobs):
+        executor = RenderExecutor(max_workers=1, timeout=0)
+        try:
+            assert executor.render_many(jobs) == [render_plot(*job) for job in jobs]
+        finally:
+            executor.shutdown()
+
+    def test_workers_started_while_plotting(self, jobs):
+        # workers don't inherit lock held by other thread of parent process
+        executor = RenderExecutor(max_workers=1)
+        job = ("july",) + jobs[0][1:]
+        try:
+            with _matplotlib_lock:
+                future = executor._get_pool().submit(render_plot, *job)
+            assert future.result(timeout=30) == render_plot(*job)
+        finally:
+            executor.shutdown()
+
+class TestPlotter:
+    def test_figures_are_not_left_open(self):
+        dates = [datetime.date(2024, 1, 1) + datetime.timedelta(days=i) for i in range(366)]
+        for data_type in ("Habit", "State"):
+            Plotter(dates, [-1]*366, data_type).plot_to_png()
+
+        assert plt.get_fignums() == []
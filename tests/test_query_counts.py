@@ -0,0 +1,101 @@
+import datetime
+
+import pytest
+from werkzeug.datastructures import ImmutableMultiDict
+
+from app import db
+from app.models import User, Habit, State
+from app.plot_handler import render_executor
+from app.user_cache import user_cache
+from app.utils import DataOperationUtils
+from tests.conftest import count_statements, login
+
+
+DAY = datetime.date.today() - datetime.timedelta(days=2)
+
+"""
+Count of habits and states of every user, the second user has many more.
+"""
+USERS = {1: (2, 1), 2: (25, 12)}
+
+"""
+Measured pages with maximal count of statements run by their request.
+"""
+PAGES = {
+    "/": 10,
+    f"/day/{DAY:%Y%m%d}": 10,
+    f"/edit/{DAY:%Y%m%d}": 10,
+    f"/calendar/{DAY:%Y%m}": 10,
+    "/settings": 10,
+    "/analytics": 10,
+    f"/review/{DAY.year}": 10,
+}
+
+
+pytestmark = pytest.mark.seed(users=len(USERS))
+
+
+@pytest.fixture(autouse=True)
+def history(app):
+    with app.app_context():
+        start_date = DAY - datetime.timedelta(days=60)
+        for uid, (n_habits, n_states) in USERS.items():
+            user = db.session.get(User, uid)
+            db.session.add_all([
+                Habit(user_id=uid, name=f"h{i}", start_date=start_date, is_active=True)
+                for i in range(n_habits)
+            ] + [
+                State(user_id=uid, name=f"s{i}", start_date=start_date, is_active=True)
+                for i in range(n_states)
+            ])
+            db.session.flush()
+            for days in range(10):
+                date = DAY - datetime.timedelta(days=days)
+                DataOperationUtils.save_day(
+                    uid, date, user.habits, user.states, ImmutableMultiDict({"h0": "on", "s0": "3"})
+                )
+        db.session.commit()
+
+
+def count_queries(
+        app,
+        uid: int,
+        path: str,
+        after_save: bool = False
+    ) -> int:
+    """
+    Return count of statements run by request of user. The first request
+    fills caches and the second one is measured. If after_save is True,
+    user saves today's entries between them, so the measured request
+    reads again everything, that depends on entries.
+    """
+    client = app.test_client()
+    login(client, uid)
+    assert client.get(path).status_code == 200
+    if after_save:
+        client.post("/send_form", data={"h0": "on", "s0": "4"})
+
+    with app.app_context(), count_statements() as statements:
+        assert client.get(path).status_code == 200
+    return len(statements)
+
+
+class TestQueryCounts:
+    @pytest.mark.parametrize("after_save", [False, True])
+    @pytest.mark.parametrize("ttl", [60, 0])
+    @pytest.mark.parametrize("path", PAGES)
+    def test_bounded_by_page_not_by_habits(self, app, path, ttl, after_save):
+        user_cache.configure(1024, ttl)
+        counts = [count_queries(app, uid, path, after_save) for uid in USERS]
+        assert counts[0] == counts[1]
+        assert counts[0] <= PAGES[path]
+
+    @pytest.mark.parametrize("after_save", [False, True])
+    def test_with_plot_workers(self, app, after_save):
+        render_executor.configure(2, app.config["PLOT_RENDER_TIMEOUT"])
+        try:
+            counts = [count_queries(app, uid, "/", after_save) for uid in USERS]
+        finally:
+            render_executor.configure(0, app.config["PLOT_RENDER_TIMEOUT"])
+        assert counts[0] == counts[1]
+        assert counts[0] <= PAGES["/"]
@@ -0,0 +1,84 @@
+import pytest
+import datetime
+
+from werkzeug.datastructures import ImmutableMultiDict
+
+from app import db
+from app.models import User
+from app.utils import DataOperationUtils
+from tests.conftest import SEED_DATE, count_statements, login
+
+"""
+Pages run on every visit of dashboard, day, edit and calendar. None of the
+statements they send to database may scan a whole table.
+"""
+PAGES = [
+    "/",
+    f"/day/{SEED_DATE:%Y%m%d}",
+    f"/edit/{SEED_DATE:%Y%m%d}",
+    f"/calendar/{SEED_DATE:%Y%m}",
+]
+
+
+pytestmark = pytest.mark.seed(users=2, habits=["run", "read"], states=["mood"])
+
+
+@pytest.fixture(autouse=True)
+def history(app):
+    with app.app_context():
+        for uid in (1, 2):
+            user = db.session.get(User, uid)
+            for days in range(5):
+                DataOperationUtils.save_day(
+                    uid, SEED_DATE + datetime.timedelta(days=days), user.habits, user.states,
+                    ImmutableMultiDict({"run": "on", "mood": "3"})
+                )
+        db.session.commit()
+
+
+def get_plans(app, path: str) -> list[tuple[str, list[str]]]:
+    """
+    Request page as logged in user and return SELECT statements it has run,
+    each with its query plan. Plans are explained with the same parameters.
+    """
+    client = app.test_client()
+    login(client)
+    with app.app_context(), count_statements() as statements:
+        assert client.get(path).status_code == 200
+
+    plans = []
+    with app.app_context():
+        connection = db.engines[None].raw_connection()
+        try:
+            for statement in statements:
+                if not statement.sql.lstrip().startswith("SELECT"):
+                    continue
+                cursor = connection.cursor()
+                cursor.execute("EXPLAIN QUERY PLAN " + statement.sql, statement.parameters)
+                plans.append((statement.sql, [row[-1] for row in cursor.fetchall()]))
+        finally:
+            connection.close()
+    return plans
+
+class TestQueryPlans:
+    @pytest.mark.parametrize('path', PAGES)
+    def test_no_full_scan(self, app, path):
+        plans = get_plans(app, path)
+
+        assert plans
+        for sql, plan in plans:
+            # subqueries and constant rows can be scanned, tables can't
+            assert not [
+                step for step in plan
+                if step.startswith("SCAN") and step.split()[1] in db.metadata.tables
+            ], (sql, plan)
+
+    @pytest.mark.parametrize(
+            'path,index',
+            [(f"/day/{SEED_DATE:%Y%m%d}", "ix_habit_entry_date_habit_id"),
+             (f"/day/{SEED_DATE:%Y%m%d}", "ix_state_entry_date_state_id"),
+             ("/", "ix_habit_user_id"),
+             ("/", "ix_state_user_id"),]
+    )
+    def test_uses_index(self, app, path, index):
+        assert any(index in step for _, plan in get_plans(app, path) for step in plan)
@@ -0,0 +1,106 @@
+import pytest
+import datetime
+
+import sqlalchemy as sa
+from werkzeug.datastructures import ImmutableMultiDict
+
+from app import db
+from app.models import User, HabitRangeIndex
+from app.range_index import RangeIndex, RangeStats
+from app.utils import DataOperationUtils
+from tests.conftest import count_statements
+
+def day(n):
+    return datetime.date(2024, 1, 1) + datetime.timedelta(days=n)
+
+ENTRIES = [(day(0), True), (day(1), False), (day(3), True), (day(4), True)]
+
+class TestRangeIndex:
+    def test_build(self):
+        start_date, prefix_sums = RangeIndex.build("State", [(day(2), 3), (day(4), None), (day(5), -1)])
+
+        assert start_date == day(2)
+        assert prefix_sums.tolist() == [[0, 0, 0], [1, 1, 3], [1, 1, 3], [1, 2, 3], [1, 3, 3]]
+
+    @pytest.mark.parametrize(
+            'start,end,expected',
+            [(0, 4, RangeStats(3, 4, 3, 5)),
+             (1, 3, RangeStats(1, 2, 1, 3)),
+             (2, 2, RangeStats(0, 0, 0, 1)),
+             (-10, 0, RangeStats(1, 1, 1, 11)),
+             (4, 20, RangeStats(1, 1, 1, 17)),
+             (10, 20, RangeStats(0, 0, 0, 11)),
+             (3, 1, RangeStats(0, 0, 0, 0)),]
+    )
+    def test_query(self, start, end, expected):
+        start_date, prefix_sums = RangeIndex.build("Habit", ENTRIES)
+        assert RangeIndex.query(start_date, prefix_sums, day(start), day(end)) == expected
+
+    @pytest.mark.parametrize('date', [day(-3), day(2), day(9)])
+    def test_fit(self, date):
+        start_date, prefix_sums = RangeIndex.build("Habit", ENTRIES)
+        new_start, fitted = RangeIndex.fit(start_date, prefix_sums, date)
+
+        assert new_start <= date
+        assert 0 <= (date - new_start).days < len(fitted) - 1
+        # sums of the whole original range don't change
+        assert RangeIndex.query(new_start, fitted, day(-5), day(10)) == \
+            RangeIndex.query(start_date, prefix_sums, day(-5), day(10))
+
+
+@pytest.mark.seed(habits=["h0", "h1"], start_date=day(0))
+class TestStoredRangeIndex:
+    def save(self, date: datetime.date, *names: str) -> None:
+        user = db.session.get(User, 1)
+        DataOperationUtils.save_day(
+            1, date, user.habits, [], ImmutableMultiDict({name: "on" for name in names})
+        )
+        db.session.commit()
+
+    def stored(self) -> dict[int, tuple[datetime.date, list]]:
+        return {
+            index.habit_id: (index.start_date, RangeIndex.load(index.prefix_sums).tolist())
+            for index in db.session.scalars(sa.select(HabitRangeIndex))
+        }
+
+    def test_saving_updates_index(self, app):
+        with app.app_context():
+            # later days, overwritten day and days before start of index
+            for days, names in ((0, ["h0"]), (3, ["h1"]), (0, ["h1"]), (-2, ["h0"]), (10, [])):
+                self.save(day(days), *names)
+                expected = {
+                    obj_id: (start_date, prefix_sums.tolist())
+                    for obj_id, (start_date, prefix_sums) in RangeIndex.calculate("Habit", [1, 2]).items()
+                }
+                assert self.stored() == expected
+
+            assert RangeIndex.get_range("Habit", 1, day(-2), day(3)) == RangeStats(1, 3, 1, 6)
+            assert RangeIndex.get_range("Habit", 2, day(0), day(3)) == RangeStats(2, 2, 2, 4)
+
+    def test_index_is_rolled_back_with_entries(self, app):
+        with app.app_context():
+            self.save(day(0), "h0")
+            before = self.stored()
+            user = db.session.get(User, 1)
+            DataOperationUtils.save_day(1, day(1), user.habits, [], ImmutableMultiDict({"h0": "on"}))
+            db.session.rollback()
+
+            assert self.stored() == before
+
+    def test_missing_indexes_are_calculated_without_saving(self, app):
+        with app.app_context():
+            for days, names in ((0, ["h0"]), (1, ["h0", "h1"]), (3, ["h1"]), (-2, ["h0"])):
+                self.save(day(days), *names)
+            db.session.execute(sa.delete(HabitRangeIndex))
+            db.session.commit()
+
+            with count_statements() as statements:
+                indexes = RangeIndex.get_indexes("Habit", [1, 2])
+            # existing indexes and entries of all missing ones
+            assert [statement.sql.split()[0] for statement in statements] == ["SELECT", "SELECT"]
+            assert self.stored() == {}
+            assert RangeIndex.query(*indexes[1], day(-2), day(3)) == RangeStats(3, 4, 3, 6)
+
+            # the next save builds indexes of saved objects
+            self.save(day(5), "h1")
+            assert self.stored().keys() == {1, 2}
@@ -0,0 +1,48 @@
+import io
+import pytest
+import datetime
+
+import numpy as np
+from PIL import Image
+
+from app.raster import RasterPlotter
+
+def get_dates(end_date, n_days=366):
+    return [end_date - datetime.timedelta(days=i) for i in range(n_days)][::-1]
+
+class TestRasterPlotter:
+    @pytest.mark.parametrize(
+            'data_type,values,expected_indexes',
+            [("Habit", [-1, 0, 1], [0, 1, 2]),
+             ("State", [-1, 0, 1, 2, 3, 4, 5], [0, 1, 2, 3, 4, 5, 6]),
+             ("State", [None], [0]),]
+    )
+    def test_values_mapped_on_palette(self, data_type, values, expected_indexes):
+        dates = get_dates(datetime.date(2024, 1, 7), len(values))
+        plotter = RasterPlotter(dates, values, data_type)
+        grid = plotter.get_grid()
+        transparent = len(plotter.palette)
+
+        assert sorted(grid[grid != transparent].tolist()) == sorted(expected_indexes)
+
+    def test_grid_layout(self):
+        # 2024-01-01 is monday, 2024-01-10 is wednesday
+        dates = get_dates(datetime.date(2024, 1, 10), 10)
+        grid = RasterPlotter(dates, [1]*10, "Habit").get_grid()
+
+        assert grid.shape == (7, 2)
+        assert (grid[:, 0] == 2).all()
+        assert grid[:, 1].tolist() == [2, 2, 2, 3, 3, 3, 3]
+
+    def test_png_is_valid(self):
+        dates = get_dates(datetime.date(2024, 2, 29))
+        data = np.random.default_rng(0).integers(-1, 6, len(dates)).tolist()
+        png = RasterPlotter(dates, data, "State", cell_size=10, gap=2).plot_to_png()
+
+        image = Image.open(io.BytesIO(png))
+        assert image.mode == "P"
+        assert image.size == (53*12 - 2, 7*12 - 2)
+
+    def test_length_mismatch(self):
+        with pytest.raises(ValueError):
+            RasterPlotter(get_dates(datetime.date(2024, 1, 1)), [1], "Habit")
@@ -0,0 +1,194 @@
+import datetime
+
+import pytest
+from werkzeug.datastructures import ImmutableMultiDict
+
+from app import db
+from app.analytics import analytics_cache
+from app.day_status import day_status_cache
+from app.models import User, Habit, State, HabitEntry, StateEntry, JournalEntry
+from app.plot_handler import plot_cache
+from app.user_cache import user_cache
+from app.utils import DataOperationUtils
+from tests.conftest import count_statements
+
+
+DAY = datetime.date(2024, 3, 10)
+
+
+def add_user_data(
+        n_habits: int,
+        n_states: int,
+        uid: int = 1
+    ) -> tuple[list[Habit], list[State]]:
+    start_date = DAY - datetime.timedelta(days=30)
+    habits = [Habit(user_id=uid, name=f"h{i}", start_date=start_date, is_active=True) for i in range(n_habits)]
+    states = [State(user_id=uid, name=f"s{i}", start_date=start_date, is_active=True) for i in range(n_states)]
+    db.session.add_all(habits + states)
+    db.session.commit()
+    return habits, states
+
+
+class TestSaveDay:
+    def test_save_and_overwrite(self, app):
+        with app.app_context():
+            habits, states = add_user_data(2, 2)
+            form = ImmutableMultiDict({"h0": "on", "s1": "4", "journal_entry": "first"})
+            DataOperationUtils.save_day(1, DAY, habits, states, form)
+            db.session.commit()
+
+            form = ImmutableMultiDict({"h1": "on", "s0": "2", "journal_entry": "second"})
+            DataOperationUtils.save_day(1, DAY, habits, states, form, empty_state_value=None)
+            db.session.commit()
+
+            habit_values = dict(db.session.execute(
+                db.select(HabitEntry.habit_id, HabitEntry.value)
+            ).all())
+            state_values = dict(db.session.execute(
+                db.select(StateEntry.state_id, StateEntry.value)
+            ).all())
+            assert habit_values == {habits[0].id: False, habits[1].id: True}
+            assert state_values == {states[0].id: 2, states[1].id: None}
+            assert db.session.scalar(db.select(JournalEntry.note)) == "second"
+
+            assert habits[0].stats.total_count == 1
+            assert habits[0].stats.done_count == 0
+            assert habits[1].stats.current_streak == 1
+            assert states[0].stats.value_sum == 2
+
+    def test_caches_dropped_after_commit(self, app):
+        with app.app_context():
+            habits, states = add_user_data(1, 0)
+            key = plot_cache.make_key("Habit", habits[0].id, DAY)
+            analytics_cache.get(1, habits, states)
+            day_status_cache.has_data(1, DAY)
+            user_cache.get(1)
+            form = ImmutableMultiDict({"h0": "on"})
+
+            DataOperationUtils.save_day(1, DAY, habits, states, form)
+            db.session.rollback()
+            assert plot_cache.make_key("Habit", habits[0].id, DAY) == key
+            assert 1 in analytics_cache._results
+            assert not day_status_cache.has_data(1, DAY)
+
+            DataOperationUtils.save_day(1, DAY, habits, states, form)
+            assert plot_cache.make_key("Habit", habits[0].id, DAY) == key
+            assert 1 in analytics_cache._results
+            assert not day_status_cache.has_data(1, DAY)
+            assert 1 in user_cache._users
+            db.session.commit()
+            assert plot_cache.make_key("Habit", habits[0].id, DAY) != key
+            assert 1 not in analytics_cache._results
+            assert day_status_cache.has_data(1, DAY)
+            assert 1 not in user_cache._users
+
+    @pytest.mark.parametrize("overwrite", [False, True])
+    def test_statement_count_is_constant(self, app, overwrite):
+        with app.app_context():
+            habits, states = add_user_data(20, 10)
+            form = ImmutableMultiDict({"h0": "on", "s0": "3"})
+
+            # statistics are created with the first saved day
+            saved_day = DAY if overwrite else DAY - datetime.timedelta(days=1)
+            DataOperationUtils.save_day(1, saved_day, habits, states, ImmutableMultiDict())
+            db.session.commit()
+
+            def save(n_habits, n_states):
+                # like routes, habits and states are loaded in the same request
+                def save_day():
+                    habits = db.session.scalars(db.select(Habit).limit(n_habits)).all()
+                    states = db.session.scalars(db.select(State).limit(n_states)).all()
+                    DataOperationUtils.save_day(1, DAY, habits, states, form)
+                return save_day
+
+            with count_statements() as few:
+                save(2, 2)()
+            db.session.rollback()
+            with count_statements() as many:
+                save(20, 10)()
+            db.session.rollback()
+            assert len(few) == len(many)
+
+
+class TestAddMissingEntries:
+    def test_backfill(self, app):
+        with app.app_context():
+            habits, states = add_user_data(3, 1)
+            habits[2].start_date = DAY + datetime.timedelta(days=1)
+            DataOperationUtils.save_day(1, DAY, habits[:1], [], ImmutableMultiDict({"h0": "on"}))
+            db.session.commit()
+
+            DataOperationUtils.add_missing_entries(1, DAY)
+
+            entries = dict(db.session.execute(
+                db.select(HabitEntry.habit_id, HabitEntry.value).filter_by(date=DAY)
+            ).all())
+            assert entries == {habits[0].id: True, habits[1].id: False}
+            assert db.session.scalar(
+                db.select(StateEntry.value).filter_by(state_id=states[0].id, date=DAY)
+            ) == -1
+            assert habits[1].stats.total_count == 1
+
+    def test_cost_does_not_depend_on_history(self, app):
+        with app.app_context():
+            db.session.add(User(email="long@dummy.com", name="long", password="x"))
+            counts = []
+            for uid, n_days in ((1, 1), (2, 20)):
+                habits, states = add_user_data(3, 2, uid)
+                for days in range(n_days):
+                    date = DAY - datetime.timedelta(days=days + 1)
+                    DataOperationUtils.save_day(uid, date, habits, states, ImmutableMultiDict())
+                db.session.commit()
+                with count_statements() as statements:
+                    DataOperationUtils.add_missing_entries(uid, DAY)
+                counts.append(len(statements))
+            assert counts[0] == counts[1]
+
+
+class TestFirstEntryDate:
+    def test_moves_back_only(self, app):
+        with app.app_context():
+            user = db.session.get(User, 1)
+            for days, expected_days in ((0, 0), (3, 3), (1, 3)):
+                date = DAY - datetime.timedelta(days=days)
+                DataOperationUtils.save_day(1, date, [], [], ImmutableMultiDict())
+                db.session.commit()
+                assert user.first_entry_date == DAY - datetime.timedelta(days=expected_days)
+
+    def test_older_habit_entry_moves_back(self, app):
+        with app.app_context():
+            habits, _ = add_user_data(1, 0)
+            DataOperationUtils.save_day(1, DAY, habits, [], ImmutableMultiDict())
+            db.session.commit()
+            older = DAY - datetime.timedelta(days=60)
+            DataOperationUtils.save_entries("Habit", older, {habits[0].id: True})
+            db.session.commit()
+            assert db.session.get(User, 1).first_entry_date == older
+
+    def test_refresh_after_delete(self, app):
+        with app.app_context():
+            for days in (0, 5):
+                DataOperationUtils.save_day(1, DAY - datetime.timedelta(days=days), [], [], ImmutableMultiDict())
+            db.session.execute(db.delete(JournalEntry).filter_by(date=DAY - datetime.timedelta(days=5)))
+            User.refresh_first_entry_dates([1])
+            db.session.commit()
+            assert db.session.get(User, 1).first_entry_date == DAY
+
+    def test_refresh_counts_habit_and_state_entries(self, app):
+        with app.app_context():
+            habits, states = add_user_data(1, 1)
+            DataOperationUtils.save_day(1, DAY, habits, states, ImmutableMultiDict())
+            for days, data_type, obj in ((3, "Habit", habits[0]), (7, "State", states[0])):
+                DataOperationUtils.save_entries(data_type, DAY - datetime.timedelta(days=days), {obj.id: 1})
+            User.refresh_first_entry_dates([1])
+            db.session.commit()
+            assert db.session.get(User, 1).first_entry_date == DAY - datetime.timedelta(days=7)
+
+    def test_min_date_memoized_in_request(self, app):
+        with app.test_request_context():
+            user = db.session.get(User, 1)
+            assert user.get_min_date() == datetime.date.today()
+            DataOperationUtils.save_day(1, DAY, [], [], ImmutableMultiDict())
+            assert user.get_min_date() == DAY
+            user.first_entry_date = None
+            assert user.get_min_date() == DAY
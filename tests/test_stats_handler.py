@@ -0,0 +1,159 @@
+import datetime
+import random
+
+import pytest
+from werkzeug.datastructures import ImmutableMultiDict
+
+from app import db
+from app.models import User, HabitStats
+from app.stats_handler import StatsTableHandler, QueryStatsHandler
+from app.utils import DataOperationUtils
+from tests.conftest import login
+
+
+START = datetime.date(2024, 1, 1)
+
+"""
+Columns of HabitStats and StateStats compared between saved and calculated rows.
+"""
+STATS_COLUMNS = ("total_count", "done_count", "value_sum", "current_streak", "longest_streak", "last_entry_date")
+
+
+def get_row(stats) -> tuple:
+    return tuple(getattr(stats, column) for column in STATS_COLUMNS)
+
+
+def get_saved_rows() -> dict[tuple[str, int], tuple]:
+    """
+    Return rows of both stats tables keyed by data type and owner's id.
+    """
+    rows = {}
+    for data_type in ("Habit", "State"):
+        stats_model, _, owner_id = StatsTableHandler.get_models(data_type)
+        for stats in db.session.scalars(db.select(stats_model)):
+            rows[(data_type, getattr(stats, owner_id.key))] = get_row(stats)
+    return rows
+
+
+class TestStatsTableHandler:
+    @pytest.mark.parametrize(
+            'value,expected',
+            [(None, None), (-1, None), ("-1", None), ("3", 3), (5, 5),
+             (True, 1), (False, 0),]
+    )
+    def test_get_score(self, value, expected):
+        assert StatsTableHandler.get_score(value) == expected
+
+    @pytest.mark.parametrize(
+            'data_type,value,expected',
+            [("Habit", True, True), ("Habit", False, False),
+             ("State", "1", True), ("State", -1, False), ("State", None, False),]
+    )
+    def test_is_done(self, data_type, value, expected):
+        assert StatsTableHandler.is_done(data_type, value) == expected
+
+    @pytest.mark.parametrize(
+            'values,current,longest',
+            [([], 0, 0),
+             ([True, True, False, True], 1, 2),
+             ([False, True, True, True], 3, 3),
+             ([True, False], 0, 1),]
+    )
+    def test_set_streaks(self, values, current, longest):
+        stats = HabitStats()
+        StatsTableHandler.set_streaks(stats, "Habit", values)
+
+        assert stats.current_streak == current
+        assert stats.longest_streak == longest
+
+
+@pytest.mark.seed(habits=["h0", "h1", "h2"], states=["s0", "s1"], start_date=START)
+class TestStatsTableConsistency:
+    @pytest.mark.parametrize("seed", range(5))
+    def test_random_saves_match_calculation(self, app, seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            user = db.session.get(User, 1)
+            for _ in range(60):
+                # days are saved out of order, overwritten and some objects are skipped
+                date = START + datetime.timedelta(days=rng.randrange(40))
+                habits = [habit for habit in user.habits if rng.random() < 0.8]
+                states = [state for state in user.states if rng.random() < 0.8]
+                form = {habit.name: "on" for habit in habits if rng.random() < 0.6}
+                form.update({state.name: str(rng.randint(1, 5)) for state in states if rng.random() < 0.6})
+                DataOperationUtils.save_day(
+                    1, date, habits, states, ImmutableMultiDict(form),
+                    empty_state_value=rng.choice([-1, None])
+                )
+                db.session.commit()
+
+                rows = get_saved_rows()
+                for data_type, objs in (("Habit", user.habits), ("State", user.states)):
+                    for obj in objs:
+                        if (data_type, obj.id) in rows:
+                            assert rows[(data_type, obj.id)] == \
+                                get_row(StatsTableHandler.calculate(data_type, obj.id))
+
+            rows = get_saved_rows()
+            assert len(rows) == 5
+            StatsTableHandler.rebuild()
+            assert get_saved_rows() == rows
+
+
+def save_history(user: User, history: list[tuple[int, bool, int | None]]) -> None:
+    """
+    Save days of user's first habit and state in given order. Every day
+    is a tuple (days after START, habit done, state value), state value
+    -1 or None is saved as state without value.
+    """
+    for days, done, value in history:
+        form = {}
+        if done:
+            form[user.habits[0].name] = "on"
+        if value is not None and value >= 0:
+            form[user.states[0].name] = str(value)
+        DataOperationUtils.save_day(
+            1, START + datetime.timedelta(days=days), user.habits[:1], user.states[:1],
+            ImmutableMultiDict(form), empty_state_value=value
+        )
+        db.session.commit()
+
+
+@pytest.mark.seed(habits=["h0", "h1"], states=["s0", "s1"], start_date=START)
+class TestQueryStatsHandler:
+    @pytest.mark.parametrize(
+            "history",
+            [
+                # gaps between entries
+                [(0, True, 3), (1, True, 4), (5, True, 5), (6, False, 1), (7, True, 2)],
+                # backdated entries and overwritten days
+                [(10, True, 3), (11, True, 3), (3, False, 2), (2, True, 1), (10, False, 5), (3, True, 2)],
+                # states without value saved as -1 and None
+                [(0, True, 3), (1, False, None), (2, True, -1), (3, True, 5), (4, False, -1)],
+                [],
+            ]
+    )
+    def test_matches_stats_table(self, app, history):
+        with app.app_context():
+            user = db.session.get(User, 1)
+            save_history(user, history)
+
+            for data_type, objs in (("Habit", user.habits), ("State", user.states)):
+                ids = [obj.id for obj in objs]
+                table = StatsTableHandler.get_stats(objs, data_type)
+                query = QueryStatsHandler.get_stats_by_ids(ids, data_type)
+                assert {obj_id: get_row(stats) for obj_id, stats in query.items()} == \
+                    {obj_id: get_row(table[obj_id]) for obj_id in ids}
+
+    def test_dashboard_with_query_backend(self, app):
+        with app.app_context():
+            save_history(db.session.get(User, 1), [(0, True, 3), (2, True, None), (1, False, 4)])
+        client = app.test_client()
+        login(client)
+
+        responses = {}
+        for backend in ("table", "query"):
+            app.config["STATS_BACKEND"] = backend
+            responses[backend] = client.get("/")
+            assert responses[backend].status_code == 200
+        assert responses["query"].data == responses["table"].data
@@ -0,0 +1,107 @@
+import pytest
+import datetime
+
+import numpy as np
+
+from app import db
+from app.models import Habit, HabitEntry
+from app.plot_handler import StatsUtils
+from app.utils import DataOperationUtils
+from app.streaks import HabitHistory, StreakEngine, Streak, Gap
+from tests.conftest import count_statements
+
+def day(n):
+    return datetime.date(2024, 1, 1) + datetime.timedelta(days=n)
+
+class TestHabitHistory:
+    def test_masks(self):
+        entries = [(day(0), True), (day(1), False), (day(3), True), (day(30), True)]
+        history = HabitHistory.from_entries(day(0), day(4), entries)
+
+        assert history.unpack(history.done).tolist() == [True, False, False, True, False]
+        assert history.unpack(history.broken).tolist() == [False, True, False, False, False]
+        assert history.unpack(history.missing).tolist() == [False, False, True, False, True]
+
+    def test_from_values(self):
+        history = HabitHistory.from_values(day(0), np.array([1, 0, -1, 1], dtype=np.int8))
+        expected = HabitHistory.from_entries(day(0), day(3), [(day(0), True), (day(1), False), (day(3), True)])
+
+        assert history.n_days == expected.n_days
+        assert history.unpack(history.done).tolist() == expected.unpack(expected.done).tolist()
+        assert history.unpack(history.broken).tolist() == expected.unpack(expected.broken).tolist()
+
+class TestStreakEngine:
+    @pytest.mark.parametrize(
+            'done,current,longest',
+            [([], 0, 0),
+             ([True, True, False, True], 1, 2),
+             ([False, True, True, True], 3, 3),
+             ([True, False], 0, 1),]
+    )
+    def test_get_streaks(self, done, current, longest):
+        assert StreakEngine.get_streaks(np.array(done, dtype=bool)) == (current, longest)
+
+    def test_summarize(self):
+        entries = [(day(0), True), (day(1), True), (day(2), False),
+                   (day(4), True), (day(5), True), (day(7), True)]
+        history = HabitHistory.from_entries(day(0), day(8), entries)
+        summary = StreakEngine.summarize(history)
+
+        # days without entry don't break streak
+        assert summary.current_streak == 3
+        assert summary.longest_streak == 3
+        assert summary.streaks == [Streak(day(0), day(1), 2), Streak(day(4), day(7), 3)]
+        assert summary.gaps == [Gap(day(3), day(3)), Gap(day(6), day(6)), Gap(day(8), day(8))]
+
+@pytest.mark.seed(habits=["early", "late", "empty"], start_date=day(0))
+class TestStreakSummaries:
+    def test_read_from_database(self, app):
+        with app.app_context():
+            db.session.get(Habit, 2).start_date = day(3)
+            db.session.add_all(
+                [HabitEntry(habit_id=1, date=day(n), value=n != 2) for n in (-1, 0, 1, 2, 4, 5, 9)]
+                + [HabitEntry(habit_id=2, date=day(n), value=True) for n in (3, 4)]
+            )
+            db.session.commit()
+            habits = db.session.scalars(db.select(Habit).order_by(Habit.id)).all()
+
+            with count_statements() as statements:
+                summaries = StatsUtils.get_streak_summaries(habits, day(0), day(6))
+
+            assert len(statements) == 1
+            # entries outside of range are skipped
+            assert summaries[1].streaks == [Streak(day(0), day(1), 2), Streak(day(4), day(5), 2)]
+            assert summaries[1].gaps == [Gap(day(3), day(3)), Gap(day(6), day(6))]
+            # history starts with tracking
+            assert (summaries[2].current_streak, summaries[2].longest_streak) == (2, 2)
+            assert summaries[2].gaps == [Gap(day(5), day(6))]
+            assert summaries[3].streaks == []
+            assert summaries[3].gaps == [Gap(day(0), day(6))]
+
+    def test_range_before_tracking(self, app):
+        with app.app_context():
+            habits = db.session.scalars(db.select(Habit)).all()
+            summaries = StatsUtils.get_streak_summaries(habits, day(-10), day(-1))
+
+            assert all(summary == (0, 0, [], []) for summary in summaries.values())
+
+    def test_read_from_vectors(self, app):
+        app.config["COMPACT_STORAGE"] = True
+        with app.app_context():
+            db.session.get(Habit, 2).start_date = day(3)
+            for n in (-1, 0, 1, 2, 4, 5, 9):
+                DataOperationUtils.save_entries("Habit", day(n), {1: n != 2})
+            for n in (3, 4):
+                DataOperationUtils.save_entries("Habit", day(n), {2: True})
+            db.session.commit()
+            habits = db.session.scalars(db.select(Habit).order_by(Habit.id)).all()
+            # summaries can't depend on entry rows, when vectors are enabled
+            db.session.execute(db.delete(HabitEntry))
+
+            with count_statements() as statements:
+                summaries = StatsUtils.get_streak_summaries(habits, day(0), day(6))
+
+            assert len(statements) == 1
+            assert "habit_entry" not in statements[0].sql
+            assert summaries[1].streaks == [Streak(day(0), day(1), 2), Streak(day(4), day(5), 2)]
+            assert summaries[2].gaps == [Gap(day(5), day(6))]
@@ -0,0 +1,55 @@
+import pytest
+
+import numpy as np
+
+from app.trends import TrendHandler, SparklinePlotter
+
+nan = np.nan
+
+class TestTrendHandler:
+    @pytest.mark.parametrize(
+            'window,expected',
+            [(1, [1, 0, 1, 1, nan]),
+             (2, [0.5, 0.5, 1, 1]),
+             (3, [2/3, 2/3, 1]),
+             (10, [0.75]),]
+    )
+    def test_get_rolling(self, window, expected):
+        sums = np.array([1, 0, 1, 1, 0], dtype=np.float64)[:, None]
+        counts = np.array([1, 1, 1, 1, 0], dtype=np.float64)[:, None]
+        rolling = TrendHandler.get_rolling(
+            TrendHandler.get_cumulative(sums),
+            TrendHandler.get_cumulative(counts),
+            window
+        )
+        np.testing.assert_allclose(rolling[:, 0], expected)
+
+    def test_get_rolling_matches_naive(self):
+        rng = np.random.default_rng(0)
+        sums = rng.integers(0, 6, (100, 3)).astype(np.float64)
+        counts = (sums > 0).astype(np.float64)
+        rolling = TrendHandler.get_rolling(
+            TrendHandler.get_cumulative(sums),
+            TrendHandler.get_cumulative(counts),
+            30
+        )
+        for day in range(29, 100):
+            window = slice(day - 29, day + 1)
+            expected = sums[window].sum(axis=0) / counts[window].sum(axis=0)
+            np.testing.assert_allclose(rolling[day - 29], expected)
+
+class TestSparklinePlotter:
+    def test_segments(self):
+        plotter = SparklinePlotter(np.array([1, 2, nan, 3, nan, nan, 4, 5]), 0, 5, "#000000")
+        segments = plotter.get_segments()
+
+        assert [len(segment) for segment in segments] == [2, 1, 2]
+        # the lowest value is at the bottom, the highest at the top
+        assert segments[2][-1][1] == 0
+        assert segments[0][0][1] == pytest.approx(plotter.height * 4 / 5)
+
+    def test_svg(self):
+        svg = SparklinePlotter(np.array([nan, nan]), 0, 5, "#000000").plot_to_svg()
+
+        assert svg.startswith("<svg")
+        assert "<polyline" not in svg
@@ -0,0 +1,66 @@
+import datetime
+
+import pytest
+
+from app import db
+from app.models import User, Habit, State
+from app.user_cache import UserCache
+from tests.conftest import count_statements
+
+
+pytestmark = pytest.mark.seed(habits=["h"], states=["s"], start_date=datetime.date(2024, 1, 1))
+
+
+def load_in_new_session(app, cache: UserCache) -> tuple[list[str], list[str]]:
+    """
+    Load user with cache in new session. Return names of user's habits
+    and states and statements run meanwhile.
+    """
+    with app.app_context(), count_statements() as statements:
+        user = cache.get(1)
+        names = [obj.name for obj in user.habits + user.states] if user else []
+    return names, statements
+
+
+class TestUserCache:
+    def test_hit_runs_no_queries(self, app):
+        cache = UserCache()
+        names, statements = load_in_new_session(app, cache)
+        assert names == ["h", "s"]
+        assert statements
+
+        names, statements = load_in_new_session(app, cache)
+        assert names == ["h", "s"]
+        assert statements == []
+
+    def test_invalidate(self, app):
+        cache = UserCache()
+        load_in_new_session(app, cache)
+        with app.app_context():
+            db.session.add(Habit(user_id=1, name="h2", start_date=datetime.date(2024, 1, 1), is_active=True))
+            db.session.commit()
+
+        assert load_in_new_session(app, cache)[0] == ["h", "s"]
+        cache.invalidate(1)
+        assert load_in_new_session(app, cache)[0] == ["h", "h2", "s"]
+
+    @pytest.mark.parametrize("ttl", [0, -1])
+    def test_expired(self, app, ttl):
+        cache = UserCache(ttl=ttl)
+        load_in_new_session(app, cache)
+        assert load_in_new_session(app, cache)[1]
+
+    def test_merged_user_is_usable(self, app):
+        cache = UserCache()
+        load_in_new_session(app, cache)
+        with app.app_context():
+            user = cache.get(1)
+            assert user in db.session
+            assert user.habits[0].user is user
+            user.name = "renamed"
+            db.session.commit()
+            assert db.session.scalar(db.select(User.name)) == "renamed"
+
+    def test_missing_user(self, app):
+        with app.app_context():
+            assert UserCache().get(2) is None
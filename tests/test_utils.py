@@ -1,7 +1,7 @@
 import pytest
 import datetime
-from app import app
 
+from app.day_status import DayFill
 from app.utils import CalendarUtils, DatetimeUtils
 
 class TestCalendarUtils:
@@ -23,6 +23,21 @@ class TestCalendarUtils:
         assert previous == expected_previous
         assert next == expected_next
 
+    def test_get_month_layout(self):
+        layout = CalendarUtils.get_month_layout(2024, 2)
+        assert layout[0] == (0, 0, 0, 1, 2, 3, 4)
+        assert max(layout[-1]) == 29
+        assert CalendarUtils.get_month_layout(2024, 2) is layout
+
+    @pytest.mark.parametrize(
+            'day_fill,expected',
+            [(DayFill(1, 2, 7, 2, True), "Habits done: 50%, Average state: 3.5, Journal"),
+             (DayFill(0, 0, 0, 0, True), "Journal"),
+             (DayFill(3, 3, 0, 0, False), "Habits done: 100%"),]
+    )
+    def test_get_day_summary(self, day_fill, expected):
+        assert CalendarUtils.get_day_summary(day_fill) == expected
+
 class TestDatetimeUtils:
 
     @pytest.mark.parametrize(
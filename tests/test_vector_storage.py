@@ -0,0 +1,86 @@
+import pytest
+import datetime
+import random
+
+from werkzeug.datastructures import ImmutableMultiDict
+
+from app import db
+from app.models import User
+from app.stats_handler import StatsTableHandler
+from app.utils import DataOperationUtils
+from app.vector_storage import VectorStorage, DAYS_IN_YEAR
+
+class TestVectorStorage:
+    @pytest.mark.parametrize(
+            'value,expected',
+            [(None, 0),
+             ("", 0),
+             (-1, 0),
+             (False, 1),
+             (True, 2),
+             ("3", 4),
+             (5, 6),]
+    )
+    def test_encode(self, value, expected):
+        assert VectorStorage.encode(value) == expected
+
+    @pytest.mark.parametrize(
+            'date,expected',
+            [(datetime.date(2023, 1, 1), 0),
+             (datetime.date(2023, 12, 31), 364),
+             (datetime.date(2024, 12, 31), 365),]
+    )
+    def test_get_day_index(self, date, expected):
+        assert VectorStorage.get_day_index(date) == expected
+
+    def test_decode_window(self):
+        first = bytearray(DAYS_IN_YEAR)
+        first[363] = VectorStorage.encode(True)
+        second = bytearray(DAYS_IN_YEAR)
+        second[0] = VectorStorage.encode(False)
+        vectors = {2023: bytes(first), 2024: bytes(second)}
+
+        window = VectorStorage.decode_window(
+            vectors, datetime.date(2023, 12, 29), datetime.date(2024, 1, 2)
+        )
+        # unused last byte of 2023 isn't part of window
+        assert window.tolist() == [-1, 1, -1, 0, -1]
+
+    def test_decode_missing_years(self):
+        window = VectorStorage.decode_window(
+            {}, datetime.date(2022, 12, 31), datetime.date(2024, 1, 1)
+        )
+        assert len(window) == 367
+        assert (window == -1).all()
+
+START = datetime.date(2023, 12, 1)
+
+@pytest.mark.seed(habits=["h0", "h1"], states=["s0", "s1"], start_date=START)
+class TestVectorStorageRoundTrip:
+    @pytest.mark.parametrize("seed", range(3))
+    def test_window_equals_entries(self, app, seed):
+        app.config["COMPACT_STORAGE"] = True
+        rng = random.Random(seed)
+        end_date = START + datetime.timedelta(days=60)
+        with app.app_context():
+            user = db.session.get(User, 1)
+            # days cross the end of the year, some are saved more than once
+            for _ in range(50):
+                date = START + datetime.timedelta(days=rng.randrange(61))
+                form = {habit.name: "on" for habit in user.habits if rng.random() < 0.5}
+                form.update({state.name: str(rng.randint(1, 5)) for state in user.states if rng.random() < 0.5})
+                DataOperationUtils.save_day(
+                    1, date, user.habits[:rng.randint(1, 2)], user.states[:rng.randint(1, 2)],
+                    ImmutableMultiDict(form), empty_state_value=rng.choice([-1, None])
+                )
+                db.session.commit()
+                DataOperationUtils.add_missing_entries(1, date)
+
+            for data_type, objs in (("Habit", user.habits), ("State", user.states)):
+                _, entry_model, owner_id = StatsTableHandler.get_models(data_type)
+                for obj in objs:
+                    expected = [-1] * 61
+                    for date, value in db.session.execute(
+                            db.select(entry_model.date, entry_model.value).filter(owner_id == obj.id)):
+                        expected[(date - START).days] = -1 if value is None else int(value)
+                    assert VectorStorage.get_window(data_type, obj.id, START, end_date).tolist() == expected
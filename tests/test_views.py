@@ -1,11 +1,19 @@
 import pytest
 import os
+import re
+import datetime
+
+from werkzeug.datastructures import ImmutableMultiDict
+
+from app import db
+from app.models import User, HabitRangeIndex
+from app.utils import DataOperationUtils
+from tests.conftest import SEED_DATE, count_statements, login
 
-from app import app
 
 class TestViewsNoUser:
-    def test_login_page(self):
-        response = app.test_client().get('/login')
+    def test_login_page(self, client):
+        response = client.get('/login')
 
         assert response.status_code == 200
         assert "email" in response.data.decode("utf-8")
@@ -21,10 +29,11 @@ class TestViewsNoUser:
             'path',
             ["calendar", "settings", "logout", "index", "", 
              "day", "day/20230101", "edit/20230101", "edit",
-             "new", "new/20230101", "dummy_not_existing_page"]
+             "new", "new/20230101", "dummy_not_existing_page",
+             "plot/habit/1.png", "analytics", "export", "review", "review/2024"]
     )
-    def test_blocked_pages(self, path):
-        response = app.test_client().get(f"/{path}", follow_redirects=True)
+    def test_blocked_pages(self, client, path):
+        response = client.get(f"/{path}", follow_redirects=True)
 
         assert response.status_code == 200
         assert response.request.path == '/login'
@@ -33,13 +42,8 @@ class TestViewsNoUser:
 
 class TestViewsNewUser:
     @pytest.fixture(autouse=True)
-    def client_logged_in(self):
-        client = app.test_client()
-        response = client.post('/login', data={
-            'email': 'dummy@dummy.com',
-            'password': 'dummy'
-            }
-        )
+    def client_logged_in(self, client):
+        login(client)
         return client
 
     @pytest.mark.parametrize(
@@ -63,6 +67,26 @@ class TestViewsNewUser:
         assert response.request.path == path
         assert len(response.history) == 0
 
+    @pytest.mark.parametrize(
+            'path',
+            ["/calendar/000001", "/calendar/202400", "/calendar/202413",
+             "/calendar/2024ab", "/calendar/abcd01", "/calendar/1"]
+    )
+    def test_incorrect_calendar_month(self, client_logged_in, path):
+        response = client_logged_in.get(path)
+
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize(
+            'path',
+            ["/plot/habit/0.png", "/plot/state/0.svg", "/plot/dummy/1.png",
+             "/plot/habit/1.gif"]
+    )
+    def test_missing_plots(self, client_logged_in, path):
+        response = client_logged_in.get(path)
+
+        assert response.status_code == 404
+
     @pytest.mark.parametrize(
             'path,target',
             # [("/day/20000101", "/past",), ("/edit/20000101", "/past",), 
@@ -76,3 +100,103 @@ class TestViewsNewUser:
         assert response.request.path == target
         assert len(response.history) == 1
     
+
+
+@pytest.mark.seed(users=2, habits=["run"])
+class TestPlotView:
+    def test_conditional_requests(self, client):
+        login(client)
+        response = client.get("/plot/habit/1.png")
+
+        assert response.status_code == 200
+        assert response.mimetype == "image/png"
+        assert response.headers["ETag"]
+        assert response.last_modified is not None
+        assert response.cache_control.private
+        assert response.cache_control.no_cache
+
+        cached = client.get("/plot/habit/1.png", headers={"If-None-Match": response.headers["ETag"]})
+        assert cached.status_code == 304
+        assert cached.data == b""
+
+        client.post("/send_form", data={"run": "on"})
+        changed = client.get("/plot/habit/1.png", headers={"If-None-Match": response.headers["ETag"]})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != response.headers["ETag"]
+
+    def test_other_users_plot(self, client):
+        login(client)
+
+        assert client.get("/plot/habit/2.png").status_code == 404
+
+
+@pytest.mark.seed(habits=["run"], states=["mood"])
+class TestReviewView:
+    @pytest.fixture(autouse=True)
+    def history(self, app):
+        with app.app_context():
+            user = db.session.get(User, 1)
+            for days, form in ((0, {"run": "on", "mood": "3"}), (1, {"mood": "4"}), (40, {"run": "on"})):
+                DataOperationUtils.save_day(
+                    1, SEED_DATE + datetime.timedelta(days=days), user.habits, user.states,
+                    ImmutableMultiDict(form)
+                )
+            db.session.commit()
+
+    def test_redirect_to_current_year(self, client):
+        login(client)
+        response = client.get("/review")
+
+        assert response.status_code == 302
+        assert response.location.endswith(f"/review/{datetime.date.today().year}")
+
+    def test_monthly_summary(self, client):
+        login(client)
+        response = client.get(f"/review/{SEED_DATE.year}")
+        table = [
+            [cell.strip() for cell in re.findall(r"<t[dh]>(.*?)</t[dh]>", row, re.S)]
+            for row in re.findall(r"<tr>(.*?)</tr>", response.data.decode(), re.S)
+        ]
+
+        assert response.status_code == 200
+        assert table[0] == ["", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug",
+                            "Sep", "Oct", "Nov", "Dec", "Year"]
+        # tracking starts on 10th of March, habit was done on 1 of 22 days
+        # of March, 1 of 30 days of April and 2 of 297 days of the year
+        assert table[1] == ["run", "-", "-", "5%", "3%"] + ["0%"] * 8 + ["1%"]
+        assert table[2] == ["mood", "-", "-", "3.50"] + ["-"] * 9 + ["3.50"]
+        # entries were made on 3 of 297 days, done, not done and done again
+        assert table[3] == ["Habit", "Longest streak", "Days without entry"]
+        assert table[4] == ["run", "1 (10 Mar - 10 Mar)", "294"]
+
+    def test_read_only(self, app, client):
+        login(client)
+        with app.app_context():
+            db.session.execute(db.delete(HabitRangeIndex))
+            db.session.commit()
+
+        with app.app_context(), count_statements() as statements:
+            assert client.get(f"/review/{SEED_DATE.year}").status_code == 200
+        # missing indexes are calculated, but saved only by writes
+        assert all(statement.sql.startswith("SELECT") for statement in statements)
+
+
+@pytest.mark.seed(habits=["run"], states=["mood"])
+class TestDeleteView:
+    @pytest.mark.parametrize("path, field, data_type", [
+        ("/delete_habit", "habit_id", "Habit"),
+        ("/delete_state", "state_id", "State"),
+    ])
+    def test_first_entry_date_refreshed(self, app, client, path, field, data_type):
+        with app.app_context():
+            user = db.session.get(User, 1)
+            DataOperationUtils.save_day(1, SEED_DATE, [], [], ImmutableMultiDict())
+            DataOperationUtils.save_entries(data_type, SEED_DATE - datetime.timedelta(days=20), {1: 1})
+            db.session.commit()
+            assert user.first_entry_date == SEED_DATE - datetime.timedelta(days=20)
+
+        login(client)
+        client.post(path, data={field: 1})
+
+        with app.app_context():
+            assert db.session.get(User, 1).first_entry_date == SEED_DATE
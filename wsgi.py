@@ -0,0 +1,9 @@
+"""
+Entry point for WSGI servers. Configuration is chosen by HABIT_TRACKER_CONFIG
+environment variable, for example:
+
+    HABIT_TRACKER_CONFIG=production gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import create_app
+
+app = create_app()